@@ -0,0 +1,80 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark of the truth matrices of `CompliantLogger.metric_accuracy_table`: the
+probability tables of a synthetic dataset (by default 10M rows, 20 classes and
+100 thresholds) are computed with `CompliantLogger._compute_truth_matrix` and
+with the previous implementation (boolean masks over all the rows for each
+class and threshold), which must give the same tables.
+
+    python benchmarks/accuracy_table.py --rows 10000000 --classes 20 --thresholds 100
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from shrike.compliant_logging.logging import CompliantLogger, floating_range
+
+
+def masks_truth_matrix(predict, target, class_id, thresholds):
+    cl_table = []
+    for thres in thresholds:
+        cl_res = [
+            (predict >= thres) & (target == class_id),
+            (predict >= thres) & (target != class_id),
+            (predict < thres) & (target != class_id),
+            (predict < thres) & (target == class_id),
+        ]
+        cl_table.append([x.sum() for x in cl_res])
+    return cl_table
+
+
+def truth_matrices(truth_matrix, df, classes, thresholds):
+    start = time.perf_counter()
+    tables = [
+        truth_matrix(df["predict"], df["target"], class_id, thresholds)
+        for class_id in range(classes)
+    ]
+    return tables, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--thresholds", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            # rounded, so that many predictions are equal to a threshold
+            "predict": rng.random(args.rows).round(3),
+            "target": rng.integers(0, args.classes, args.rows),
+        }
+    )
+    thresholds = floating_range(args.thresholds)
+
+    logger = CompliantLogger("benchmark")
+    tables, elapsed = truth_matrices(
+        logger._compute_truth_matrix, df, args.classes, thresholds
+    )
+    print(f"sorted predictions: {elapsed:.2f} s")
+    reference, elapsed = truth_matrices(
+        masks_truth_matrix, df, args.classes, thresholds
+    )
+    print(f"boolean masks: {elapsed:.2f} s")
+
+    if not np.array_equal(np.array(tables), np.array(reference)):
+        print("The truth matrices differ!")
+        sys.exit(1)
+    print("The truth matrices are equal.")
+
+
+if __name__ == "__main__":
+    main()
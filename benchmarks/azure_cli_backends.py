@@ -0,0 +1,88 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Micro-benchmark of the per-command latency of the Azure CLI backends of
+`Command.execute_azure_cli_command` (see the `azure_cli_backend` configuration
+option). A stub `az` script is put first on the PATH, so that only the overhead
+of the backend is measured. Requires PowerShell (`pwsh`).
+
+    python benchmarks/azure_cli_backends.py --commands 50
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from shrike.build.core.command_line import Command
+from shrike.build.core.configuration import Configuration
+
+
+class _BenchmarkCommand(Command):
+    def __init__(self, backend: str, working_directory: str):
+        super().__init__()
+        self.config = Configuration(
+            azure_cli_backend=backend, working_directory=working_directory
+        )
+
+    def run_with_config(self):
+        pass
+
+
+def write_stub_az(directory: Path) -> None:
+    if sys.platform == "win32":
+        (directory / "az.cmd").write_text("@echo az %*\n")
+    else:
+        stub = directory / "az"
+        stub.write_text('#!/bin/sh\necho "az $*"\n')
+        stub.chmod(0o755)
+
+
+def benchmark(backend: str, commands: int, directory: str) -> list:
+    command = _BenchmarkCommand(backend, directory)
+    latencies = []
+    try:
+        # Warm up, e.g. start the session.
+        command.execute_azure_cli_command("--version", output=[])
+        for i in range(commands):
+            start = time.perf_counter()
+            success = command.execute_azure_cli_command(
+                f"ml component show --name component{i}", output=[]
+            )
+            latencies.append(time.perf_counter() - start)
+            if not success:
+                raise RuntimeError(f"Command failed with the {backend} backend.")
+    finally:
+        command.close_azure_cli_sessions()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--backends", nargs="+", default=["pwsh", "pwsh_session"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level="WARNING")
+    with tempfile.TemporaryDirectory() as directory:
+        write_stub_az(Path(directory))
+        path = directory + os.pathsep + os.environ.get("PATH", "")
+        with mock.patch.dict(os.environ, {"PATH": path}):
+            for backend in args.backends:
+                latencies = benchmark(backend, args.commands, directory)
+                print(
+                    f"{backend:>14}: "
+                    f"mean {statistics.mean(latencies) * 1000:8.1f} ms, "
+                    f"median {statistics.median(latencies) * 1000:8.1f} ms "
+                    f"per command ({args.commands} commands)"
+                )
+
+
+if __name__ == "__main__":
+    main()
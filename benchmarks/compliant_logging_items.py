@@ -0,0 +1,70 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Micro-benchmark of `log.debug(..., items=[spark_df])` when DEBUG records are
+not emitted, either because the logger is at INFO level, or because the logger
+is at DEBUG level but its handlers are at INFO level. The items of a record are
+only converted when a handler formats it, so neither case should run any Spark
+action. The number of Spark jobs and the time per call are reported; exits
+with a non-zero code if a Spark job was run.
+
+    python benchmarks/compliant_logging_items.py --calls 1000
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from pyspark.sql import SparkSession
+
+from shrike.compliant_logging import DataCategory, enable_compliant_logging
+
+
+JOB_GROUP = "shrike-compliant-logging-benchmark"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.appName("compliant-logging-benchmark").getOrCreate()
+    df = spark.range(args.rows).selectExpr("id", "id % 7 AS bucket")
+    status_tracker = spark.sparkContext.statusTracker()
+
+    enable_compliant_logging(level=logging.INFO, stream=sys.stdout)
+    for handler in logging.root.handlers:
+        handler.setLevel(logging.INFO)
+    log = logging.getLogger("benchmark")
+
+    failures = []
+    for scenario, logger_level in [
+        ("logger at INFO", logging.INFO),
+        ("logger at DEBUG, handlers at INFO", logging.DEBUG),
+    ]:
+        log.setLevel(logger_level)
+        spark.sparkContext.setJobGroup(JOB_GROUP, scenario)
+        jobs_before = len(status_tracker.getJobIdsForGroup(JOB_GROUP))
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            log.debug("dataframe", items=[df], category=DataCategory.PUBLIC)
+        elapsed = time.perf_counter() - start
+
+        jobs = len(status_tracker.getJobIdsForGroup(JOB_GROUP)) - jobs_before
+        per_call = elapsed / args.calls * 1e6
+        print(f"{scenario}: {per_call:.1f} us per call, {jobs} Spark jobs")
+        if jobs:
+            failures.append(scenario)
+
+    spark.stop()
+    if failures:
+        print(f"Spark actions run for filtered records: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark of the throughput of compliant logging with synchronous handlers
+(the default) and with `enable_compliant_logging(async_handlers=True)`. Public
+and private records are logged to a file, as a scoring component would. The
+time spent in the log calls (i.e., on the calling thread) and the time until
+every record is written are reported for both modes, as well as the number of
+records in the file, which must be the same.
+
+    python benchmarks/compliant_logging_throughput.py --records 100000
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from shrike.compliant_logging import DataCategory, enable_compliant_logging
+from shrike.compliant_logging.logging import _stop_queue_listener
+
+
+def run(path: str, records: int, async_handlers: bool):
+    enable_compliant_logging(
+        async_handlers=async_handlers, filename=path, level=logging.INFO
+    )
+    log = logging.getLogger("benchmark")
+
+    start = time.perf_counter()
+    for i in range(records):
+        if i % 2:
+            log.info("scored row %d", i, category=DataCategory.PUBLIC)
+        else:
+            log.info("row %d", i, items=[[i, i + 1]])
+    logged = time.perf_counter() - start
+    _stop_queue_listener()
+    for handler in logging.root.handlers:
+        handler.flush()
+    written = time.perf_counter() - start
+
+    with open(path) as file:
+        lines = sum(1 for _ in file)
+    return logged, written, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for async_handlers in [False, True]:
+            path = os.path.join(directory, f"async_{async_handlers}.log")
+            logged, written, lines = run(path, args.records, async_handlers)
+            print(
+                f"async_handlers={async_handlers}: "
+                f"{logged / args.records * 1e6:.1f} us per log call, "
+                f"{args.records / written:.0f} records/s written, "
+                f"{lines} lines"
+            )
+        logging.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark of the compliance and customized validation rules of `prepare` over
+synthetic component specifications (1,000 by default), either compiling the
+rules once for all components (what `prepare` does), or once per component.
+
+    python benchmarks/component_validation.py --components 1000
+"""
+
+import argparse
+import time
+
+from shrike.build.commands.prepare import (
+    ALLOWED_CONTAINER_REGISTRIES,
+    ALLOWED_PACKAGE_FEEDS,
+)
+from shrike.build.utils.validation import ComponentValidationRules
+
+CUSTOM_RULES = {
+    "$.name": "^dum.[A-Za-z0-9-_.]+$",
+    "$.environment.docker.image": "^polymerprod.azurecr.io*",
+    "$.inputs..description": "^[A-Z].*",
+    "$.outputs..type": "^(AnyDirectory|AnyFile)$",
+}
+
+
+def synthetic_spec(i: int) -> dict:
+    return {
+        "name": f"dummy.component{i}",
+        "version": "0.0.1",
+        "environment": {
+            "docker": {
+                "image": "polymerprod.azurecr.io/polymercd/prod_official/base:latest"
+            }
+        },
+        "inputs": {
+            f"input{j}": {"type": "AnyDirectory", "description": f"Input {j}"}
+            for j in range(5)
+        },
+        "outputs": {"output": {"type": "AnyDirectory"}},
+    }
+
+
+def validate(rules: ComponentValidationRules, component: str, spec: dict) -> int:
+    dependencies = ["numpy", f"--index-url {ALLOWED_PACKAGE_FEEDS[0]}"]
+    violations = rules.check_compliance(component, spec, dependencies, ["."])
+    violations += rules.check_custom_rules(component, spec)
+    return len(violations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--components", type=int, default=1000)
+    args = parser.parse_args()
+
+    specs = [synthetic_spec(i) for i in range(args.components)]
+
+    def compile_rules():
+        return ComponentValidationRules(
+            CUSTOM_RULES, ALLOWED_CONTAINER_REGISTRIES, ALLOWED_PACKAGE_FEEDS
+        )
+
+    start = time.perf_counter()
+    violations = sum(
+        validate(compile_rules(), f"component{i}", spec) for i, spec in enumerate(specs)
+    )
+    print(
+        f"compiled per component: {time.perf_counter() - start:6.2f} s "
+        f"({violations} violations)"
+    )
+
+    start = time.perf_counter()
+    rules = compile_rules()
+    violations = sum(
+        validate(rules, f"component{i}", spec) for i, spec in enumerate(specs)
+    )
+    print(
+        f"compiled once:          {time.perf_counter() - start:6.2f} s "
+        f"({violations} violations)"
+    )
+
+
+if __name__ == "__main__":
+    main()
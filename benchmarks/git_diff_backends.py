@@ -0,0 +1,113 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark of the `git_diff_backend` options used by the "smart" activation mode
+of `prepare` to list modified files. A synthetic repository (by default 50k
+files and 10k commits, one in 10 of them a "Merged PR" commit to the compliant
+branch) is generated with `git fast-import`, then `Prepare.get_modified_files`
+is timed for a pull request branch (forked from the middle of the history of
+the compliant branch, so that the diff is wide) with each backend.
+
+    python benchmarks/git_diff_backends.py --files 50000 --commits 10000
+"""
+
+import argparse
+import logging
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from git import Repo
+
+from shrike.build.commands.prepare import Prepare
+from shrike.build.core.configuration import Configuration
+
+
+def write_fast_import_stream(stream, files: int, commits: int) -> None:
+    def data(content: bytes) -> None:
+        stream.write(b"data %d\n" % len(content))
+        stream.write(content + b"\n")
+
+    def commit(ref: str, mark: int, message: str, parent: int, paths) -> None:
+        stream.write(b"commit %s\nmark :%d\n" % (ref.encode(), mark))
+        stream.write(b"committer Bench <bench@example.com> %d +0000\n" % mark)
+        data(message.encode())
+        if parent:
+            stream.write(b"from :%d\n" % parent)
+        for path, content in paths:
+            stream.write(b"M 644 inline %s\n" % path.encode())
+            data(content)
+
+    def path(i: int) -> str:
+        return f"components/component{i % 500}/src/file{i}.py"
+
+    commit(
+        "refs/heads/main",
+        1,
+        "Merged PR 1: initial commit",
+        0,
+        ((path(i), b"print(%d)" % i) for i in range(files)),
+    )
+    for mark in range(2, commits + 1):
+        message = f"Merged PR {mark}: change" if mark % 10 == 0 else f"Change {mark}"
+        changed = ((mark * 7919 + k) % files for k in range(5))
+        commit(
+            "refs/heads/main",
+            mark,
+            message,
+            mark - 1,
+            ((path(i), b"print(%d, %d)" % (i, mark)) for i in changed),
+        )
+    changed = (((commits + 1) * 104729 + k) % files for k in range(20))
+    commit(
+        "refs/heads/feature",
+        commits + 1,
+        "Pull request change",
+        commits // 2,
+        ((path(i), b"# changed\n") for i in changed),
+    )
+
+
+def create_repo(directory: Path, files: int, commits: int) -> Repo:
+    repo = Repo.init(directory, initial_branch="main")
+    process = subprocess.Popen(
+        ["git", "fast-import", "--quiet"], cwd=directory, stdin=subprocess.PIPE
+    )
+    write_fast_import_stream(process.stdin, files, commits)
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError("git fast-import failed.")
+    repo.git.checkout("feature")
+    # Pull request builds compare with the compliant branch of the remote.
+    repo.create_remote("origin", str(directory)).fetch()
+    return repo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--commits", type=int, default=10000)
+    parser.add_argument("--backends", nargs="+", default=["gitpython", "git"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level="WARNING")
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        repo = create_repo(Path(directory), args.files, args.commits)
+        print(f"Created the repository in {time.perf_counter() - start:.1f} s.")
+        for backend in args.backends:
+            prep = Prepare()
+            prep.config = Configuration(git_diff_backend=backend)
+            start = time.perf_counter()
+            modified_files = prep.get_modified_files(repo, "refs/pull/1/merge", "main")
+            print(
+                f"{backend:>10}: {time.perf_counter() - start:8.2f} s "
+                f"({len(modified_files)} modified files)"
+            )
+        repo.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark of the start-up time of `shrike`: the total import time reported by
+`python -X importtime` (median of several runs, in fresh interpreters) for
+`import shrike.pipeline` and `python -m shrike.build.commands.prepare --help`.
+Exits with a non-zero code if a scenario is slower than its threshold, so that
+it can guard against eager imports of heavy dependencies creeping back in.
+
+    python benchmarks/import_time.py --runs 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Thresholds in milliseconds, generous enough for slow build agents.
+SCENARIOS = {
+    "import shrike.pipeline": (["-c", "import shrike.pipeline"], 100),
+    "prepare --help": (["-m", "shrike.build.commands.prepare", "--help"], 200),
+}
+
+
+def import_times(args: List[str]) -> Tuple[float, Dict[str, float]]:
+    """
+    Run `python -X importtime <args>`, and return the total import time and the
+    cumulative import time of each top-level module, in milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    total = 0.0
+    top_level = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, _, timings = line.partition("import time:")
+        self_us, cumulative_us, name = timings.split("|")
+        total += int(self_us) / 1000
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative_us) / 1000
+    return total, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    regressions = []
+    for scenario, (scenario_args, threshold) in SCENARIOS.items():
+        runs = [import_times(scenario_args) for _ in range(args.runs)]
+        median = statistics.median(total for total, _ in runs)
+        heaviest = sorted(runs[-1][1].items(), key=lambda item: -item[1])[:5]
+        print(f"{scenario}: {median:.0f} ms (threshold: {threshold} ms)")
+        for name, cumulative in heaviest:
+            print(f"    {name}: {cumulative:.0f} ms")
+        if median > threshold:
+            regressions.append(scenario)
+
+    if regressions:
+        print(f"Import time regression: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Asynchronous telemetry sink shared by `shrike.build` and `shrike.pipeline`.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+log = logging.getLogger(__name__)
+
+# Why is it okay to include this key directly in the source code?
+# For any client-side tool, there is a fundamental problem with protecting
+# instrumentation keys. You want the published tool to be able to collect telemetry,
+# but the only way it can do this is if it has some kind of instrumentation key.
+#
+# For an authoritative example, the dotnet CLI contains their telemetry key in a
+# public GitHub repository:
+# https://github.com/dotnet/cli/blob/master/src/dotnet/Telemetry/Telemetry.cs
+#
+# The underlying Azure resource is called `aml1p-ml-tooling`.
+DEFAULT_INSTRUMENTATION_KEY = "aaefce9e-d109-4fac-bb9f-8277c68e91ac"
+
+
+class TelemetryItem(NamedTuple):
+    message: str
+    properties: dict
+    level: int
+
+
+def scrubber_function(envelope):
+    """
+    Callback function to scrub some columns.
+    """
+    envelope.tags["ai.cloud.roleInstance"] = "cloud_RoleInstance_Scrubbed"
+    envelope.tags["ai.location.ip"] = "IP_Scrubbed"
+
+
+class AzureMonitorExporter:
+    """
+    Export batches of telemetry items to Azure Application Insights. The
+    `AzureLogHandler` is only created on the first export, i.e. on the flush
+    thread of the sink, and every network call is bounded by 'timeout' seconds.
+    When `logging.shutdown` closes the handler at exit, it waits for at most
+    'grace_period' seconds for the items it has not sent yet.
+    """
+
+    def __init__(self, instrumentation_key: str, timeout: float, grace_period: float):
+        self.instrumentation_key = instrumentation_key
+        self.timeout = timeout
+        self.grace_period = grace_period
+        self.logger = logging.getLogger("telemetry_logger")
+        self._handler = None
+
+    def __call__(self, batch: List[TelemetryItem]) -> None:
+        if self._handler is None:
+            from opencensus.ext.azure.log_exporter import AzureLogHandler
+
+            self._handler = AzureLogHandler(
+                connection_string=f"InstrumentationKey={self.instrumentation_key}",
+                timeout=self.timeout,
+                grace_period=self.grace_period,
+            )
+            self._handler.add_telemetry_processor(scrubber_function)
+        for item in batch:
+            record = self.logger.makeRecord(
+                self.logger.name,
+                item.level,
+                "(telemetry)",
+                0,
+                item.message,
+                None,
+                None,
+                extra=item.properties,
+            )
+            self._handler.handle(record)
+        self._handler.flush(timeout=self.timeout)
+
+
+class TelemetrySink:
+    """
+    Send telemetry items without blocking the caller: `submit` puts items in a
+    bounded in-memory queue, which a background thread drains in batches of up
+    to 'max_batch_size' items handed to 'exporter', at least every
+    'flush_interval' seconds. When the queue is full (e.g., the endpoint is
+    slow or unreachable) new items are dropped. At exit, pending items are
+    handed to 'exporter' for at most 'shutdown_timeout' seconds; the exporter
+    may then need its own time to send them.
+    """
+
+    def __init__(
+        self,
+        exporter: Callable[[List[TelemetryItem]], None],
+        capacity: int = 1000,
+        max_batch_size: int = 100,
+        flush_interval: float = 1.0,
+        shutdown_timeout: float = 2.0,
+    ):
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[TelemetryItem]]" = queue.Queue(
+            maxsize=capacity
+        )
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="shrike-telemetry", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, message: str, properties: dict = {}, level=logging.INFO) -> bool:
+        """
+        Queue a telemetry item, and return whether it was accepted.
+        """
+        if self._closed.is_set():
+            return False
+        try:
+            self._queue.put_nowait(TelemetryItem(message, properties, level))
+        except queue.Full:
+            self.dropped += 1
+            log.debug("Telemetry queue is full, dropping trace.")
+            return False
+        return True
+
+    def _next_batch(self) -> List[TelemetryItem]:
+        batch: List[TelemetryItem] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and not self._closed.is_set():
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            # `None` is only queued by `close` to wake up this thread
+            if item is not None:
+                batch.append(item)
+        return batch
+
+    def _flush_loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self.exporter(batch)
+                except Exception as ex:
+                    log.warning("Send telemetry exception: %s", str(ex))
+            elif self._closed.is_set():
+                return
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting items and wait for at most 'timeout' seconds (by default
+        'shutdown_timeout') for the pending ones to be handed to the exporter.
+        This does not include the time the exporter needs to close, e.g. the
+        grace period of `AzureMonitorExporter`.
+        """
+        self._closed.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(self.shutdown_timeout if timeout is None else timeout)
+
+
+_sinks: Dict[str, TelemetrySink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_telemetry_sink(instrumentation_key: str) -> TelemetrySink:
+    """
+    Return the telemetry sink of this process sending to the Application
+    Insights resource 'instrumentation_key', creating it on the first call.
+
+    At exit, the sink waits for at most 1 s for its pending items, then the
+    Azure handler for at most 1 s to send them, so telemetry delays the exit
+    by at most 2 s.
+    """
+    with _sinks_lock:
+        if instrumentation_key not in _sinks:
+            _sinks[instrumentation_key] = TelemetrySink(
+                AzureMonitorExporter(
+                    instrumentation_key, timeout=5.0, grace_period=1.0
+                ),
+                shutdown_timeout=1.0,
+            )
+        return _sinks[instrumentation_key]
+
+
+class TelemetryLogger:
+    """Utils class for opencensus azure monitor"""
+
+    def __init__(
+        self, enable_telemetry=True, instrumentation_key=None, level=logging.INFO
+    ):
+        self.level = level
+        self.enable_telemetry = enable_telemetry
+        self.instrumentation_key = (
+            DEFAULT_INSTRUMENTATION_KEY
+            if instrumentation_key is None
+            else instrumentation_key
+        )
+        # The sink (and its exporter) is created once per process and shared
+        # with the other telemetry loggers, so traces are sent in the background.
+        self.sink = (
+            get_telemetry_sink(self.instrumentation_key) if enable_telemetry else None
+        )
+
+    def log_trace(self, message, properties={}, level=logging.INFO):
+        if self.enable_telemetry:
+            if level not in (
+                logging.INFO,
+                logging.WARNING,
+                logging.ERROR,
+                logging.CRITICAL,
+            ):
+                log.error("The logging level is not expected!")
+            elif level >= self.level:
+                self.sink.submit(message, properties, level)
+        else:
+            log.info(
+                "Sending trace log messages to application insight has been disabled."
+            )
+
+    # Callback function to scrub some columns
+    def scrubber_function(self, envelope):
+        scrubber_function(envelope)
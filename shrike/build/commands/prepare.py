@@ -4,25 +4,35 @@
 import logging
 import os
 import collections
-import jsonpath_ng
+import functools
+import hashlib
+import itertools
+import json
 import re
-from typing import List, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 import shutil
-from ruamel.yaml import YAML
-from git import Repo, InvalidGitRepositoryError, NoSuchPathError
 
 from shrike.build.core.command_line import Command
 from shrike.build.utils.utils import (
+    HashCache,
     create_catalog_stub,
+    create_SHA_256_hashes_of_files,
+    create_snapshot_fingerprint,
     add_file_to_catalog,
     write_two_catalog_files,
     delete_two_catalog_files,
+    SNAPSHOT_FINGERPRINT_TAG,
+    normalize_pip_requirement,
+)
+from shrike.build.utils.validation import (
+    ComponentValidationRules,
+    extract_dependencies_and_channels,
+    extract_python_package_dependencies,
+    validate_component_offline,
 )
 from pathlib import Path
-import yaml
 import urllib.parse
 import uuid
-from urllib.parse import urlparse
 
 log = logging.getLogger(__name__)
 
@@ -32,10 +42,54 @@ ALLOWED_PACKAGE_FEEDS = [
 ]
 
 
+@functools.lru_cache(maxsize=None)
+def _parse_jsonpath(expression: str) -> Any:
+    """
+    Parse the JSONPath 'expression' once, then share it by all validations.
+    """
+    import jsonpath_ng
+
+    return jsonpath_ng.parse(expression)
+
+
 class Prepare(Command):
     def __init__(self):
         super().__init__()
         self._component_statuses = {}
+        # Previous "Merged PR" commits, by (commit, consider_current_commit).
+        self._previous_compliant_commits = {}
+        # Parsed YAML files, by path, with the (mtime, size) they were parsed at.
+        self._parsed_yaml_files: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._validation_rules: Optional[ComponentValidationRules] = None
+
+    def load_yaml(self, file: str) -> Any:
+        """
+        Parse the YAML file `file` (e.g., a component specification file), or
+        return the document parsed earlier in this run if the file has not
+        changed since. The returned document is shared: do NOT mutate it.
+        """
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._parsed_yaml_files.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        from ruamel.yaml import YAML
+
+        with open(path, "r") as yaml_file:
+            document = YAML(typ="safe").load(yaml_file)
+        with self._lock:
+            self._parsed_yaml_files[path] = (signature, document)
+        return document
+
+    def forget_yaml(self, file: str) -> None:
+        """
+        Drop the parsed document of `file` (see `load_yaml`), e.g. after
+        rewriting it.
+        """
+        with self._lock:
+            self._parsed_yaml_files.pop(os.path.abspath(file), None)
 
     def folder_path(self, file: str) -> str:
         """
@@ -72,23 +126,31 @@ class Prepare(Command):
         """
         For each component specification file, run `az ml component build`,
         and register the status (+ register error if build failed). Returns the
-        list of "built" component files.
+        list of "built" component files. Up to `component_cli_workers`
+        components are built concurrently.
         """
         rv = []
 
         for component in files:
             path = Path(component)
             rv.append(str(path.parent / ".build" / path.name))
-            build_component_success = self.execute_azure_cli_command(
-                f"ml component build --file {component}"
-            )
-            if build_component_success:
-                log.info(f"Component {component} is built.")
-            else:
-                self.register_error(f"Error when building component {component}.")
+
+        self.for_each(self.build_component, files)
 
         return rv
 
+    def build_component(self, component: str) -> None:
+        """
+        Run `az ml component build` for a single component specification file.
+        """
+        build_component_success = self.execute_azure_cli_command(
+            f"ml component build --file {component}"
+        )
+        if build_component_success:
+            log.info(f"Component {component} is built.")
+        else:
+            self.register_error(f"Error when building component {component}.")
+
     def create_catalog_files(self, files: List[str]):
         """
         Create the appropriate kind of catalog file(s), using the configured
@@ -163,10 +225,14 @@ CATATTR1=0x00010001:OSAttr:2:6.2
     def create_catalog_files_for_aml(self, files: List[str]) -> None:
         """
         Create AML-friendly catalog.json and catalog.json.sig files, using
-        SHA-256 hash.
+        SHA-256 hash. The files of all components are hashed concurrently,
+        using up to `catalog_hashing_workers` threads. If `use_hash_cache` is
+        set, hashes of unchanged files are read from `hash_cache_file`.
         """
 
-        # For each component spec file in the input list, we'll do the following...
+        # For each component spec file in the input list, we'll first list the
+        # files to add to its catalog...
+        files_for_catalog_per_component = {}
         for f in files:
             log.info(f"Processing file {f}")
             component_folder_path = self.folder_path(f)
@@ -178,6 +244,33 @@ CATATTR1=0x00010001:OSAttr:2:6.2
             files_for_catalog = self.all_files_in_snapshot(f)
             log.info("The following list of files will be added to the catalog.")
             log.info(files_for_catalog)
+            files_for_catalog_per_component[f] = files_for_catalog
+
+        # ... then hash all of these files at once ...
+        hash_cache = None
+        if self.config.use_hash_cache:
+            hash_cache_file = os.path.join(
+                self.config.working_directory, self.config.hash_cache_file
+            )
+            log.info(f"Using hash cache {hash_cache_file}")
+            hash_cache = HashCache(
+                hash_cache_file, verify=self.config.verify_hash_cache
+            )
+        hashes = create_SHA_256_hashes_of_files(
+            [
+                file_for_catalog
+                for files_for_catalog in files_for_catalog_per_component.values()
+                for file_for_catalog in files_for_catalog
+            ],
+            max_workers=self.config.catalog_hashing_workers,
+            cache=hash_cache,
+        )
+        if hash_cache is not None:
+            hash_cache.save()
+
+        # ... and finally write the catalog of each component.
+        for f, files_for_catalog in files_for_catalog_per_component.items():
+            component_folder_path = self.folder_path(f)
 
             # Prepare the catlog stub: {'HashAlgorithm': 'SHA256', 'CatalogItems': {}}
             catalog = create_catalog_stub()
@@ -185,7 +278,22 @@ CATATTR1=0x00010001:OSAttr:2:6.2
             # Add an entry to the catalog for each file
             for file_for_catalog in files_for_catalog:
                 catalog = add_file_to_catalog(
-                    file_for_catalog, catalog, component_folder_path
+                    file_for_catalog,
+                    catalog,
+                    component_folder_path,
+                    hash_of_file=hashes[file_for_catalog],
+                )
+
+            if self.config.skip_unchanged_components:
+                # Store the fingerprint of the snapshot in the specification, so
+                # that `register` can skip components which are already
+                # registered with the same snapshot.
+                fingerprint = create_snapshot_fingerprint(
+                    catalog["CatalogItems"], Path(f).name
+                )
+                self.add_snapshot_fingerprint_to_tags(f, fingerprint)
+                catalog = add_file_to_catalog(
+                    self.normalize_path(f), catalog, component_folder_path
                 )
 
             # order the CatalogItems dictionary
@@ -217,6 +325,8 @@ CATATTR1=0x00010001:OSAttr:2:6.2
         return rv
 
     def add_repo_and_last_pr_to_tags(self, files: List[str]) -> List[str]:
+        import yaml
+
         [repo, current_branch, compliant_branch] = self.identify_repo_and_branches()
         repo_path = repo.remotes.origin.url
 
@@ -261,8 +371,28 @@ CATATTR1=0x00010001:OSAttr:2:6.2
             spec["tags"] = cur_tag
             with open(file, "w") as spec_file:
                 yaml.dump(spec, spec_file, sort_keys=False)
+            self.forget_yaml(file)
         return files
 
+    def add_snapshot_fingerprint_to_tags(self, file: str, fingerprint: str) -> None:
+        """
+        Add the snapshot fingerprint (see `create_snapshot_fingerprint`) to the
+        tags of the component specification file `file`.
+        """
+        import yaml
+
+        with open(file, "r") as spec_file:
+            spec = yaml.load(spec_file, Loader=yaml.FullLoader)
+        if not isinstance(spec, dict):
+            return
+        log.info(f"Snapshot fingerprint of {file} is {fingerprint}.")
+        cur_tag = spec.get("tags") or {}
+        cur_tag[SNAPSHOT_FINGERPRINT_TAG] = fingerprint
+        spec["tags"] = cur_tag
+        with open(file, "w") as spec_file:
+            yaml.dump(spec, spec_file, sort_keys=False)
+        self.forget_yaml(file)
+
     def find_component_specification_files_using_all(self, dir=None) -> List[str]:
         """
         Find all component specification files in the configured working
@@ -296,6 +426,8 @@ CATATTR1=0x00010001:OSAttr:2:6.2
         """
         This function returns the current repository, along with the name of the current and compliant branches [repo, current_branch, compliant_branch]. Throws if no repo can be found.
         """
+        from git import InvalidGitRepositoryError, NoSuchPathError, Repo
+
         # identify the repository
         curr_path = Path(self.config.working_directory).resolve()
         try:
@@ -412,20 +544,31 @@ CATATTR1=0x00010001:OSAttr:2:6.2
                 )
             self.log_commit_info(previous_commit, "Previous commit to compliant branch")
         # take the actual diff
-        diff = current_commit.tree.diff(previous_commit.tree)
-        # let's build a set with the paths of modified files found in the diff object
         log.debug("Working directory: " + self.config.working_directory)
         log.debug("repo.working_dir: " + repo.working_dir)
         log.debug("repo.working_tree_dir: " + repo.working_tree_dir)
         log.debug("repo.git_dir: " + repo.git_dir)
-        for d in diff:
-            log.debug("d.a_path: " + d.a_path)
-            log.debug("Path(d.a_path).absolute(): " + str(Path(d.a_path).absolute()))
-            log.debug("Path(d.a_path).resolve(): " + str(Path(d.a_path).resolve()))
-            r_a = str(Path(repo.git_dir).parent / Path(d.a_path))
-            res.add(r_a)
-            r_b = str(Path(repo.git_dir).parent / Path(d.b_path))
-            res.add(r_b)
+        git_diff_backend = self.config.git_diff_backend
+        if git_diff_backend == "git":
+            for path in self.get_modified_paths_using_git(
+                repo, current_commit, previous_commit
+            ):
+                res.add(str(Path(repo.git_dir).parent / Path(path)))
+        elif git_diff_backend == "gitpython":
+            diff = current_commit.tree.diff(previous_commit.tree)
+            # let's build a set with the paths of modified files found in the diff object
+            for d in diff:
+                log.debug("d.a_path: " + d.a_path)
+                log.debug(
+                    "Path(d.a_path).absolute(): " + str(Path(d.a_path).absolute())
+                )
+                log.debug("Path(d.a_path).resolve(): " + str(Path(d.a_path).resolve()))
+                r_a = str(Path(repo.git_dir).parent / Path(d.a_path))
+                res.add(r_a)
+                r_b = str(Path(repo.git_dir).parent / Path(d.b_path))
+                res.add(r_b)
+        else:
+            raise ValueError(f"Invalid git_diff_backend provided: '{git_diff_backend}'")
         log.info("The list of modified files is:")
         log.info(res)
         return res
@@ -443,9 +586,38 @@ CATATTR1=0x00010001:OSAttr:2:6.2
         This function will return the previous commit in the `repo`'s `compliant_branch_name` corresponding to a PR (i.e. that starts with "Merged PR").
         If `consider_current_commit` is set to True, the `latest_commit` will be considered. If set to false, only previous commits will be considered.
         """
+        key = (latest_commit.hexsha, consider_current_commit)
+        if key not in self._previous_compliant_commits:
+            self._previous_compliant_commits[key] = (
+                self._find_previous_compliant_commit_corresponding_to_pull_request(
+                    latest_commit, consider_current_commit
+                )
+            )
+        return self._previous_compliant_commits[key]
+
+    def _find_previous_compliant_commit_corresponding_to_pull_request(
+        self, latest_commit, consider_current_commit
+    ):
         target_string = "Merged PR"
         if consider_current_commit and latest_commit.summary.startswith(target_string):
             return latest_commit
+        if self.config.git_diff_backend == "git":
+            # Let git search the history, rather than walking it in Python
+            if not latest_commit.parents:
+                return latest_commit
+            output = latest_commit.repo.git.log(
+                latest_commit.hexsha + "^@",
+                "--max-count=1",
+                "--extended-regexp",
+                "--grep=^" + target_string,
+                "--format=%H %s",
+            )
+            if not output:
+                return latest_commit
+            hexsha, _, summary = output.partition(" ")
+            if summary.startswith(target_string):
+                return latest_commit.repo.commit(hexsha)
+            # The first match is not in a summary: fall back to the slow path
         previous_commit = latest_commit
         for c in previous_commit.iter_parents():
             if c.summary.startswith(target_string):
@@ -453,6 +625,21 @@ CATATTR1=0x00010001:OSAttr:2:6.2
                 break
         return previous_commit
 
+    def get_modified_paths_using_git(
+        self, repo, current_commit, previous_commit
+    ) -> List[str]:
+        """
+        This function returns the paths (relative to the root of 'repo') of the files that differ between the trees of 'current_commit' and 'previous_commit', using a single `git diff --name-only` call. Renamed files are listed under both their old and new names.
+        """
+        output = repo.git.diff(
+            "--name-only",
+            "--no-renames",
+            "-z",
+            previous_commit.hexsha,
+            current_commit.hexsha,
+        )
+        return [path for path in output.split("\0") if path]
+
     def get_compliant_commit_corresponding_to_pull_request(self, repo, compliant_branch):
         """
         This function will return the most recent commit in the repo that truly corresponds to the triggered build. It is identified thanks to the 'Build.SourceVersionMessage' DevOps environment variable (see https://docs.microsoft.com/en-us/azure/devops/pipelines/build/variables?view=azure-devops&tabs=yaml) that contains the true commit message. This is used to address the race condition occuring when a commit sneaks in before the "prepare" step was run on the previous commit.
@@ -479,29 +666,50 @@ CATATTR1=0x00010001:OSAttr:2:6.2
     def infer_active_components_from_modified_files(self, modified_files) -> List[str]:
         """
         This function returns the list of components (as a list of directories paths) potentially affected by changes in the `modified_files`.
+        It builds a path index of all components once (see `build_component_path_index`), so that each modified file is matched against all components with a handful of dictionary lookups.
         """
-        rv = []
         # We will go over components one by one
         all_components_in_repo = self.find_component_specification_files_using_all()
         log.info("List of all components in repo:")
         log.info(all_components_in_repo)
-        for component in all_components_in_repo:
-            if self.component_is_active(component, modified_files):
-                rv.append(component)
-        # No need to dedup rv since we are only considering components once
+        directory_index, file_index = self.build_component_path_index(
+            all_components_in_repo
+        )
+        active_components = set()
+        for modified_file in modified_files:
+            path = Path(modified_file).resolve()
+            active_components.update(file_index.get(str(path), ()))
+            for parent in path.parents:
+                active_components.update(directory_index.get(str(parent), ()))
+        # Keep the order in which components were found
+        rv = [c for c in all_components_in_repo if c in active_components]
         log.info("The active components are:")
         log.info(rv)
         return rv
 
-    def component_is_active(self, component, modified_files) -> bool:
+    def build_component_path_index(
+        self, components
+    ) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
         """
-        This function returns True if any of the 'modified_files' potentially affects the 'component' (i.e. if it is directly in one of the 'component' subfolders, or if it is covered by the additional_includes files). If the component has been deleted, returns False.
+        This function returns two dictionaries mapping resolved paths to the 'components' they affect: the first one maps directories (the folder of each component, and the folders listed in its additional_includes file) and the second one maps files (listed in the additional_includes file). A file affects a component if it is strictly inside one of its directories, or is one of its files. Deleted components are ignored.
+        """
+        directory_index: Dict[str, Set[str]] = collections.defaultdict(set)
+        file_index: Dict[str, Set[str]] = collections.defaultdict(set)
+        for component in components:
+            if not (Path(component).exists()):
+                continue
+            directory_index[str(Path(component).parent.resolve())].add(component)
+            for line in self.read_additional_includes(component) or []:
+                if Path(line).is_file():
+                    file_index[line].add(component)
+                elif Path(line).is_dir():
+                    directory_index[line].add(component)
+        return directory_index, file_index
+
+    def read_additional_includes(self, component) -> Optional[List[str]]:
+        """
+        This function returns the resolved paths listed in the additional_includes file of 'component', or None if it does not have one.
         """
-        log.info("Assessing whether component '" + component + "' is active...")
-        # Let's first take care of the case where the component has been deleted
-        if not (Path(component).exists()):
-            return False
-        # Let's grab the contents of the additional_includes file if it exists.
         # First, we figure out the name of the additional_includes file, based on the component name
         component_name_without_extension = Path(component).name.split(".yaml")[0]
         # Then, we construct the path of the additional_includes file
@@ -510,28 +718,32 @@ CATATTR1=0x00010001:OSAttr:2:6.2
             component_name_without_extension + ".additional_includes",
         )
         # And we finally load it
-        if Path(component_additional_includes_path).exists():
-            with open(
-                component_additional_includes_path, "r"
-            ) as component_additional_includes:
-                component_additional_includes_contents = (
-                    component_additional_includes.readlines()
-                )
-        else:
-            component_additional_includes_contents = None
+        if not Path(component_additional_includes_path).exists():
+            return None
+        with open(
+            component_additional_includes_path, "r"
+        ) as component_additional_includes:
+            component_additional_includes_contents = (
+                component_additional_includes.readlines()
+            )
         # make the paths in the additional_includes file absolute
-        if not (component_additional_includes_contents is None):
-            for line_number in range(0, len(component_additional_includes_contents)):
-                component_additional_includes_contents[line_number] = str(
-                    Path(
-                        os.path.join(
-                            Path(component).parent,
-                            component_additional_includes_contents[line_number].rstrip(
-                                "\n"
-                            ),
-                        )
-                    ).resolve()
-                )
+        return [
+            str(Path(os.path.join(Path(component).parent, line.rstrip("\n"))).resolve())
+            for line in component_additional_includes_contents
+        ]
+
+    def component_is_active(self, component, modified_files) -> bool:
+        """
+        This function returns True if any of the 'modified_files' potentially affects the 'component' (i.e. if it is directly in one of the 'component' subfolders, or if it is covered by the additional_includes files). If the component has been deleted, returns False.
+        """
+        log.info("Assessing whether component '" + component + "' is active...")
+        # Let's first take care of the case where the component has been deleted
+        if not (Path(component).exists()):
+            return False
+        # Let's grab the contents of the additional_includes file if it exists.
+        component_additional_includes_contents = self.read_additional_includes(
+            component
+        )
         # loop over all modified files; if current file is in subfolder of component or covered by additional includes, return True
         for modified_file in modified_files:
             if self.is_in_subfolder(
@@ -628,18 +840,112 @@ CATATTR1=0x00010001:OSAttr:2:6.2
             f"Writing Python package dependencies to path {path_to_requirements_files}"
         )
         os.makedirs(path_to_requirements_files)
+        if self.config.consolidate_requirements:
+            self._create_consolidated_requirements_files(
+                component_files, path_to_requirements_files
+            )
+            return id
         for component in component_files:
             self._create_requirements_file_for_single_component(
                 component, path_to_requirements_files
             )
         return id
 
+    def _create_consolidated_requirements_files(
+        self, component_files, path_to_requirements_files
+    ) -> None:
+        """
+        Write the Python package dependencies of all components, deduplicated:
+        each distinct set of normalized requirements is written once to
+        `requirement_sets/<id>/requirements.txt`, `manifest.json` maps each
+        component to its requirement set, and `requirements-union.txt` lists
+        the union of all requirements. Packages required with different
+        specifiers by different components cannot be installed together: they
+        are left out of `requirements-union.txt` and only listed, with their
+        specifiers, in the `conflicts` of `manifest.json`.
+        """
+        requirement_sets = {}
+        components = {}
+        for component in component_files:
+            pip_dependencies, _ = self._extract_dependencies_and_channels(component)
+            requirements = sorted(
+                {
+                    normalized
+                    for normalized in map(normalize_pip_requirement, pip_dependencies)
+                    if normalized
+                }
+            )
+            if not requirements:
+                continue
+            set_id = hashlib.sha256(
+                "\n".join(requirements).encode("utf-8")
+            ).hexdigest()[:16]
+            requirement_sets[set_id] = requirements
+            relative_path = os.path.relpath(component, self.config.working_directory)
+            components[relative_path.replace("\\", "/")] = {
+                "name": self.load_yaml(component).get("name"),
+                "requirement_set": set_id,
+            }
+
+        for set_id, requirements in requirement_sets.items():
+            cur_path = os.path.join(
+                path_to_requirements_files, "requirement_sets", set_id
+            )
+            os.makedirs(cur_path)
+            with open(os.path.join(cur_path, "requirements.txt"), "w") as file:
+                file.writelines(req + "\n" for req in requirements)
+
+        from packaging.requirements import InvalidRequirement, Requirement
+
+        union = sorted({req for reqs in requirement_sets.values() for req in reqs})
+
+        # Packages required with different specifiers by different components
+        specifiers = collections.defaultdict(set)
+        for req in union:
+            if not req.startswith("-"):
+                try:
+                    specifiers[Requirement(req).name].add(req)
+                except InvalidRequirement:
+                    pass
+        conflicts = {
+            name: sorted(reqs)
+            for name, reqs in sorted(specifiers.items())
+            if len(reqs) > 1
+        }
+        for name, reqs in conflicts.items():
+            log.warning(
+                f"Package {name} is required as: {', '.join(reqs)}. "
+                "It is left out of requirements-union.txt."
+            )
+
+        conflicting = {req for reqs in conflicts.values() for req in reqs}
+        with open(
+            os.path.join(path_to_requirements_files, "requirements-union.txt"), "w"
+        ) as file:
+            file.writelines(req + "\n" for req in union if req not in conflicting)
+
+        with open(
+            os.path.join(path_to_requirements_files, "manifest.json"), "w"
+        ) as file:
+            json.dump(
+                {
+                    "components": components,
+                    "requirement_sets": requirement_sets,
+                    "conflicts": conflicts,
+                },
+                file,
+                indent=4,
+            )
+        log.info(
+            f"Wrote {len(requirement_sets)} distinct requirement sets "
+            f"for {len(components)} components."
+        )
+
     def _create_requirements_file_for_single_component(
         self, component, path_to_requirements_files
     ) -> None:
         component_repo = Path(component).parent
-        with open(component, "r") as spec_file:
-            spec = YAML(typ="safe").load(spec_file)
+        spec = self.load_yaml(component)
         pip_dependencies, _ = self._extract_dependencies_and_channels(component)
         if pip_dependencies:
             component_name = spec.get("name")
@@ -660,63 +966,15 @@ CATATTR1=0x00010001:OSAttr:2:6.2
                         file.write("\n")
 
     def _extract_dependencies_and_channels(self, component) -> List[list]:
-        component_repo = Path(component).parent
-        with open(component, "r") as spec_file:
-            spec = YAML(typ="safe").load(spec_file)
-        pip_dependencies = []
-        conda_channels = []
-        if "environment" in spec:
-            spec_environment = spec.get("environment")
-            if "conda" in spec_environment:
-                spec_conda = spec_environment["conda"]
-                if "conda_dependencies" in spec_conda:
-                    requirements = spec_conda["conda_dependencies"]
-                    pip_dependencies += self._extract_python_package_dependencies(
-                        requirements
-                    )
-                    if "channels" in requirements:
-                        conda_channels += requirements["channels"]
-                if "conda_dependencies_file" in spec_conda:
-                    conda_dependencies_file = spec_conda["conda_dependencies_file"]
-                    try:
-                        with open(
-                            os.path.join(
-                                component_repo, spec_conda["conda_dependencies_file"]
-                            )
-                        ) as file:
-                            requirements = YAML(typ="safe").load(file)
-                        pip_dependencies += self._extract_python_package_dependencies(
-                            requirements
-                        )
-                        if "channels" in requirements:
-                            conda_channels += requirements["channels"]
-                    except FileNotFoundError:
-                        self.register_error(
-                            f"The required conda_dependencies_file {conda_dependencies_file} does not exist in {component_repo}."
-                        )
-                if "pip_requirements_file" in spec_conda:
-                    pip_requirements_file = spec_conda["pip_requirements_file"]
-                    try:
-                        with open(
-                            os.path.join(
-                                component_repo, spec_conda["pip_requirements_file"]
-                            )
-                        ) as file:
-                            pip_dependencies += file.readlines()
-                    except FileNotFoundError:
-                        self.register_error(
-                            f"The required pip_requirements_file {pip_requirements_file} does not exist in {component_repo}."
-                        )
+        pip_dependencies, conda_channels, errors = extract_dependencies_and_channels(
+            str(Path(component).parent), self.load_yaml(component), self.load_yaml
+        )
+        for error in errors:
+            self.register_error(error)
         return [pip_dependencies, conda_channels]
 
     def _extract_python_package_dependencies(self, conda_dependencies) -> List[str]:
-        pip_dependencies = []
-        if "dependencies" in conda_dependencies:
-            dependencies = conda_dependencies.get("dependencies")
-            for dependencies_item in dependencies:
-                if isinstance(dependencies_item, dict) and "pip" in dependencies_item:
-                    pip_dependencies = dependencies_item["pip"]
-        return pip_dependencies
+        return extract_python_package_dependencies(conda_dependencies)
 
     def run_with_config(self):
         log.info("Running component preparation logic.")
@@ -747,47 +1005,114 @@ CATATTR1=0x00010001:OSAttr:2:6.2
         For each component specification file, run `az ml component validate`,
         run compliance and customized validation if enabled,
         and register the status (+ register error if validation failed).
+        Up to `component_cli_workers` components are validated concurrently.
+        If `offline_component_validation` is set, components are validated
+        without the Azure CLI instead, see `validate_all_components_offline`.
         """
-        for component in files:
-            validate_component_success = self.execute_azure_cli_command(
-                f"ml component validate --file {component}"
-            )
-            compliance_validation_success = True
-            customized_validation_success = True
-            if self.config.enable_component_validation:
-                log.info(f"Running compliance validation on {component}")
-                compliance_validation_success = self.compliance_validation(component)
-                if len(self.config.component_validation) > 0:
-                    log.info(f"Running customized validation on {component}")
-                    for jsonpath, regex in self.config.component_validation.items():
-                        customized_validation_success = (
-                            customized_validation_success
-                            if self.customized_validation(jsonpath, regex, component)
-                            else False
-                        )
+        if not files:
+            return
+        if self.config.offline_component_validation:
+            self.validate_all_components_offline(files)
+        else:
+            self.for_each(self.validate_component, files)
 
-            if (
-                validate_component_success
-                and compliance_validation_success
-                and customized_validation_success
-            ):
-                # If the az ml validation succeeds, we continue to check whether
-                # the "code" snapshot parameter is specified in the spec file
-                # https://componentsdk.z22.web.core.windows.net/components/component-spec-topics/code-snapshot.html
-                with open(component, "r") as spec_file:
-                    spec = YAML(typ="safe").load(spec_file)
-                spec_code = spec.get("code")
-                if spec_code and spec_code not in [".", "./"]:
-                    self.register_component_status(component, "validate", "failed")
-                    self.register_error(
-                        "Code snapshot parameter is not supported. Please use .additional_includes for your component."
+    def validate_all_components_offline(self, files: List[str]) -> None:
+        """
+        Validate all component specification files locally, without running
+        `az ml component validate` (see `validate_component_offline`), in up to
+        `offline_validation_workers` worker processes, and register the
+        statuses (+ register error if validation failed). Compliance and
+        customized validation run if enabled.
+        """
+        rules = None
+        if self.config.enable_component_validation:
+            rules = self.get_validation_rules()
+        workers = min(self.config.offline_validation_workers, len(files))
+        log.info(
+            f"Validating {len(files)} components offline with {workers} worker processes."
+        )
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        validate_component_offline,
+                        files,
+                        itertools.repeat(rules),
+                        chunksize=max(1, len(files) // (workers * 4)),
                     )
-                else:
-                    log.info(f"Component {component} is valid.")
-                    self.register_component_status(component, "validate", "succeeded")
-            else:
+                )
+        else:
+            results = [validate_component_offline(file, rules) for file in files]
+
+        for component, errors in zip(files, results):
+            for error in errors:
+                log.error(error)
+            if errors:
                 self.register_component_status(component, "validate", "failed")
                 self.register_error(f"Error when validating component {component}.")
+            else:
+                log.info(f"Component {component} is valid.")
+                self.register_component_status(component, "validate", "succeeded")
+
+    def validate_component(self, component: str) -> None:
+        """
+        Validate a single component specification file, see
+        `validate_all_components`.
+        """
+        validate_component_success = self.execute_azure_cli_command(
+            f"ml component validate --file {component}"
+        )
+        compliance_validation_success = True
+        customized_validation_success = True
+        if self.config.enable_component_validation:
+            log.info(f"Running compliance validation on {component}")
+            compliance_validation_success = self.compliance_validation(component)
+            if len(self.config.component_validation) > 0:
+                log.info(f"Running customized validation on {component}")
+                violations = self.get_validation_rules().check_custom_rules(
+                    component, self.load_yaml(component)
+                )
+                for violation in violations:
+                    log.error(violation)
+                customized_validation_success = not violations
+
+        if (
+            validate_component_success
+            and compliance_validation_success
+            and customized_validation_success
+        ):
+            # If the az ml validation succeeds, we continue to check whether
+            # the "code" snapshot parameter is specified in the spec file
+            # https://componentsdk.z22.web.core.windows.net/components/component-spec-topics/code-snapshot.html
+            spec = self.load_yaml(component)
+            spec_code = spec.get("code")
+            if spec_code and spec_code not in [".", "./"]:
+                self.register_component_status(component, "validate", "failed")
+                self.register_error(
+                    "Code snapshot parameter is not supported. Please use .additional_includes for your component."
+                )
+            else:
+                log.info(f"Component {component} is valid.")
+                self.register_component_status(component, "validate", "succeeded")
+        else:
+            self.register_component_status(component, "validate", "failed")
+            self.register_error(f"Error when validating component {component}.")
+
+    def get_validation_rules(self) -> ComponentValidationRules:
+        """
+        Return the compliance and customized validation rules, compiled once
+        for all components.
+        """
+        with self._lock:
+            if self._validation_rules is None:
+                self._validation_rules = ComponentValidationRules(
+                    self.config.component_validation if self.config else {},
+                    ALLOWED_CONTAINER_REGISTRIES,
+                    ALLOWED_PACKAGE_FEEDS,
+                )
+            return self._validation_rules
 
     def compliance_validation(self, component: str) -> bool:
         """
@@ -795,67 +1120,36 @@ CATATTR1=0x00010001:OSAttr:2:6.2
         meets all the requirements for running in the compliant AML.
         Specifically, it checks (1) whether the image URL is compliant；
         （2）whether the pip index-url is compliant; (3) whether
-        "default" is only Conda channel
+        "default" is only Conda channel. All violations are logged.
         """
-        with open(component, "r") as spec_file:
-            spec = YAML(typ="safe").load(spec_file)
-
-        # Check whether the docker image URL is compliant
-        image_url = jsonpath_ng.parse("$.environment.docker.image").find(spec)
-        if len(image_url) > 0:
-            if (
-                urlparse(image_url[0].value).path.split("/")[0]
-                not in ALLOWED_CONTAINER_REGISTRIES
-            ):
-                log.error(
-                    f"The container base image in {component} is not allowed for compliant run."
-                )
-                return False
-
-        # check whether the package feed is compliant
+        spec = self.load_yaml(component)
         package_dependencies, conda_channels = self._extract_dependencies_and_channels(
             component=component
         )
-        if len(package_dependencies) > 0:
-            for dependency in package_dependencies:
-                if re.match("^--index-url", dependency) or re.match(
-                    "^--extra-index-url", dependency
-                ):
-                    if dependency.split(" ")[1] not in ALLOWED_PACKAGE_FEEDS:
-                        log.error(
-                            f"The package feed in {component} is not allowed for compliant run."
-                        )
-                        return False
-            if (
-                f"--index-url {ALLOWED_PACKAGE_FEEDS[0]}" not in package_dependencies
-                and f"--extra-index-url {ALLOWED_PACKAGE_FEEDS[0]}"
-                not in package_dependencies
-            ):
-                log.error(
-                    f"The Polymer package feed is not found in environment of {component}"
-                )
-                return False
-
-        # Check whether "default" is only Conda channel
-        if len(conda_channels) > 1 or (
-            len(conda_channels) == 1 and conda_channels[0] != "."
-        ):
-            log.error("Only the default conda channel is allowed for compliant run.")
-            return False
-
-        return True
+        violations = self.get_validation_rules().check_compliance(
+            component, spec, package_dependencies, conda_channels
+        )
+        for violation in violations:
+            log.error(violation)
+        return not violations
 
     @staticmethod
-    def customized_validation(jsonpath: str, regex: str, component: str) -> bool:
+    def customized_validation(
+        jsonpath: str, regex: str, component: str, spec: Any = None
+    ) -> bool:
         """
         This function leverages regular expressionm atching and
         JSONPath expression to enforce user-provided "strict"
-        validation on Azure ML components
+        validation on Azure ML components. If the parsed `spec` of the
+        component is provided, the component file is not read again.
         """
-        with open(component, "r") as spec_file:
-            spec = YAML(typ="safe").load(spec_file)
+        if spec is None:
+            from ruamel.yaml import YAML
+
+            with open(component, "r") as spec_file:
+                spec = YAML(typ="safe").load(spec_file)
 
-        parsed_patterns = jsonpath_ng.parse(jsonpath).find(spec)
+        parsed_patterns = _parse_jsonpath(jsonpath).find(spec)
         validation_success = True
         if len(parsed_patterns) > 0:
             for parsed_pattern in parsed_patterns:
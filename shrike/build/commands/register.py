@@ -1,15 +1,19 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT license.
 
+from collections import Counter, defaultdict
+import json
 import logging
 import re
 from pathlib import Path
-from typing import List
-from packaging.version import parse
-from ruamel.yaml import YAML
+from typing import Dict, List, Optional
 import os
 
 from shrike.build.core.command_line import Command
+from shrike.build.utils.utils import (
+    create_snapshot_fingerprint,
+    SNAPSHOT_FINGERPRINT_TAG,
+)
 
 log = logging.getLogger(__name__)
 
@@ -77,29 +81,170 @@ class Register(Command):
         if not list_registered_component_success:
             self.register_error(f"Error when listing registered components.")
 
-    def register_all_signed_components(self, files: List[str]) -> None:
+    def list_registered_component_index(self) -> Optional[Dict[str, Dict[str, dict]]]:
+        """
+        List the components registered in the attached workspace with a single
+        `az ml component list` call, and return a {name: {version: tags}}
+        index of them. Return None if the components could not be listed.
+
+        `az ml component list` only returns the default version of each
+        component: other versions are looked up with
+        `show_registered_component_tags`.
+        """
+        output: List[str] = []
+        success = self.execute_azure_cli_command(
+            "ml component list -o json", output=output
+        )
+        try:
+            registered_components = json.loads("\n".join(output)) if success else None
+        except ValueError:
+            registered_components = None
+        if not isinstance(registered_components, list):
+            log.warning("Unable to list registered components. Nothing is skipped.")
+            return None
+
+        index: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        for registered_component in registered_components:
+            name = registered_component.get("name")
+            version = registered_component.get("version") or registered_component.get(
+                "defaultVersion"
+            )
+            if name and version:
+                index[name][str(version)] = registered_component.get("tags") or {}
+        return index
+
+    def show_registered_component_tags(self, name: str, version: str) -> Optional[dict]:
+        """
+        Return the tags of version `version` of the component `name` registered
+        in the attached workspace, or None if it is not registered.
+        """
+        output: List[str] = []
+        success = self.execute_azure_cli_command(
+            f"ml component show --name {name} --version {version} -o json",
+            stderr_is_failure=False,
+            log_error=False,
+            output=output,
+        )
+        try:
+            registered_component = json.loads("\n".join(output)) if success else None
+        except ValueError:
+            registered_component = None
+        if not isinstance(registered_component, dict):
+            return None
+        return registered_component.get("tags") or {}
+
+    def read_snapshot_fingerprint(self, component: str) -> str:
+        """
+        Compute the snapshot fingerprint of a signed component from its
+        `catalog.json` file.
+        """
+        path = Path(component)
+        with open(path.parent / "catalog.json", "r") as file:
+            catalog = json.load(file)
+        return create_snapshot_fingerprint(catalog["CatalogItems"], path.name)
+
+    def is_component_unchanged(
+        self, component: str, index: Dict[str, Dict[str, dict]]
+    ) -> bool:
+        """
+        Return True if the same version of `component` is already registered
+        with the same snapshot fingerprint, according to `index` or, if that
+        version is not in `index`, to `az ml component show`.
+        """
+        from ruamel.yaml import YAML
+
+        yaml = YAML(typ="safe")
+        with open(component, "r") as file:
+            spec = yaml.load(file)
+        name = spec.get("name") if isinstance(spec, dict) else None
+        if not name:
+            return False
+        version = self.config.all_component_version or self.read_component_version(
+            component
+        )
+        tags = index.get(name, {}).get(str(version))
+        if tags is None:
+            tags = self.show_registered_component_tags(name, version)
+        if tags is None:
+            return False
+        fingerprint = self.read_snapshot_fingerprint(component)
+        if tags.get(SNAPSHOT_FINGERPRINT_TAG) == fingerprint:
+            return True
+        log.warning(
+            f"Version {version} of component {name} is already registered "
+            "with a different snapshot."
+        )
+        return False
+
+    def register_all_signed_components(
+        self, files: List[str], workspace_id: Optional[str] = None
+    ) -> None:
         """
         For each signed component specification file, run `az ml component create`,
         and register the status (+ register error if registration failed).
+        Up to `component_cli_workers` components are registered concurrently.
+        If `skip_unchanged_components` is set, components already registered
+        with the same version and snapshot fingerprint are skipped.
         """
-        for component in files:
+        if self.config.skip_unchanged_components:
+            index = self.list_registered_component_index()
+            if index is not None:
+                unchanged = self.for_each(
+                    lambda component: self.is_component_unchanged(component, index),
+                    files,
+                )
+                skipped = [f for f, same in zip(files, unchanged) if same]
+                for component in skipped:
+                    log.info(f"Component {component} is unchanged. Skipping it.")
+                    self._register_registration_status(
+                        component, workspace_id, "skipped"
+                    )
+                log.info(f"Skipping {len(skipped)} unchanged components.")
+                files = [f for f, same in zip(files, unchanged) if not same]
 
-            register_command, stderr_is_failure = self.register_component_command(
-                component
-            )
+        self.for_each(
+            lambda component: self.register_signed_component(component, workspace_id),
+            files,
+        )
 
-            register_component_success = self.execute_azure_cli_command(
-                command=register_command,
-                stderr_is_failure=stderr_is_failure,
+    def _register_registration_status(
+        self, component: str, workspace_id: Optional[str], status: str
+    ) -> None:
+        if workspace_id is not None:
+            workspace = self.parse_workspace_arm_id(workspace_id)[2]
+            self.register_component_status(
+                component, f"register in {workspace}", status
             )
-            if register_component_success:
-                log.info(f"Component {component} is registered.")
-                self.register_component_status(component, "register", "succeeded")
-            else:
-                self.register_component_status(component, "register", "failed")
-                self.register_error(f"Error when registering component {component}.")
+        # Do not hide a failure in one workspace behind a success in another one.
+        with self._lock:
+            statuses = self._component_statuses.setdefault(component, {})
+            if statuses.get("register") != "failed":
+                statuses["register"] = status
+
+    def register_signed_component(
+        self, component: str, workspace_id: Optional[str] = None
+    ) -> None:
+        """
+        Run `az ml component create` for a single signed component specification
+        file. If `workspace_id` is provided, the status is also registered per
+        workspace.
+        """
+        register_command, stderr_is_failure = self.register_component_command(component)
+
+        register_component_success = self.execute_azure_cli_command(
+            command=register_command,
+            stderr_is_failure=stderr_is_failure,
+        )
+        status = "succeeded" if register_component_success else "failed"
+        if register_component_success:
+            log.info(f"Component {component} is registered.")
+        else:
+            self.register_error(f"Error when registering component {component}.")
+        self._register_registration_status(component, workspace_id, status)
 
     def register_component_command(self, component):
+        from packaging.version import parse
+
         register_command = f"ml component create --file {component}"
         set_default_version = False
         component_raw_version = self.read_component_version(component)
@@ -108,7 +253,8 @@ class Register(Command):
             register_command += f" --version {self.config.all_component_version}"
             component_raw_version = self.config.all_component_version
             log.info(
-                f"Overwrite the component version with the specified value {self.config.all_component_version}"
+                "Overwrite the component version with the specified value "
+                f"{self.config.all_component_version}"
             )
         try:
             component_version = parse(component_raw_version)
@@ -120,12 +266,14 @@ class Register(Command):
         stderr_is_failure = self.config.fail_if_version_exists
         if set_default_version:
             log.info(
-                f"Component {component} version {component_raw_version} is production-ready. Setting as default."
+                f"Component {component} version {component_raw_version} is "
+                "production-ready. Setting as default."
             )
             register_command += f" --label default"
         else:
             log.info(
-                f"Component {component} version {component_raw_version} is not production-ready. NOT setting as default."
+                f"Component {component} version {component_raw_version} is not "
+                "production-ready. NOT setting as default."
             )
             stderr_is_failure = False
 
@@ -133,6 +281,8 @@ class Register(Command):
         return register_command, stderr_is_failure
 
     def read_component_version(self, yaml_file: str) -> str:
+        from ruamel.yaml import YAML
+
         yaml = YAML(typ="safe")
         with open(yaml_file, "r") as file:
             spec = yaml.load(file)
@@ -146,9 +296,54 @@ class Register(Command):
             )
             return spec["amlModuleIdentifier"]["moduleVersion"]
 
+    def register_in_workspace(self, workspace_id: str, files: List[str]) -> None:
+        """
+        Attach to the workspace `workspace_id`, then register all signed
+        components in it.
+        """
+        log.info(f"Start registering signed components in {workspace_id}")
+        self.attach_workspace(workspace_id)
+
+        log.info("List of components in workspace before current registration.")
+        self.list_registered_component()
+
+        self.register_all_signed_components(files=files, workspace_id=workspace_id)
+
+        log.info("List of components in workspace after current registration.")
+        self.list_registered_component()
+
+    def register_in_isolated_workspace(self, workspace_id: str, files: List[str]):
+        """
+        Same as `register_in_workspace`, but inside an isolated Azure CLI
+        session so that several workspaces can be handled concurrently.
+        """
+        with self.isolated_azure_cli_session():
+            self.register_in_workspace(workspace_id, files)
+
+    def display_all_statuses(self) -> None:
+        """
+        Display the number of components registered (or not) in each workspace.
+        """
+        summary: Dict[str, Counter] = defaultdict(Counter)
+        for statuses in self._component_statuses.values():
+            for status_name, status in statuses.items():
+                if status_name.startswith("register in "):
+                    workspace = status_name[len("register in ") :]
+                    summary[workspace][status] += 1
+        if not summary:
+            return
+        with self.emphasize():
+            log.info("Registration summary:")
+            for workspace, counter in summary.items():
+                log.info(
+                    f"{workspace}: {counter['succeeded']} succeeded, "
+                    f"{counter['failed']} failed, {counter['skipped']} skipped."
+                )
+
     def run_with_config(self):
         """
-        Running component registration logic.
+        Running component registration logic. Up to `workspace_workers`
+        workspaces are handled concurrently.
         """
         self.telemetry_logging(command="register")
 
@@ -157,17 +352,18 @@ class Register(Command):
 
         component_path = self.find_signed_component_specification_files()
         if len(component_path) > 0:
-            for workspace_id in self.config.workspaces:
-                log.info(f"Start registering signed components in {workspace_id}")
-                self.attach_workspace(workspace_id)
-
-                log.info("List of components in workspace before current registration.")
-                self.list_registered_component()
-
-                self.register_all_signed_components(files=component_path)
-
-                log.info("List of components in workspace after current registration.")
-                self.list_registered_component()
+            workspaces = self.config.workspaces
+            if self.config.workspace_workers > 1 and len(workspaces) > 1:
+                self.for_each(
+                    lambda workspace_id: self.register_in_isolated_workspace(
+                        workspace_id, component_path
+                    ),
+                    workspaces,
+                    max_workers=self.config.workspace_workers,
+                )
+            else:
+                for workspace_id in workspaces:
+                    self.register_in_workspace(workspace_id, component_path)
 
 
 if __name__ == "__main__":
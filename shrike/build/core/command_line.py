@@ -3,12 +3,21 @@
 
 from abc import ABC, abstractmethod
 import base64
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 import logging
-from omegaconf import OmegaConf
+import os
 from pathlib import Path
+import queue
+import shutil
 import subprocess
 import sys
-from typing import Any, Dict, List, Optional, Tuple, Union
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from dataclasses import asdict
 
 from shrike import __version__
@@ -17,6 +26,14 @@ from shrike.build.utils.utils import TelemetryLogger
 
 log = logging.getLogger(__name__)
 
+# Time given to a killed (timed out) command to close its pipes when its
+# output is streamed.
+_STREAM_GRACE_PERIOD_IN_SECONDS = 5
+
+
+def _decode_line(line: bytes) -> str:
+    return str(line, encoding="utf-8", errors="ignore").rstrip("\r\n")
+
 
 class _LogEmphasize:
     def __init__(self, line: str):
@@ -29,6 +46,178 @@ class _LogEmphasize:
         log.info(self.line)
 
 
+class _GroupedLogs:
+    """
+    Buffer the log records emitted by the current thread while inside a
+    `with` block, and emit them all at once when leaving it, so that logs of
+    tasks running concurrently do not interleave. If a `parent_buffer` is
+    provided (nested concurrent tasks), records are moved to it instead.
+    """
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _handlers: List[logging.Handler] = []
+    _installed = 0
+
+    class _Filter(logging.Filter):
+        def filter(self, record: logging.LogRecord) -> bool:
+            buffer = _GroupedLogs.current_buffer()
+            if buffer is None:
+                return True
+            # The same record goes through every root handler in a row.
+            if not buffer or buffer[-1] is not record:
+                buffer.append(record)
+            return False
+
+    _filter = _Filter()
+
+    @classmethod
+    def current_buffer(cls) -> Optional[List[logging.LogRecord]]:
+        return getattr(cls._local, "buffer", None)
+
+    @classmethod
+    def install(cls) -> None:
+        """
+        Attach the buffering filter to all root handlers.
+        """
+        with cls._lock:
+            if cls._installed == 0:
+                cls._handlers = list(logging.getLogger().handlers)
+                for handler in cls._handlers:
+                    handler.addFilter(cls._filter)
+            cls._installed += 1
+
+    @classmethod
+    def uninstall(cls) -> None:
+        with cls._lock:
+            cls._installed -= 1
+            if cls._installed == 0:
+                for handler in cls._handlers:
+                    handler.removeFilter(cls._filter)
+                cls._handlers = []
+
+    def __init__(self, parent_buffer: Optional[List[logging.LogRecord]] = None):
+        self.parent_buffer = parent_buffer
+
+    def __enter__(self):
+        self._local.buffer = []
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        buffer = self._local.buffer
+        self._local.buffer = None
+        with self._lock:
+            if self.parent_buffer is not None:
+                self.parent_buffer.extend(buffer)
+                return
+            # Only the root handlers buffered the records: handlers of other
+            # loggers have already emitted them.
+            for record in buffer:
+                for handler in _GroupedLogs._handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+
+class _AzureCliSession:
+    """
+    Long-lived PowerShell process running the Azure CLI commands it receives
+    over stdin, one at a time, so that each command does not pay for starting
+    a new PowerShell. Commands are provided base64-encoded, exactly like for
+    `pwsh -EncodedCommand`.
+    """
+
+    def __init__(self, env: Optional[Dict[str, str]] = None):
+        self.process = subprocess.Popen(
+            args=["pwsh", "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        self._lines: "queue.Queue[Tuple[str, Optional[bytes]]]" = queue.Queue()
+        for name, pipe in [
+            ("stdout", self.process.stdout),
+            ("stderr", self.process.stderr),
+        ]:
+            threading.Thread(target=self._read, args=(name, pipe), daemon=True).start()
+
+    def _read(self, name: str, pipe) -> None:
+        try:
+            for line in iter(pipe.readline, b""):
+                self._lines.put((name, line))
+        finally:
+            # Signal the end of this pipe, i.e. that the session is over.
+            self._lines.put((name, None))
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        if self.is_alive():
+            self.process.kill()
+        self.process.wait()
+
+    def run(
+        self,
+        az_command_b64: str,
+        working_dir: str,
+        timeout: int,
+        handle_stdout: Callable[[str], None],
+        handle_stderr: Optional[Callable[[str], None]],
+    ) -> Optional[int]:
+        """
+        Run the encoded command in `working_dir`, pass each line of its stdout
+        and stderr to the corresponding handler (stderr is forwarded to the
+        standard error of this process if `handle_stderr` is None), and return
+        its exit code. If the command times out, close the session and return
+        None.
+        """
+        # Written to stdout and stderr once the command is over, so that all of
+        # its output is known to have been read.
+        marker = f"__shrike_{uuid.uuid4().hex}__"
+        working_dir = working_dir.replace("'", "''")
+        script = (
+            "$global:LASTEXITCODE = 0; "
+            f"Set-Location -LiteralPath '{working_dir}'; "
+            "& ([ScriptBlock]::Create([Text.Encoding]::Unicode.GetString("
+            f"[Convert]::FromBase64String('{az_command_b64}')))); "
+            f"[Console]::Error.WriteLine('{marker}'); "
+            f'Write-Output "{marker}$LASTEXITCODE"\n'
+        )
+        self.process.stdin.write(script.encode("utf-8"))  # type: ignore
+        self.process.stdin.flush()  # type: ignore
+
+        deadline = time.monotonic() + timeout
+        pending = {"stdout", "stderr"}
+        returncode = 1
+        while pending:
+            try:
+                name, line = self._lines.get(
+                    timeout=max(deadline - time.monotonic(), 0)
+                )
+            except queue.Empty:
+                self.close()
+                return None
+            if line is None:
+                log.error("Azure CLI session exited unexpectedly.")
+                self.close()
+                return self.process.returncode or 1
+            text = _decode_line(line)
+            if marker in text:
+                pending.discard(name)
+                if name == "stdout":
+                    try:
+                        returncode = int(text.split(marker)[-1] or 0)
+                    except ValueError:
+                        pass
+            elif name == "stdout":
+                handle_stdout(text)
+            elif handle_stderr:
+                handle_stderr(text)
+            else:
+                print(text, file=sys.stderr)
+        return returncode
+
+
 class Command(ABC):
     """
     Commands exposed by this package should subclass this class and implement
@@ -41,6 +230,12 @@ class Command(ABC):
         self.config: Configuration = None  # type: ignore
         self._component_statuses: Dict[str, Dict[str, str]] = {}
         self._errors: List[str] = []
+        self._lock = threading.Lock()
+        # Per-thread overrides of the working directory and environment of
+        # shell commands, used to isolate concurrent Azure CLI sessions.
+        self._shell_context = threading.local()
+        # Azure CLI sessions, by thread and Azure CLI configuration directory.
+        self._azure_cli_sessions: Dict[Tuple[int, Optional[str]], _AzureCliSession] = {}
 
     def attach_workspace(self, workspace_id: str = None) -> None:
         """
@@ -126,10 +321,12 @@ class Command(ABC):
         working_dir: Optional[str] = None,
         stderr_is_failure: bool = True,
         log_error: bool = True,
+        output: Optional[List[str]] = None,
     ) -> bool:
         """
         Use this method, NOT `execute_command`, for running Azure CLI commands.
-        The `command` string should contain everything AFTER the `az`.
+        The `command` string should contain everything AFTER the `az`. If an
+        `output` list is provided, the lines of stdout are appended to it.
 
         This does NOT use the `azure-cli-core` Python package
         ( https://stackoverflow.com/a/55960725 ) because it takes a long time
@@ -137,101 +334,355 @@ class Command(ABC):
 
         This method is necessary for subtle reasons around the way Azure CLI
         exposes commands. The "naive approach" doesn't work.
+
+        With the default `azure_cli_backend` ("pwsh"), each command runs in a
+        new PowerShell process. With "pwsh_session", commands run in a
+        long-lived PowerShell process per thread, which avoids paying for a
+        PowerShell cold start on each command.
         """
         log.debug(f"Executing: az {command}")
         az_command_bytes = bytes(f"az {command}", "utf-16le")
         az_command_b64 = base64.b64encode(az_command_bytes).decode("ascii")
-        pwsh_command = ["pwsh", "-EncodedCommand", az_command_b64]
-        success = self.execute_command(
-            pwsh_command, working_dir, stderr_is_failure, log_error
-        )
+        backend = self.config.azure_cli_backend
+        if backend == "pwsh":
+            pwsh_command = ["pwsh", "-EncodedCommand", az_command_b64]
+            success = self.execute_command(
+                pwsh_command, working_dir, stderr_is_failure, log_error, output
+            )
+        elif backend == "pwsh_session":
+            if working_dir is None:
+                working_dir = getattr(
+                    self._shell_context,
+                    "working_directory",
+                    self.config.working_directory,
+                )
+            run = partial(self._run_in_azure_cli_session, az_command_b64)
+            success = self._execute(
+                run, working_dir, stderr_is_failure, log_error, output  # type: ignore
+            )
+        else:
+            raise ValueError(f"Invalid azure_cli_backend provided: '{backend}'")
         return success
 
+    def _run_in_azure_cli_session(
+        self,
+        az_command_b64: str,
+        working_dir: str,
+        env: Optional[Dict[str, str]],
+        timeout: int,
+        handle_stdout: Callable[[str], None],
+        handle_stderr: Optional[Callable[[str], None]],
+    ) -> Optional[int]:
+        """
+        Run the encoded Azure CLI command in the session of the current thread
+        and environment, starting it if needed.
+        """
+        key = (threading.get_ident(), (env or os.environ).get("AZURE_CONFIG_DIR"))
+        with self._lock:
+            session = self._azure_cli_sessions.get(key)
+        if session is None or not session.is_alive():
+            # Sessions of threads which are over will not be used anymore.
+            alive = {thread.ident for thread in threading.enumerate()}
+            self.close_azure_cli_sessions(lambda k: k[0] not in alive or k == key)
+            session = _AzureCliSession(env)
+            with self._lock:
+                self._azure_cli_sessions[key] = session
+        return session.run(
+            az_command_b64, working_dir, timeout, handle_stdout, handle_stderr
+        )
+
+    def close_azure_cli_sessions(
+        self, predicate: Optional[Callable[[Tuple[int, Optional[str]]], bool]] = None
+    ) -> None:
+        """
+        Close the Azure CLI sessions (see `azure_cli_backend`) whose
+        (thread identifier, Azure CLI configuration directory) key matches
+        `predicate`, or all of them if no predicate is provided.
+        """
+        with self._lock:
+            keys = [
+                k for k in self._azure_cli_sessions if predicate is None or predicate(k)
+            ]
+            sessions = [self._azure_cli_sessions.pop(k) for k in keys]
+        for session in sessions:
+            session.close()
+
     def execute_command(
         self,
         command: List[str],
         working_dir: Optional[str] = None,
         stderr_is_failure: bool = True,
         log_error: bool = True,
+        output: Optional[List[str]] = None,
     ) -> bool:
         """
         Execute the provided shell command using the configured timeout. Working
         directory defaults to the configured one. If `stderr_is_failure` is
         set to false, stderr from the command will be converted to "vanilla"
-        logs and will not affect success.
+        logs and will not affect success. If an `output` list is provided, the
+        lines of stdout are appended to it (and only logged in debug mode).
 
-        Logs are NOT streamed realtime - they are "bundled together" after the
-        command executes or times out.
+        By default, logs are NOT streamed realtime - they are "bundled together"
+        after the command executes or times out. If `stream_shell_command_output`
+        is set, each line is logged as soon as the command outputs it instead.
 
         Warning: running `az *` naively via this function will not work, since
         the Azure CLI is not, by default, discoverable via `subprocess.run`.
         """
         if working_dir is None:
-            working_dir = self.config.working_directory
+            working_dir = getattr(
+                self._shell_context,
+                "working_directory",
+                self.config.working_directory,
+            )
 
         if len(command) > 0 and command[0] == "az":
             raise ValueError(
                 "Do not run Azure CLI commands with this function. Use execute_azure_cli_command instead."
             )
 
-        kwargs = {}
-
-        if stderr_is_failure:
-            kwargs["stderr"] = subprocess.PIPE
-
         log.debug(f"Executing {command} in {working_dir}")
 
+        if self.config.stream_shell_command_output:
+            run = partial(self._stream_command, command)
+        else:
+            run = partial(self._run_command, command)
+        return self._execute(run, working_dir, stderr_is_failure, log_error, output)
+
+    def _execute(
+        self,
+        run: Callable[..., Optional[int]],
+        working_dir: str,
+        stderr_is_failure: bool,
+        log_error: bool,
+        output: Optional[List[str]],
+    ) -> bool:
+        """
+        Call `run(working_dir, env, timeout, handle_stdout, handle_stderr)`,
+        which should run a command and return its exit code (None if it timed
+        out), then log the outcome and return whether the command succeeded.
+        """
         timeout = self.config.shell_command_timeout_in_seconds
+        env = getattr(self._shell_context, "env", None)
+        has_stderr = False
+
+        def handle_stdout(line: str) -> None:
+            if output is None:
+                log.info(line)
+            else:
+                log.debug(line)
+                output.append(line)
+
+        def handle_stderr(line: str) -> None:
+            nonlocal has_stderr
+            has_stderr = True
+            log.error(line)
+
+        # Only capture stderr if it is a failure, otherwise let it through.
+        stderr_handler = handle_stderr if stderr_is_failure else None
+        returncode = run(working_dir, env, timeout, handle_stdout, stderr_handler)
+
+        success = returncode == 0
+        if returncode is None:
+            log.error(f"Command timed out after {timeout} seconds.")
+        elif not success:
+            if log_error:
+                log.error(f"Command failed with exit code {returncode}")
+            else:
+                log.info(f"Command failed with exit code {returncode}")
+
+        if has_stderr:
+            success = False
 
+        return success
+
+    def _run_command(
+        self,
+        command: List[str],
+        working_dir: str,
+        env: Optional[Dict[str, str]],
+        timeout: int,
+        handle_stdout: Callable[[str], None],
+        handle_stderr: Optional[Callable[[str], None]],
+    ) -> Optional[int]:
+        """
+        Run `command` until it exits or times out, then pass each line of its
+        stdout and stderr to the corresponding handler. If `handle_stderr` is
+        None, stderr is not captured. Return the exit code of the command, or
+        None if it timed out.
+        """
         try:
             res = subprocess.run(
                 args=command,
                 cwd=working_dir,
                 stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE if handle_stderr else None,
                 timeout=timeout,
-                **kwargs,
+                env=env,
             )
-
-            success = res.returncode == 0
-
-            if not success:
-                if log_error:
-                    log.error(f"Command failed with exit code {res.returncode}")
-                else:
-                    log.info(f"Command failed with exit code {res.returncode}")
-
+            returncode: Optional[int] = res.returncode
             stdout = res.stdout
             stderr = res.stderr
         except subprocess.TimeoutExpired as e:
-            log.error(f"Command timed out after {timeout} seconds.")
-            success = False
+            returncode = None
             stdout = e.stdout
             stderr = e.stderr
 
-        if stdout:
-            for line in stdout.splitlines():
-                try:
-                    line = str(line, encoding="utf-8", errors="ignore")  # type: ignore
-                except:
-                    log.debug(
-                        "Failed to convert the following stdout line into String (utf-8)"
-                    )
-                log.info(line)
-        if stderr:
-            for line in stderr.splitlines():
-                try:
-                    line = str(line, encoding="utf-8", errors="ignore")  # type: ignore
-                except:
-                    log.debug(
-                        "Failed to convert the following stdout line into String (utf-8)"
-                    )
-                if stderr_is_failure:
-                    log.error(line)
-                    success = False
-                else:
-                    log.info(line)
+        for line in (stdout or b"").splitlines():
+            handle_stdout(_decode_line(line))
+        for line in (stderr or b"").splitlines():
+            handle_stderr(_decode_line(line))  # type: ignore
 
-        return success
+        return returncode
+
+    def _stream_command(
+        self,
+        command: List[str],
+        working_dir: str,
+        env: Optional[Dict[str, str]],
+        timeout: int,
+        handle_stdout: Callable[[str], None],
+        handle_stderr: Optional[Callable[[str], None]],
+    ) -> Optional[int]:
+        """
+        Run `command`, passing each line of its stdout and stderr to the
+        corresponding handler as soon as it is available. If `handle_stderr`
+        is None, stderr is not captured. The pipes are read
+        by background threads, but the handlers are called from the current
+        thread so that logs are grouped properly by `for_each`. Kill the
+        command once it times out, and return its exit code or None if it
+        timed out.
+        """
+        process = subprocess.Popen(
+            args=command,
+            cwd=working_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE if handle_stderr else None,
+            env=env,
+        )
+        lines: "queue.Queue[Tuple[Optional[Callable[[str], None]], bytes]]" = (
+            queue.Queue()
+        )
+
+        def read(pipe, handle: Callable[[str], None]) -> None:
+            try:
+                for line in iter(pipe.readline, b""):
+                    lines.put((handle, line))
+            finally:
+                pipe.close()
+                # Signal the end of this pipe.
+                lines.put((None, b""))
+
+        pipes = [(process.stdout, handle_stdout)]
+        if handle_stderr:
+            pipes.append((process.stderr, handle_stderr))
+        for pipe, handle in pipes:
+            threading.Thread(target=read, args=(pipe, handle), daemon=True).start()
+
+        deadline = time.monotonic() + timeout
+        open_pipes = len(pipes)
+        timed_out = False
+        while open_pipes > 0:
+            try:
+                handle, line = lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                if timed_out:
+                    # Processes spawned by the command may keep the pipes open.
+                    break
+                timed_out = True
+                process.kill()
+                # Give the readers some time to flush the remaining output.
+                deadline = time.monotonic() + _STREAM_GRACE_PERIOD_IN_SECONDS
+                continue
+            if handle is None:
+                open_pipes -= 1
+            else:
+                handle(_decode_line(line))
+
+        if not timed_out:
+            try:
+                return process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                pass
+        process.kill()
+        process.wait()
+        return None
+
+    def for_each(
+        self,
+        function: Callable[[Any], Any],
+        items: Iterable[Any],
+        max_workers: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Call `function` on each item (e.g., component or workspace) and return
+        the list of results, in the same order as `items`. Up to `max_workers`
+        (by default, the configured `component_cli_workers`) calls run
+        concurrently; the logs of each call are then grouped together instead
+        of interleaving.
+        """
+        items = list(items)
+        if len(items) > 1 and max_workers is None:
+            max_workers = self.config.component_cli_workers
+
+        if len(items) <= 1 or max_workers <= 1:  # type: ignore
+            return [function(item) for item in items]
+
+        parent_buffer = _GroupedLogs.current_buffer()
+        shell_context = dict(vars(self._shell_context))
+
+        def grouped_function(item: Any) -> Any:
+            vars(self._shell_context).update(shell_context)
+            try:
+                with _GroupedLogs(parent_buffer):
+                    return function(item)
+            finally:
+                vars(self._shell_context).clear()
+
+        _GroupedLogs.install()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(grouped_function, items))
+        finally:
+            _GroupedLogs.uninstall()
+
+    @contextmanager
+    def isolated_azure_cli_session(self):
+        """
+        Use this to initialize a `with` block in which Azure CLI commands run
+        by the current thread use their own configuration directory (a copy of
+        the current one) and working directory. This allows commands like
+        `az account set` and `az ml folder attach` to run concurrently for
+        several workspaces without colliding.
+        """
+        config_dir = os.environ.get("AZURE_CONFIG_DIR") or os.path.join(
+            os.path.expanduser("~"), ".azure"
+        )
+        extension_dir = os.environ.get("AZURE_EXTENSION_DIR") or os.path.join(
+            config_dir, "cliextensions"
+        )
+        with tempfile.TemporaryDirectory(prefix="shrike-az-") as directory:
+            session_config_dir = os.path.join(directory, ".azure")
+            if os.path.isdir(config_dir):
+                shutil.copytree(
+                    config_dir,
+                    session_config_dir,
+                    ignore=shutil.ignore_patterns(
+                        "cliextensions", "commands", "logs", "telemetry*"
+                    ),
+                )
+            else:
+                os.makedirs(session_config_dir)
+            env = dict(os.environ)
+            env["AZURE_CONFIG_DIR"] = session_config_dir
+            env["AZURE_EXTENSION_DIR"] = extension_dir
+            self._shell_context.working_directory = directory
+            self._shell_context.env = env
+            try:
+                yield directory
+            finally:
+                vars(self._shell_context).clear()
+                self.close_azure_cli_sessions(lambda k: k[1] == session_config_dir)
 
     def normalize_path(self, path: Union[str, Path], directory=False) -> str:
         """
@@ -270,11 +721,12 @@ class Command(ABC):
         Register a status (e.g., build = failed) for a specified component. All
         statuses will be displayed in a friendly manner before exiting.
         """
-        if component_name not in self._component_statuses:
-            self._component_statuses[component_name] = {}
+        with self._lock:
+            if component_name not in self._component_statuses:
+                self._component_statuses[component_name] = {}
 
-        status_dict = self._component_statuses[component_name]
-        status_dict[status_name] = status
+            status_dict = self._component_statuses[component_name]
+            status_dict[status_name] = status
 
     def register_error(self, error: str) -> None:
         """
@@ -282,7 +734,8 @@ class Command(ABC):
         been registered, the `run` method will return with non-zero exit code.
         """
         log.error(error)
-        self._errors.append(error)
+        with self._lock:
+            self._errors.append(error)
 
     def telemetry_logging(self, command: str) -> None:
         """
@@ -307,6 +760,8 @@ class Command(ABC):
         """
         config = load_configuration()
 
+        from omegaconf import OmegaConf
+
         log_level = "DEBUG" if config.verbose else "INFO"
         logging.basicConfig(level=log_level, format=config.log_format)
 
@@ -316,7 +771,10 @@ class Command(ABC):
             log.info(config_yaml)
 
         self.config = config
-        self.run_with_config()
+        try:
+            self.run_with_config()
+        finally:
+            self.close_azure_cli_sessions()
 
         self.display_all_statuses()
 
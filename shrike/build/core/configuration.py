@@ -4,7 +4,6 @@
 from dataclasses import asdict, dataclass, field, replace
 import logging
 import os
-from omegaconf.omegaconf import OmegaConf
 import sys
 from typing import Any, Dict, List
 import warnings
@@ -41,6 +40,19 @@ class Configuration:
     suppress_adding_repo_pr_tags: bool = field(default=False)
     enable_component_validation: bool = field(default=False)
     component_validation: dict = field(default_factory=dict)
+    catalog_hashing_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    use_hash_cache: bool = field(default=False)
+    hash_cache_file: str = field(default=".build/hash-cache.json")
+    verify_hash_cache: bool = field(default=False)
+    component_cli_workers: int = field(default=1)
+    workspace_workers: int = field(default=1)
+    skip_unchanged_components: bool = field(default=False)
+    stream_shell_command_output: bool = field(default=False)
+    azure_cli_backend: str = field(default="pwsh")
+    git_diff_backend: str = field(default="gitpython")
+    offline_component_validation: bool = field(default=False)
+    offline_validation_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    consolidate_requirements: bool = field(default=False)
 
 
 def load_configuration() -> Configuration:
@@ -97,6 +109,9 @@ def load_configuration_from_args_and_env(
     # Load config from command line
     cli_config = load_configuration_from_args(args)
 
+    # Imported once the arguments are parsed, so that `--help` stays fast.
+    from omegaconf import OmegaConf
+
     # Load config parameters specified in environment variables
     env_config = {
         key.lower(): value
@@ -172,6 +187,14 @@ def load_configuration_from_args_and_env(
     config = OmegaConf.merge(default_config, cli_and_file_config)
     config = Configuration(**config)  # type: ignore
 
+    if config.catalog_hashing_workers <= 0:
+        default_workers = default_config.catalog_hashing_workers
+        log.warning(
+            f"catalog_hashing_workers must be positive, using {default_workers} "
+            f"instead of {config.catalog_hashing_workers}."
+        )
+        config = replace(config, catalog_hashing_workers=default_workers)
+
     # Load the environment variable of source branch into config
     if "BUILD_SOURCEBRANCH" in env.keys():
         config = replace(config, source_branch=env["BUILD_SOURCEBRANCH"])
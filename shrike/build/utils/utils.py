@@ -5,10 +5,23 @@ import json
 import os
 import hashlib
 import logging
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional
+from shrike._core.telemetry import TelemetryLogger
 
 log = logging.getLogger(__name__)
 
+# Tag added to signed component specifications, see
+# create_snapshot_fingerprint().
+SNAPSHOT_FINGERPRINT_TAG = "snapshot_fingerprint"
+
+# Size of the blocks read from disk when hashing a file. Large blocks keep the
+# number of read calls low for big (e.g., vendored model) files.
+HASH_BLOCK_SIZE = 1024 * 1024
+
 
 def create_catalog_stub():
     """
@@ -20,33 +33,196 @@ def create_catalog_stub():
     return json_stub
 
 
-def create_SHA_256_hash_of_file(file):
+class HashCache:
     """
-    Function that returns the SHA 256 hash of 'file'.\n
+    Persistent {<file>: <SHA 256 hash of file>} cache, stored as JSON in 'path'.
+    Entries are keyed on the absolute path of the file, and are only reused if
+    the size, modification time and inode of the file did not change. If
+    'verify' is set, cached hashes are recomputed and compared instead of being
+    trusted.
+    """
+
+    VERSION = 1
+    # Files modified this recently are not cached, since a later modification
+    # within the file system timestamp granularity would go unnoticed.
+    RACY_INTERVAL_IN_SECONDS = 2
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r") as file:
+                content = json.load(file)
+            if content["version"] == self.VERSION:
+                return content["entries"]
+            log.info(f"Ignoring hash cache {self.path} with a different version.")
+        except FileNotFoundError:
+            log.info(f"Hash cache {self.path} does not exist yet.")
+        except (ValueError, KeyError, TypeError):
+            log.warning(f"Hash cache {self.path} is corrupted. Ignoring it.")
+        return {}
+
+    @staticmethod
+    def _signature(stat: os.stat_result) -> List[int]:
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def get_or_create(self, file: str, create_hash: Callable[[], str]) -> str:
+        """
+        Return the cached hash of 'file' if it is still valid, otherwise call
+        'create_hash' and cache its result.
+        """
+        key = os.path.abspath(file)
+        stat = os.stat(key)
+        signature = self._signature(stat)
+        with self._lock:
+            entry = self._entries.get(key)
+        cached_hash = (
+            entry["hash"] if entry and entry["signature"] == signature else None
+        )
+
+        if cached_hash is not None and not self.verify:
+            with self._lock:
+                self.hits += 1
+            return cached_hash
+
+        hash_of_file = create_hash()
+        with self._lock:
+            if cached_hash is None:
+                self.misses += 1
+            elif cached_hash == hash_of_file:
+                self.hits += 1
+            else:
+                self.mismatches += 1
+                log.warning(f"Cached hash of {key} is outdated. Using the new one.")
+            if time.time() - stat.st_mtime > self.RACY_INTERVAL_IN_SECONDS:
+                self._entries[key] = {"signature": signature, "hash": hash_of_file}
+            else:
+                self._entries.pop(key, None)
+        return hash_of_file
+
+    def save(self) -> None:
+        """
+        Prune the entries of files which do not exist anymore, then write the
+        cache to disk.
+        """
+        with self._lock:
+            entries = {
+                key: entry
+                for key, entry in self._entries.items()
+                if os.path.isfile(key)
+            }
+            self._entries = entries
+        log.info(
+            f"Hash cache: {self.hits} hits, {self.misses} misses, {self.mismatches} mismatches."
+        )
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so that an interrupted run never
+        # leaves a truncated cache behind.
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"version": self.VERSION, "entries": entries}, file)
+        os.replace(temporary_path, self.path)
+
+
+def create_SHA_256_hash_of_file(file, block_size=HASH_BLOCK_SIZE, cache=None):
+    """
+    Function that returns the SHA 256 hash of 'file'. If a HashCache 'cache' is
+    provided, the hash is only computed if 'file' changed since it was cached.\n
     Logic taken from https://www.quickprogrammingtips.com/python/how-to-calculate-sha256-hash-of-a-file-in-python.html
     """
+    if cache is not None:
+        return cache.get_or_create(
+            file, lambda: create_SHA_256_hash_of_file(file, block_size)
+        )
     sha256_hash = hashlib.sha256()
-    with open(file, "rb") as f:
-        # Read and update hash string value in blocks of 4K
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(file, "rb", buffering=0) as f:
+        # Read and update hash string value in blocks of `block_size`, reusing
+        # the same buffer to avoid an allocation per block
+        for size in iter(lambda: f.readinto(buffer), 0):
+            sha256_hash.update(view[:size])
         # Converting to upper case because that's what is required by the policy
         # service. See their code:
         # https://dev.azure.com/msasg/Bing_and_IPG/_git/Aether?path=/src/aether/platform/backendV2/BlueBox/PolicyService/Microsoft.MachineLearning.PolicyService/Workers/CatalogValidation.cs
         return sha256_hash.hexdigest().upper()
 
 
-def add_file_to_catalog(file_for_catalog, catalog, absolute_path_to_remove):
+def create_SHA_256_hashes_of_files(
+    files: List[str],
+    max_workers: Optional[int] = None,
+    cache: Optional[HashCache] = None,
+) -> Dict[str, str]:
+    """
+    Function that returns a {<file>: <SHA 256 hash of file>} dictionary for all
+    'files', hashing up to 'max_workers' files concurrently. Threads are enough
+    here since hashlib releases the GIL while hashing large blocks.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = executor.map(partial(create_SHA_256_hash_of_file, cache=cache), files)
+        return dict(zip(files, hashes))
+
+
+def add_file_to_catalog(
+    file_for_catalog, catalog, absolute_path_to_remove, hash_of_file=None, cache=None
+):
     """
     Function that adds an entry for 'file_for_catalog' to the 'catalog'.\n
-    Specifically, {<Relative path of file>: <Hash of file>} will be added to the "CatalogItems" dictionary of the 'catalog' json, where <Hash of file> is computed with the create_SHA_256_hash_of_file() function, and <Relative path of file> is obtained by removing 'absolute_path_to_remove' from the full 'file_for_catalog' path
+    Specifically, {<Relative path of file>: <Hash of file>} will be added to the "CatalogItems" dictionary of the 'catalog' json, where <Hash of file> is computed with the create_SHA_256_hash_of_file() function using the optional HashCache 'cache' (unless a precomputed 'hash_of_file' is provided), and <Relative path of file> is obtained by removing 'absolute_path_to_remove' from the full 'file_for_catalog' path
     """
-    hash_of_file = create_SHA_256_hash_of_file(file_for_catalog)
+    if hash_of_file is None:
+        hash_of_file = create_SHA_256_hash_of_file(file_for_catalog, cache=cache)
     relative_path = file_for_catalog.split(absolute_path_to_remove)[1]
     catalog["CatalogItems"][relative_path] = hash_of_file
     return catalog
 
 
+def create_snapshot_fingerprint(catalog_items, specification_file_name):
+    """
+    Function that returns a SHA 256 fingerprint of a component snapshot, given
+    the {<Relative path of file>: <Hash of file>} 'catalog_items' of its catalog.
+    The specification file 'specification_file_name' is excluded, so that the
+    fingerprint can be stored in the specification itself without changing it.
+    """
+    items = sorted(
+        (path, hash_of_file)
+        for path, hash_of_file in catalog_items.items()
+        if path != specification_file_name
+    )
+    return hashlib.sha256(json.dumps(items).encode("utf-8")).hexdigest().upper()
+
+
+def normalize_pip_requirement(line: str) -> Optional[str]:
+    """
+    Function that returns the normalized form of the pip requirements file line
+    'line' (e.g., 'NumPy >= 1.19' -> 'numpy>=1.19'), or None for blank lines and
+    comments. Option lines (e.g., '--index-url ...') and lines which are not
+    valid requirements are only stripped.
+    """
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.utils import canonicalize_name
+
+    line = line.split(" #")[0].strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("-"):
+        return " ".join(line.split())
+    try:
+        requirement = Requirement(line)
+    except InvalidRequirement:
+        return line
+    requirement.name = canonicalize_name(requirement.name)
+    return str(requirement)
+
+
 def write_two_catalog_files(catalog, path):
     """
     Function that writes 'catalog' into 2 duplicate files: "path/config.json" and "path/config.json.sig".
@@ -71,59 +247,3 @@ def delete_two_catalog_files(path):
     if os.path.exists(file_path_json_sig):
         log.warning(f"{file_path_json_sig} already exists. Deleting it")
         os.remove(file_path_json_sig)
-
-
-class TelemetryLogger:
-    """Utils class for opencensus azure monitor"""
-
-    def __init__(
-        self, enable_telemetry=True, instrumentation_key=None, level=logging.INFO
-    ):
-        self.logger = logging.getLogger("telemetry_logger")
-        self.logger.setLevel(level)
-        self.enable_telemetry = enable_telemetry
-        # Why is it okay to include this key directly in the source code?
-        # For any client-side tool, there is a fundamental problem with protecting instrumentation
-        # keys. You want the published tool to be able to collect telemetry, but the only way
-        # it can do this is if it has some kind of instrumentation key.
-        #
-        # For an authoritative example, the dotnet CLI contains their telemetry key in a
-        # public GitHub repository:
-        # https://github.com/dotnet/cli/blob/master/src/dotnet/Telemetry/Telemetry.cs
-        #
-        # The underlying Azure resource is called `aml1p-ml-tooling`.
-        self.instrumentation_key = (
-            "aaefce9e-d109-4fac-bb9f-8277c68e91ac"
-            if instrumentation_key is None
-            else instrumentation_key
-        )
-        handler = AzureLogHandler(
-                connection_string=f"InstrumentationKey={self.instrumentation_key}"
-            )
-        handler.add_telemetry_processor(self.scrubber_function)
-        self.logger.addHandler(handler)
-
-    def log_trace(self, message, properties={}, level=logging.INFO):
-        if self.enable_telemetry:
-            try:
-                if level == logging.INFO:
-                    self.logger.info(message, extra=properties)
-                elif level == logging.WARNING:
-                    self.logger.warning(message, extra=properties)
-                elif level == logging.ERROR:
-                    self.logger.error(message, extra=properties)
-                elif level == logging.CRITICAL:
-                    self.logger.critical(message, extra=properties)
-                else:
-                    log.error("The logging level is not expected!")
-            except Exception as ex:
-                log.warning("Send telemetry exception: %s", str(ex))
-        else:
-            log.info(
-                "Sending trace log messages to application insight has been disabled."
-            )
-    
-    # Callback function to scrub some columns
-    def scrubber_function(self, envelope):
-        envelope.tags['ai.cloud.roleInstance'] = 'cloud_RoleInstance_Scrubbed'
-        envelope.tags["ai.location.ip"] = "IP_Scrubbed"
@@ -0,0 +1,271 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import functools
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+log = logging.getLogger(__name__)
+
+_DOCKER_IMAGE_JSONPATH = "$.environment.docker.image"
+_INDEX_URL_PATTERN = re.compile("^--(extra-)?index-url")
+
+# Fields checked by the offline validation when the azure-ml-component package
+# is not installed.
+REQUIRED_SPECIFICATION_FIELDS = ["name", "version", "type"]
+
+
+class ComponentValidationRules:
+    """
+    Component validation rules, compiled once and then applied to any number of
+    component specifications: the built-in compliance rules (allowed container
+    registries, package feeds and conda channels) and the customized
+    {<JSONPath expression>: <regular expression>} 'custom_rules'. Every
+    violation is reported, instead of only the first one.
+    """
+
+    def __init__(
+        self,
+        custom_rules: Dict[str, str],
+        allowed_container_registries: List[str],
+        allowed_package_feeds: List[str],
+    ):
+        import jsonpath_ng
+
+        self.allowed_container_registries = set(allowed_container_registries)
+        self.allowed_package_feeds = allowed_package_feeds
+        self.docker_image = jsonpath_ng.parse(_DOCKER_IMAGE_JSONPATH)
+        self.custom_rules: List[Tuple[str, Any, Any]] = [
+            (regex, jsonpath_ng.parse(jsonpath), re.compile(regex))
+            for jsonpath, regex in custom_rules.items()
+        ]
+
+    def check_compliance(
+        self,
+        component: str,
+        spec: Any,
+        package_dependencies: List[str],
+        conda_channels: List[str],
+    ) -> List[str]:
+        """
+        Return the violations of the compliance rules by the specification
+        'spec' of 'component', given its Python 'package_dependencies' and
+        'conda_channels'.
+        """
+        violations = []
+
+        # Check whether the docker image URL is compliant
+        for image_url in self.docker_image.find(spec)[:1]:
+            registry = urlparse(image_url.value).path.split("/")[0]
+            if registry not in self.allowed_container_registries:
+                violations.append(
+                    f"The container base image in {component} is not allowed for compliant run."
+                )
+
+        # check whether the package feed is compliant
+        if len(package_dependencies) > 0:
+            for dependency in package_dependencies:
+                if _INDEX_URL_PATTERN.match(dependency):
+                    if dependency.split(" ")[1] not in self.allowed_package_feeds:
+                        violations.append(
+                            f"The package feed in {component} is not allowed for compliant run."
+                        )
+                        break
+            if (
+                f"--index-url {self.allowed_package_feeds[0]}"
+                not in package_dependencies
+                and f"--extra-index-url {self.allowed_package_feeds[0]}"
+                not in package_dependencies
+            ):
+                violations.append(
+                    f"The Polymer package feed is not found in environment of {component}"
+                )
+
+        # Check whether "default" is only Conda channel
+        if len(conda_channels) > 1 or (
+            len(conda_channels) == 1 and conda_channels[0] != "."
+        ):
+            violations.append(
+                "Only the default conda channel is allowed for compliant run."
+            )
+
+        return violations
+
+    def check_custom_rules(self, component: str, spec: Any) -> List[str]:
+        """
+        Return the violations of the customized rules by the specification
+        'spec' of 'component'.
+        """
+        violations = []
+        for regex, jsonpath, pattern in self.custom_rules:
+            for parsed_pattern in jsonpath.find(spec):
+                if not pattern.match(parsed_pattern.value):
+                    violations.append(
+                        f"The parsed pattern {parsed_pattern} in {component} doesn't match the regular expression {regex}"
+                    )
+        return violations
+
+
+def extract_python_package_dependencies(conda_dependencies) -> List[str]:
+    """
+    Return the pip dependencies listed in the 'conda_dependencies' dictionary.
+    """
+    pip_dependencies = []
+    if "dependencies" in conda_dependencies:
+        dependencies = conda_dependencies.get("dependencies")
+        for dependencies_item in dependencies:
+            if isinstance(dependencies_item, dict) and "pip" in dependencies_item:
+                pip_dependencies = dependencies_item["pip"]
+    return pip_dependencies
+
+
+def extract_dependencies_and_channels(
+    component_repo: str, spec: Any, load_yaml: Callable[[str], Any]
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Return the Python package dependencies and conda channels of the component
+    specification 'spec' located in 'component_repo', and the errors met while
+    reading the dependency files it references (loaded with 'load_yaml').
+    """
+    pip_dependencies: List[str] = []
+    conda_channels: List[str] = []
+    errors = []
+    if "environment" in spec:
+        spec_environment = spec.get("environment")
+        if "conda" in spec_environment:
+            spec_conda = spec_environment["conda"]
+            if "conda_dependencies" in spec_conda:
+                requirements = spec_conda["conda_dependencies"]
+                pip_dependencies += extract_python_package_dependencies(requirements)
+                if "channels" in requirements:
+                    conda_channels += requirements["channels"]
+            if "conda_dependencies_file" in spec_conda:
+                conda_dependencies_file = spec_conda["conda_dependencies_file"]
+                try:
+                    requirements = load_yaml(
+                        os.path.join(component_repo, conda_dependencies_file)
+                    )
+                    pip_dependencies += extract_python_package_dependencies(
+                        requirements
+                    )
+                    if "channels" in requirements:
+                        conda_channels += requirements["channels"]
+                except FileNotFoundError:
+                    errors.append(
+                        f"The required conda_dependencies_file {conda_dependencies_file} does not exist in {component_repo}."
+                    )
+            if "pip_requirements_file" in spec_conda:
+                pip_requirements_file = spec_conda["pip_requirements_file"]
+                try:
+                    with open(
+                        os.path.join(component_repo, pip_requirements_file)
+                    ) as file:
+                        pip_dependencies += file.readlines()
+                except FileNotFoundError:
+                    errors.append(
+                        f"The required pip_requirements_file {pip_requirements_file} does not exist in {component_repo}."
+                    )
+    return pip_dependencies, conda_channels, errors
+
+
+def _load_yaml(file: str) -> Any:
+    from ruamel.yaml import YAML
+
+    with open(file, "r") as yaml_file:
+        return YAML(typ="safe").load(yaml_file)
+
+
+@functools.lru_cache(maxsize=None)
+def _component_definition_class():
+    """
+    Return the `ComponentDefinition` class of azure-ml-component, or None if it
+    is not available, and log (once) which schema check is in use.
+    """
+    try:
+        from azure.ml import component  # noqa: F401
+    except ImportError:
+        log.info(
+            "azure-ml-component is not installed: the component specifications "
+            f"are only checked for the fields {REQUIRED_SPECIFICATION_FIELDS}."
+        )
+        return None
+    try:
+        from azure.ml.component._core._component_definition import (
+            ComponentDefinition,
+        )
+    except ImportError:
+        log.warning(
+            "The installed version of azure-ml-component does not provide "
+            "ComponentDefinition: the component specifications are only checked "
+            f"for the fields {REQUIRED_SPECIFICATION_FIELDS}."
+        )
+        return None
+    log.info(
+        "The component specifications are checked with the ComponentDefinition "
+        "of azure-ml-component."
+    )
+    return ComponentDefinition
+
+
+def check_component_schema(component: str, spec: Any) -> List[str]:
+    """
+    Return the errors found when checking that 'spec' follows the component
+    schema: with `ComponentDefinition` if the azure-ml-component package is
+    installed, otherwise by checking the presence of the required fields.
+    """
+    if not isinstance(spec, dict):
+        return [f"{component} is not a valid component specification."]
+    component_definition = _component_definition_class()
+    if component_definition is not None:
+        try:
+            component_definition.load(component)
+        except Exception as e:
+            return [f"{component} is not a valid component specification: {e}"]
+        return []
+    return [
+        f"The required field '{field}' is missing in {component}."
+        for field in REQUIRED_SPECIFICATION_FIELDS
+        if not spec.get(field)
+    ]
+
+
+def validate_component_offline(
+    component: str, rules: Optional[ComponentValidationRules] = None
+) -> List[str]:
+    """
+    Validate the component specification file 'component' without calling the
+    Azure CLI, and return the list of errors. Check that it follows the schema
+    (see `check_component_schema`), that it does not use the unsupported "code"
+    snapshot parameter and, if 'rules' are provided, that it respects them.
+    This is a module-level function so that it can run in worker processes.
+    """
+    try:
+        spec = _load_yaml(component)
+    except Exception as e:
+        return [f"Unable to load {component}: {e}"]
+    errors = check_component_schema(component, spec)
+    if errors:
+        return errors
+
+    spec_code = spec.get("code")
+    if spec_code and spec_code not in [".", "./"]:
+        errors.append(
+            "Code snapshot parameter is not supported. Please use .additional_includes for your component."
+        )
+
+    if rules is not None:
+        pip_dependencies, conda_channels, dependency_errors = (
+            extract_dependencies_and_channels(
+                str(Path(component).parent), spec, _load_yaml
+            )
+        )
+        errors += dependency_errors
+        errors += rules.check_compliance(
+            component, spec, pip_dependencies, conda_channels
+        )
+        errors += rules.check_custom_rules(component, spec)
+    return errors
@@ -18,6 +18,8 @@ from .data_conversions import (  # noqa: F401
     get_pandas_series_info,
     get_spark_dataframe_info,
     get_vaex_dataframe_info,
+    get_data_info,
+    register_info_converter,
     collect_spark_dataframe,
     collect_pandas_dataframe,
     collect_vaex_dataframe,
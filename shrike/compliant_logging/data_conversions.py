@@ -6,9 +6,35 @@ Provides a list of conversion functions based
 on which libraries are available for import
 """
 
-from typing import Any, Optional
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from .exceptions import PublicRuntimeError
 
+# Classes of the optional libraries, by (module, class name). A class is only
+# looked up once its module has been imported (by the caller): an object cannot
+# be an instance of a class whose module was never imported, hence the optional
+# libraries are never imported (or failed to import) just to check a type.
+_optional_classes: Dict[Tuple[str, str], type] = {}
+
+
+def _optional_class(module: str, name: str) -> Optional[type]:
+    """
+    Returns the class `name` of the module `module`, or None if the module has
+    not been imported.
+    """
+    key = (module, name)
+    cls = _optional_classes.get(key)
+    if cls is None and module in sys.modules:
+        cls = getattr(sys.modules[module], name, None)
+        if cls is not None:
+            _optional_classes[key] = cls
+    return cls
+
+
+def _is_instance(obj: Any, module: str, name: str) -> bool:
+    cls = _optional_class(module, name)
+    return cls is not None and isinstance(obj, cls)
+
 
 # spark functions
 def is_spark_dataframe(obj: Any) -> bool:  # type: ignore
@@ -21,11 +47,7 @@ def is_spark_dataframe(obj: Any) -> bool:  # type: ignore
     Returns:
         bool: True if a dataframe, otherwise False
     """
-    try:
-        from pyspark.sql import DataFrame  # noqa
-    except Exception:
-        return False
-    return isinstance(obj, DataFrame)
+    return _is_instance(obj, "pyspark.sql", "DataFrame")
 
 
 def get_spark_dataframe_info(df: Any) -> str:  # type: ignore
@@ -117,11 +139,7 @@ def is_vaex_dataframe(obj: Any) -> bool:  # type: ignore
     Returns:
         bool: True if a DataFrame otherwise False
     """
-    try:
-        from vaex.dataframe import DataFrame as VaexDataFrame  # noqa
-    except Exception:
-        return False
-    return isinstance(obj, VaexDataFrame)
+    return _is_instance(obj, "vaex.dataframe", "DataFrame")
 
 
 def get_vaex_dataframe_info(df: Any) -> str:  # type: ignore
@@ -208,11 +226,7 @@ def is_numpy_array(obj: Any) -> bool:  # type: ignore
     Returns:
         bool: True if the object is a numpy array otherwise False
     """
-    try:
-        import numpy as np  # noqa
-    except Exception:
-        return False
-    return isinstance(obj, np.ndarray)
+    return _is_instance(obj, "numpy", "ndarray")
 
 
 def get_numpy_array_info(arr: Any) -> str:  # type: ignore
@@ -264,11 +278,7 @@ def is_pandas_series(obj: Any) -> bool:  # type: ignore
     Returns:
         bool: True if object is a series otherwise False
     """
-    try:
-        import pandas as pd  # noqa
-    except Exception:
-        return False
-    return isinstance(obj, pd.Series)
+    return _is_instance(obj, "pandas", "Series")
 
 
 def is_pandas_dataframe(obj: Any) -> bool:  # type: ignore
@@ -281,11 +291,7 @@ def is_pandas_dataframe(obj: Any) -> bool:  # type: ignore
     Returns:
         bool: True if object is a DataFrame otherwise False
     """
-    try:
-        import pandas as pd  # noqa
-    except Exception:
-        return False
-    return isinstance(obj, pd.DataFrame)
+    return _is_instance(obj, "pandas", "DataFrame")
 
 
 def get_pandas_series_info(series: Any) -> str:  # type: ignore
@@ -383,3 +389,63 @@ def collect_pandas_dataframe(df: Any) -> dict:  # type: ignore
             "Pandas Series not supported in the current environment."
         )
     return df.to_dict("list")
+
+
+# type dispatch
+_info_converters: List[Tuple[str, str, Callable[[Any], str]]] = [
+    ("pyspark.sql", "DataFrame", get_spark_dataframe_info),
+    ("vaex.dataframe", "DataFrame", get_vaex_dataframe_info),
+    ("pandas", "DataFrame", get_pandas_dataframe_info),
+    ("pandas", "Series", get_pandas_series_info),
+    ("numpy", "ndarray", get_numpy_array_info),
+]
+_info_converter_of_type: Dict[type, Optional[Callable[[Any], str]]] = {}
+
+
+def register_info_converter(
+    module: str, name: str, converter: Callable[[Any], str]
+) -> None:
+    """
+    Registers a function providing the info string of the instances of the
+    class `name` of the module `module` (e.g. "polars", "DataFrame"). The
+    module does not need to be installed. Converters registered last take
+    precedence.
+
+    Args:
+        module (str): Module of the class
+        name (str): Name of the class
+        converter (Callable[[Any], str]): Function returning the info string
+            of an instance of the class
+    """
+    _info_converters.insert(0, (module, name, converter))
+    _info_converter_of_type.clear()
+
+
+def get_data_info(obj: Any) -> Optional[str]:  # type: ignore
+    """
+    Provides information about the given object if it is a supported data type
+    (Spark, Vaex or pandas DataFrame, pandas Series, numpy array, or a type
+    registered with `register_info_converter`). The converter is looked up
+    once per type of object.
+
+    Args:
+        obj (Any): The object to provide information for
+
+    Returns:
+        Optional[str]: info string about the object, or None if its type is
+            not supported
+    """
+    obj_type = type(obj)
+    try:
+        converter = _info_converter_of_type[obj_type]
+    except KeyError:
+        converter = None
+        for module, name, candidate in _info_converters:
+            cls = _optional_class(module, name)
+            if cls is not None and issubclass(obj_type, cls):
+                converter = candidate
+                break
+        _info_converter_of_type[obj_type] = converter
+    if converter is None:
+        return None
+    return converter(obj)
@@ -6,7 +6,7 @@ Utilities around logging data which may or may not contain private content.
 """
 
 
-from shrike.compliant_logging.exceptions import PublicRuntimeError
+from shrike.compliant_logging.exceptions import PublicRuntimeError, PublicValueError
 from typing import Optional, Iterable
 from shrike.compliant_logging.constants import DataCategory
 from shrike.compliant_logging.data_conversions import (
@@ -18,16 +18,22 @@ from shrike.compliant_logging.data_conversions import (
     is_pandas_series,
     is_spark_dataframe,
     is_vaex_dataframe,
-    get_numpy_array_info,
-    get_pandas_dataframe_info,
-    get_pandas_series_info,
-    get_spark_dataframe_info,
-    get_vaex_dataframe_info,
+    get_data_info,
     numpy_array_to_list,
     pandas_series_to_list,
 )
+from shrike.compliant_logging.spark_metrics import (
+    spark_accuracy_table,
+    spark_confusion_matrix,
+    spark_predictions,
+    spark_residuals,
+)
+import atexit
+import copy
 from datetime import datetime
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 import sys
 from threading import Lock
 
@@ -35,6 +41,7 @@ from threading import Lock
 _LOCK = Lock()
 _PREFIX = None
 _AML_RUN = None
+_QUEUE_LISTENER = None
 
 
 def set_prefix(prefix: str) -> None:
@@ -86,6 +93,32 @@ def floating_range(buckets):
     return [x / 100 for x in list(range(0, 100, int(100 / (buckets - 1)))) + [100]]
 
 
+class _MessageWithItems:
+    """
+    Log message followed by the descriptions of some items, which are only
+    computed (once) when a handler formats the record. Describing an item may
+    be expensive (e.g., counting the rows of a Spark DataFrame), hence is
+    skipped for records that no handler emits.
+    """
+
+    def __init__(self, logger, msg, items, category):
+        self.logger = logger
+        self.msg = msg
+        self.items = items
+        self.category = category
+        self._message = None
+
+    def __str__(self):
+        if self._message is None:
+            self._message = f"{self.msg} | " + " | ".join(
+                [self.logger._convert_obj(item, self.category) for item in self.items]
+            )
+        return self._message
+
+    def __repr__(self):
+        return repr(str(self))
+
+
 class CompliantLogger(logging.getLoggerClass()):  # type: ignore
     """
     Subclass of the default logging class with an explicit `category` parameter
@@ -138,20 +171,9 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
 
         # check through different types of objects
         try:
-            if is_spark_dataframe(obj):
-                return get_spark_dataframe_info(obj)
-
-            if is_vaex_dataframe(obj):
-                return get_vaex_dataframe_info(obj)
-
-            if is_pandas_dataframe(obj):
-                return get_pandas_dataframe_info(obj)
-
-            if is_pandas_series(obj):
-                return get_pandas_series_info(obj)
-
-            if is_numpy_array(obj):
-                return get_numpy_array_info(obj)
+            data_info = get_data_info(obj)
+            if data_info is not None:
+                return data_info
 
             if isinstance(obj, Iterable):
                 list_str = f"List (Count: {len(obj)})"  # type: ignore
@@ -213,13 +235,11 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
         else:
             extra = {"prefix": p}
 
-        # update message accordingly to items
+        # update message accordingly to items, when the record is formatted
         if items is not None:
             if not isinstance(items, list):
                 items = [items]
-            msg += " | " + " | ".join(
-                [self._convert_obj(item, category) for item in items]
-            )
+            msg = _MessageWithItems(self, msg, items, category)
 
         if sys.version_info[1] <= 7:
             super(CompliantLogger, self)._log(
@@ -489,16 +509,28 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
             Matrix: A truth matrix in format [P, 4] that contains tp, fp, tn, fn for
                 each of the thresholds
         """
-        cl_table = []
-        for thres in thresholds:
-            cl_res = [
-                (predict >= thres) & (target == class_id),
-                (predict >= thres) & (target != class_id),
-                (predict < thres) & (target != class_id),
-                (predict < thres) & (target == class_id),
-            ]
-            cl_table.append([x.sum() for x in cl_res])
-        return cl_table
+        import numpy as np
+
+        # the number of predictions >= each threshold is found by binary search
+        # in the sorted predictions of the class and of the rest, which is
+        # O((N + P) log N) instead of evaluating masks over the N rows for each
+        # of the P thresholds
+        predict = np.asarray(predict, dtype=float)
+        is_class = np.asarray(target == class_id)
+        # rows with a NaN prediction are neither >= nor < any threshold
+        is_valid = ~np.isnan(predict)
+        class_predict = np.sort(predict[is_valid & is_class])
+        rest_predict = np.sort(predict[is_valid & ~is_class])
+
+        thresholds = np.asarray(thresholds, dtype=float)
+        tp = len(class_predict) - np.searchsorted(class_predict, thresholds)
+        fp = len(rest_predict) - np.searchsorted(rest_predict, thresholds)
+        cl_table = np.stack(
+            [tp, fp, len(rest_predict) - fp, len(class_predict) - tp], axis=1
+        )
+        # no prediction is either >= or < a NaN threshold
+        cl_table[np.isnan(thresholds)] = 0
+        return cl_table.tolist()
 
     def metric_accuracy_table(
         self,
@@ -511,6 +543,7 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
         percentile_thresholds=[0.0, 0.01, 0.24, 0.98, 1.0],
         class_labels=None,
         category=DataCategory.PRIVATE,
+        accuracy=10000,
     ):
         """
         Equivalent of the `Run.log_accuracy_table` function.
@@ -537,17 +570,44 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
                 or a number of evenly spaced threshold points. Defaults to a list.
             category (DataCategory, optional): Classification of the data category.
                 Defaults to DataCategory.PRIVATE.
+            accuracy (int, optional): Only used for a Spark DataFrame, whose
+                percentiles are approximated with a relative error of
+                1 / accuracy. If None, the exact percentiles are computed (like
+                for other tables), which is slower on large DataFrames.
+                Defaults to 10000.
         """
         # retrieve the context
         run = self._get_aml_context()
 
+        # compute ranges
+        if isinstance(probability_thresholds, int):
+            probability_thresholds = floating_range(probability_thresholds)
+        if isinstance(percentile_thresholds, int):
+            percentile_thresholds = floating_range(percentile_thresholds)
+
+        # aggregate spark dataframes on the cluster, only the result is collected
+        if is_spark_dataframe(value):
+            try:
+                value = spark_accuracy_table(
+                    value,
+                    col_predict,
+                    col_target,
+                    probability_thresholds,
+                    percentile_thresholds,
+                    class_labels,
+                    accuracy,
+                )
+            except Exception:
+                raise PublicRuntimeError(
+                    "Unable to aggregate the given Spark DataFrame! "
+                    + "Make sure that correct data is passed."
+                )
+
         # convert data if not already pre-computed
         if not isinstance(value, dict) or "schema_type" not in value:
             # check the data
             if is_vaex_dataframe(value):
                 value = collect_vaex_dataframe(value)
-            if is_spark_dataframe(value):
-                value = collect_spark_dataframe(value)
             if is_pandas_dataframe(value):
                 value = collect_pandas_dataframe(value)
 
@@ -575,12 +635,6 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
                 if class_labels is None:
                     class_labels = class_list
 
-                # compute ranges
-                if isinstance(probability_thresholds, int):
-                    probability_thresholds = floating_range(probability_thresholds)
-                if isinstance(percentile_thresholds, int):
-                    percentile_thresholds = floating_range(percentile_thresholds)
-
                 # compute one-vs-rest labels for the class
                 prob_tables = []
                 perc_tables = []
@@ -663,6 +717,16 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
         # retrieve the context
         run = self._get_aml_context()
 
+        # aggregate spark dataframes on the cluster, only the result is collected
+        if is_spark_dataframe(value):
+            try:
+                value = spark_confusion_matrix(value, idx_true, idx_pred, labels)
+            except Exception:
+                raise PublicRuntimeError(
+                    "Unable to aggregate the given Spark DataFrame! "
+                    + "Make sure that correct data is passed."
+                )
+
         # convert data if not already pre-computed
         if (
             not isinstance(value, dict)
@@ -672,8 +736,6 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
             # check the data
             if is_vaex_dataframe(value):
                 value = collect_vaex_dataframe(value)
-            if is_spark_dataframe(value):
-                value = collect_spark_dataframe(value)
             if is_pandas_dataframe(value):
                 value = collect_pandas_dataframe(value)
 
@@ -764,6 +826,20 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
         # retrieve the context
         run = self._get_aml_context()
 
+        # compute edges automatically
+        if isinstance(bin_edges, int):
+            bin_edges = floating_range(bin_edges)
+
+        # aggregate spark dataframes on the cluster, only the result is collected
+        if is_spark_dataframe(value):
+            try:
+                value = spark_predictions(value, col_predict, col_target, bin_edges)
+            except Exception:
+                raise PublicRuntimeError(
+                    "Unable to aggregate the given Spark DataFrame! "
+                    + "Make sure that correct data is passed."
+                )
+
         # convert data if not already pre-computed
         if (
             not isinstance(value, dict)
@@ -773,8 +849,6 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
             # check the data
             if is_vaex_dataframe(value):
                 value = collect_vaex_dataframe(value)
-            if is_spark_dataframe(value):
-                value = collect_spark_dataframe(value)
             if is_pandas_dataframe(value):
                 value = collect_pandas_dataframe(value)
 
@@ -795,10 +869,6 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
                         "The col_predict and col_target columns are both required."
                     )
 
-                # compute edges automatically
-                if isinstance(bin_edges, int):
-                    bin_edges = floating_range(bin_edges)
-
                 # compute groupings in bins
                 df["bin"] = pd.cut(df[col_target], bin_edges)
                 df["error"] = (df[col_predict] - df[col_target]).abs()
@@ -861,6 +931,20 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
         # retrieve the context
         run = self._get_aml_context()
 
+        # check if bins should be generated automatically
+        if isinstance(bin_edges, int):
+            bin_edges = floating_range(bin_edges)
+
+        # aggregate spark dataframes on the cluster, only the result is collected
+        if is_spark_dataframe(value):
+            try:
+                value = spark_residuals(value, col_predict, col_target, bin_edges)
+            except Exception:
+                raise PublicRuntimeError(
+                    "Unable to aggregate the given Spark DataFrame! "
+                    + "Make sure that correct data is passed."
+                )
+
         # convert data if not already pre-computed
         if (
             not isinstance(value, dict)
@@ -870,8 +954,6 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
             # check the data
             if is_vaex_dataframe(value):
                 value = collect_vaex_dataframe(value)
-            if is_spark_dataframe(value):
-                value = collect_spark_dataframe(value)
             if is_pandas_dataframe(value):
                 value = collect_pandas_dataframe(value)
 
@@ -894,10 +976,6 @@ class CompliantLogger(logging.getLoggerClass()):  # type: ignore
                         "The col_predict and col_target columns are both required."
                     )
 
-                # check if bins should be generated automatically
-                if isinstance(bin_edges, int):
-                    bin_edges = floating_range(bin_edges)
-
                 # compute the values
                 df["residual"] = df[col_predict] - df[col_target]
                 df["bin"] = pd.cut(df[col_target], bin_edges)
@@ -980,8 +1058,103 @@ https://github.com/Azure/confidential-ml-utils/issues/33 for more information.
 """
 
 
+_OVERFLOW_POLICIES = ["block", "drop"]
+
+
+class _CompliantQueueHandler(QueueHandler):
+    """
+    Queue handler which either waits for space in a full queue (`overflow`
+    "block") or drops the record (`overflow` "drop", the number of dropped
+    records is kept in `dropped`). Records with a prefix (i.e. public ones) are
+    never dropped.
+    """
+
+    def __init__(self, queue, overflow):
+        super().__init__(queue)
+        self.overflow = overflow
+        self.dropped = 0
+        self._dropped_lock = Lock()
+
+    def prepare(self, record):
+        # The message (and the items it describes) and the traceback are
+        # resolved on the calling thread, the rest of the formatting happens on
+        # the thread of the listener. Attributes like `prefix` are kept as-is.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == "block" or getattr(record, "prefix", None):
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _CompliantQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for space in a full queue, so that pending records are flushed.
+        self.queue.put(self._sentinel)
+
+
+def _stop_queue_listener() -> None:
+    """
+    Flush the records queued by the asynchronous handlers (if any) to the
+    actual handlers, stop the thread emitting them, and put the actual handlers
+    back on the root logger.
+    """
+    global _QUEUE_LISTENER
+    with _LOCK:
+        listener, _QUEUE_LISTENER = _QUEUE_LISTENER, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in logging.root.handlers[:]:
+        if isinstance(handler, _CompliantQueueHandler):
+            if handler.dropped:
+                sys.stderr.write(
+                    f"{get_prefix()}{handler.dropped} log records were dropped "
+                    "because the logging queue was full.\n"
+                )
+            logging.root.removeHandler(handler)
+    for handler in listener.handlers:
+        logging.root.addHandler(handler)
+
+
+atexit.register(_stop_queue_listener)
+
+
+def _enable_async_handlers(queue_size: int, overflow: str) -> None:
+    """
+    Move the handlers of the root logger behind a queue, emptied by a
+    background thread.
+    """
+    global _QUEUE_LISTENER
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    handlers = logging.root.handlers[:]
+    listener = _CompliantQueueListener(log_queue, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        logging.root.removeHandler(handler)
+    logging.root.addHandler(_CompliantQueueHandler(log_queue, overflow))
+    with _LOCK:
+        _QUEUE_LISTENER = listener
+    listener.start()
+
+
 def enable_compliant_logging(
-    prefix: str = "SystemLog:", use_aml_metrics: bool = False, **kwargs
+    prefix: str = "SystemLog:",
+    use_aml_metrics: bool = False,
+    async_handlers: bool = False,
+    queue_size: int = 10000,
+    overflow: str = "block",
+    **kwargs,
 ) -> None:
     """
     The default format is `logging.BASIC_FORMAT` (`%(levelname)s:%(name)s:%(message)s`).
@@ -994,6 +1167,13 @@ def enable_compliant_logging(
     If running in Python >= 3.8, will attempt to add `force=True` to the kwargs
     for logging.basicConfig.
 
+    If `async_handlers` is True, the handlers of the root logger run on a
+    background thread: log calls only put records in a queue of at most
+    `queue_size` records. When the queue is full, log calls either wait
+    (`overflow="block"`, the default) or drop the record (`overflow="drop"`).
+    Public records (logged with the prefix) always wait, and are never dropped.
+    Queued records are flushed at exit.
+
     After calling this method, use the kwarg `category` to pass in a value of
     `DataCategory` to denote data category. The default is `PRIVATE`. That is,
     if no changes are made to an existing set of log statements, the log output
@@ -1002,6 +1182,14 @@ def enable_compliant_logging(
     The standard implementation of the logging API is a good reference:
     https://github.com/python/cpython/blob/3.9/Lib/logging/__init__.py
     """
+    if overflow not in _OVERFLOW_POLICIES:
+        raise PublicValueError(
+            f"Unknown overflow policy {overflow}, expected one of {_OVERFLOW_POLICIES}"
+        )
+
+    # Flush the records of a previous call with `async_handlers=True`.
+    _stop_queue_listener()
+
     set_prefix(prefix)
 
     if "format" not in kwargs:
@@ -1031,6 +1219,9 @@ def enable_compliant_logging(
     # https://github.com/kivy/kivy/issues/6733
     logging.basicConfig(**kwargs)
 
+    if async_handlers:
+        _enable_async_handlers(queue_size, overflow)
+
 
 def enable_confidential_logging(
     prefix: str = "SystemLog:", use_aml_metrics: bool = False, **kwargs
@@ -0,0 +1,323 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Computes the values of the AML table metrics (accuracy table, confusion
+matrix, predictions and residuals) of a Spark DataFrame with Spark
+aggregations: only the (small) aggregated result is collected to the driver.
+"""
+
+from typing import Any, Dict, List, Optional, Union
+from .exceptions import PublicRuntimeError
+
+
+def _column_name(df: Any, col: Union[str, int, None]) -> str:  # type: ignore
+    """
+    Returns the name of the column `col` (name or index) of the dataframe.
+    """
+    if col is None:
+        raise PublicRuntimeError(
+            "The col_predict and col_target columns are both required."
+        )
+    if isinstance(col, int):
+        return df.columns[col]
+    return col
+
+
+def _bin_index(target: Any, bin_edges: list) -> Any:  # type: ignore
+    """
+    Returns a column with the index of the bin (edges[i], edges[i + 1]] of
+    `target`, null if the value is in no bin (like `pandas.cut`).
+    """
+    from pyspark.sql import functions as F
+
+    index = F.lit(None)
+    for i in reversed(range(len(bin_edges) - 1)):
+        index = F.when(
+            (target > bin_edges[i]) & (target <= bin_edges[i + 1]), i
+        ).otherwise(index)
+    return index
+
+
+def _bin_aggregates(df: Any, target: Any, bin_edges: list, **aggregates) -> dict:
+    """
+    Computes the given aggregates (name -> column) per bin of `target`, in one
+    pass over the dataframe.
+
+    Returns:
+        dict: name -> list of the aggregated values of each bin (None for an
+            empty bin)
+    """
+    rows = (
+        df.select("*", _bin_index(target, bin_edges).alias("__bin"))
+        .where("__bin IS NOT NULL")
+        .groupBy("__bin")
+        .agg(*[column.alias(name) for name, column in aggregates.items()])
+        .collect()
+    )
+    by_bin = {row["__bin"]: row for row in rows}
+    return {
+        name: [
+            by_bin[i][name] if i in by_bin else None for i in range(len(bin_edges) - 1)
+        ]
+        for name in aggregates
+    }
+
+
+def _truth_matrices(
+    df: Any, predict: Any, target: Any, thresholds: Dict[Any, List[float]]
+) -> Dict[Any, List[List[int]]]:
+    """
+    Computes the truth matrices [tp, fp, tn, fn] of each class (one-vs-rest) for
+    each of its thresholds, in one pass over the dataframe: only the number of
+    rows (of the class) with a prediction above each threshold are aggregated.
+    """
+    from pyspark.sql import functions as F
+
+    def count(condition):
+        return F.sum(F.when(condition, 1).otherwise(0))
+
+    columns = [count(F.lit(True))]
+    for class_id, class_thresholds in thresholds.items():
+        columns.append(count(target == class_id))
+        for threshold in class_thresholds:
+            columns.append(count(predict >= threshold))
+            columns.append(count((predict >= threshold) & (target == class_id)))
+    counts = iter(df.select(predict, target).agg(*columns).first())
+
+    total = next(counts)
+    matrices = {}
+    for class_id, class_thresholds in thresholds.items():
+        positives = next(counts)
+        matrix = []
+        for _ in class_thresholds:
+            above = next(counts)
+            tp = next(counts)
+            fp = above - tp
+            fn = positives - tp
+            matrix.append([tp, fp, total - positives - fp, fn])
+        matrices[class_id] = matrix
+    return matrices
+
+
+def spark_accuracy_table(
+    df: Any,
+    col_predict: Union[str, int, None],
+    col_target: Union[str, int, None],
+    probability_thresholds: List[float],
+    percentile_thresholds: List[float],
+    class_labels: Optional[list] = None,
+    accuracy: Optional[int] = 10000,
+) -> dict:  # type: ignore
+    """
+    Computes the value of an accuracy table metric from a Spark DataFrame.
+
+    The percentiles of the per-class probabilities are approximated by
+    `percentile_approx` with the given `accuracy` (relative error of
+    1 / accuracy), or computed exactly by `percentile` if `accuracy` is None,
+    like for a pandas DataFrame. Rows with a null or NaN prediction are
+    ignored.
+
+    Args:
+        df (Any): Spark DataFrame
+        col_predict (str | int): Name or id of the column of the predicted
+            probabilities for the target class
+        col_target (str | int): Name or id of the target value column
+        probability_thresholds (list): List of probability thresholds
+        percentile_thresholds (list): List of percentile thresholds
+        class_labels (list, optional): Labels of the classes. Defaults to the
+            sorted distinct values of the target column.
+        accuracy (int, optional): Accuracy of the approximated percentiles, or
+            None for the exact percentiles. Defaults to 10000.
+
+    Returns:
+        dict: The value of the accuracy table metric
+    """
+    from pyspark.sql import functions as F
+
+    predict = F.col(_column_name(df, col_predict))
+    target = F.col(_column_name(df, col_target))
+    df = df.where(predict.isNotNull() & ~F.isnan(predict))
+
+    class_list = sorted(
+        row[0] for row in df.select(target).distinct().collect() if row[0] is not None
+    )
+    if class_labels is None:
+        class_labels = class_list
+
+    # per class percentiles of the probability of the row's class
+    percentages = ", ".join(str(float(p)) for p in percentile_thresholds)
+    if accuracy is None:
+        percentile = "percentile"
+        arguments = f"array({percentages})"
+    else:
+        percentile = "percentile_approx"
+        arguments = f"array({percentages}), {accuracy}"
+    percentiles = (
+        df.select(
+            *[
+                F.when(target == class_id, predict)
+                .otherwise(1 - predict)
+                .alias(f"class_{i}")
+                for i, class_id in enumerate(class_list)
+            ]
+        )
+        .agg(
+            *[
+                F.expr(f"{percentile}(class_{i}, {arguments})")
+                for i in range(len(class_list))
+            ]
+        )
+        .first()
+    )
+
+    prob_tables = _truth_matrices(
+        df, predict, target, {cl: probability_thresholds for cl in class_list}
+    )
+    perc_tables = _truth_matrices(
+        df, predict, target, dict(zip(class_list, percentiles))
+    )
+
+    return {
+        "schema_type": "accuracy_table",
+        "schema_version": "1.0.1",
+        "data": {
+            "probability_tables": [prob_tables[cl] for cl in class_list],
+            "precentile_tables": [perc_tables[cl] for cl in class_list],
+            "probability_thresholds": probability_thresholds,
+            "percentile_thresholds": percentile_thresholds,
+            "class_labels": class_labels,
+        },
+    }
+
+
+def spark_confusion_matrix(
+    df: Any,
+    idx_true: Union[str, int, None],
+    idx_pred: Union[str, int, None],
+    labels: Optional[list] = None,
+) -> dict:  # type: ignore
+    """
+    Computes the value of a confusion matrix metric from a Spark DataFrame, by
+    counting the rows of each (true, predicted) pair of labels.
+
+    Args:
+        df (Any): Spark DataFrame
+        idx_true (str | int): Name or id of the target column
+        idx_pred (str | int): Name or id of the prediction column
+        labels (list, optional): Labels of the rows. Defaults to the sorted
+            distinct values of the target column.
+
+    Returns:
+        dict: The value of the confusion matrix metric
+    """
+    col_true = _column_name(df, idx_true)
+    col_pred = _column_name(df, idx_pred)
+    counts = {
+        (row[0], row[1]): row[2]
+        for row in df.select(col_true, col_pred)
+        .dropna()
+        .groupBy(col_true, col_pred)
+        .count()
+        .collect()
+    }
+
+    # like `sklearn.metrics.confusion_matrix`, rows and columns are the sorted
+    # labels present in either column
+    all_labels = sorted({label for pair in counts for label in pair})
+    matrix = [
+        [counts.get((true, pred), 0) for pred in all_labels] for true in all_labels
+    ]
+    if labels is None:
+        labels = sorted({true for true, _ in counts})
+
+    return {
+        "schema_type": "confusion_matrix",
+        "schema_version": "1.0.0",
+        "data": {"class_labels": labels, "matrix": matrix},
+    }
+
+
+def spark_predictions(
+    df: Any,
+    col_predict: Union[str, int, None],
+    col_target: Union[str, int, None],
+    bin_edges: List[float],
+) -> dict:  # type: ignore
+    """
+    Computes the value of a predictions metric from a Spark DataFrame: the
+    average target, sum of absolute errors and count of the rows in each bin of
+    target values.
+
+    Args:
+        df (Any): Spark DataFrame
+        col_predict (str | int): Name or id of the prediction column
+        col_target (str | int): Name or id of the target column
+        bin_edges (list): List of edges of the bins
+
+    Returns:
+        dict: The value of the predictions metric
+    """
+    from pyspark.sql import functions as F
+
+    predict = F.col(_column_name(df, col_predict))
+    target = F.col(_column_name(df, col_target))
+    bins = _bin_aggregates(
+        df.select(predict, target),
+        target,
+        bin_edges,
+        average=F.avg(target),
+        error=F.sum(F.abs(predict - target)),
+        count=F.count(target),
+    )
+
+    return {
+        "schema_type": "predictions",
+        "schema_version": "1.0.0",
+        "data": {
+            "bin_averages": [float("nan") if x is None else x for x in bins["average"]],
+            "bin_errors": [0 if x is None else x for x in bins["error"]],
+            "bin_counts": [0 if x is None else x for x in bins["count"]],
+            "bin_edges": bin_edges,
+        },
+    }
+
+
+def spark_residuals(
+    df: Any,
+    col_predict: Union[str, int, None],
+    col_target: Union[str, int, None],
+    bin_edges: List[float],
+) -> dict:  # type: ignore
+    """
+    Computes the value of a residuals metric from a Spark DataFrame: the sum of
+    the residuals (prediction - target) in each bin of target values.
+
+    Args:
+        df (Any): Spark DataFrame
+        col_predict (str | int): Name or id of the prediction column
+        col_target (str | int): Name or id of the target column
+        bin_edges (list): List of edges of the bins
+
+    Returns:
+        dict: The value of the residuals metric
+    """
+    from pyspark.sql import functions as F
+
+    predict = F.col(_column_name(df, col_predict))
+    target = F.col(_column_name(df, col_target))
+    bins = _bin_aggregates(
+        df.select(predict, target),
+        target,
+        bin_edges,
+        residual=F.sum(predict - target),
+    )
+
+    return {
+        "schema_type": "residuals",
+        "schema_version": "1.0.0",
+        "data": {
+            "bin_edges": bin_edges,
+            "bin_counts": [0 if x is None else x for x in bins["residual"]],
+        },
+    }
@@ -6,5 +6,19 @@ Python utilities that help users to manage, validate
 and submit AML pipelines
 """
 
+import sys
 
-from .pipeline_helper import AMLPipelineHelper  # noqa: F401
+if sys.version_info >= (3, 7):
+    import importlib
+
+    def __getattr__(name):
+        # The pipeline helper (and the Azure ML SDK) are only imported when used.
+        if name == "AMLPipelineHelper":
+            return importlib.import_module(
+                ".pipeline_helper", __name__
+            ).AMLPipelineHelper
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+else:
+    # Module `__getattr__` (PEP 562) requires Python 3.7.
+    from .pipeline_helper import AMLPipelineHelper  # noqa: F401
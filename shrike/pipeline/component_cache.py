@@ -0,0 +1,137 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Persistent (on disk) cache of the definitions of registered components.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_COMPONENT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".shrike", "component_cache"
+)
+
+# Versions which are labels resolved by the workspace, hence may point to a
+# different component version at any time.
+_UNPINNED_VERSIONS = {"", "default", "latest"}
+
+
+def is_pinned_version(version: Optional[str]) -> bool:
+    """
+    Return True if 'version' identifies a single, immutable component version,
+    i.e. it is neither missing nor a label like "default" or "latest".
+    """
+    return version is not None and str(version).lower() not in _UNPINNED_VERSIONS
+
+
+class ComponentCache:
+    """
+    Store JSON-serializable component definitions in 'directory', one file per
+    entry. Entries older than 'ttl' seconds are ignored (then removed). Once
+    there are more than 'max_entries' entries, the least recently used ones are
+    evicted, down to 90% of 'max_entries' so that evicting stays rare.
+    """
+
+    def __init__(self, directory: str, ttl: float, max_entries: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # number of entries, counted on the first put then kept up to date
+        self._entries: Optional[int] = None
+
+    @staticmethod
+    def key(workspace: str, name: str, namespace: Optional[str], version: str) -> str:
+        """
+        Return the cache key of the component 'name' ('namespace') in version
+        'version' registered in the workspace 'workspace'.
+        """
+        identity = json.dumps([workspace, name, namespace, version])
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the value stored under 'key', or None if there is no (fresh)
+        entry.
+        """
+        path = self._path(key)
+        value = None
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+            else:
+                with open(path, "r") as file:
+                    value = json.load(file)
+                # The modification time tracks the last use, for eviction.
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable component cache entry {path}: {e}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store 'value' under 'key', then evict the least recently used entries
+        if there are more than 'max_entries'.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        is_new = not os.path.exists(self._path(key))
+        # Write to a temporary file first, so that concurrent readers never
+        # see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(value, file)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if self._entries is None:
+            self._entries = len(self._list_entries())
+        elif is_new:
+            self._entries += 1
+        if self._entries > self.max_entries:
+            self.evict()
+
+    def _list_entries(self) -> List[Tuple[float, str]]:
+        """
+        Return the (last use time, path) of each entry.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        return entries
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries, keeping 90% of 'max_entries'.
+        """
+        entries = sorted(self._list_entries(), reverse=True)
+        kept = self.max_entries - self.max_entries // 10
+        for _, path in entries[kept:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._entries = min(len(entries), kept)
@@ -7,12 +7,21 @@ Pipeline helper class to create pipelines loading modules from a flexible manife
 
 
 from azure.ml.component import Component
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 import os
 import logging
+import threading
+import time
 from typing import Optional, List
 
 from shrike.pipeline.aml_connect import current_workspace
+from shrike.pipeline.component_cache import (
+    DEFAULT_COMPONENT_CACHE_DIR,
+    ComponentCache,
+    is_pinned_version,
+)
+from shrike.pipeline.profiler import profile
 
 
 log = logging.getLogger(__name__)
@@ -55,6 +64,16 @@ class module_loader_config:  # pylint: disable=invalid-name
             "steps",
         )
     )
+    # persistent cache of the registered components, only used for pinned
+    # versions (never for labels like "default" or "latest"); it relies on
+    # private functions of azure-ml-component, hence is opt-in
+    use_component_cache: bool = False
+    component_cache_dir: Optional[str] = None  # default: ~/.shrike/component_cache
+    component_cache_ttl: int = 86400  # in seconds
+    component_cache_max_entries: int = 1000
+    # number of threads loading all the components of the manifest before
+    # building the pipeline (0 to load each component when it is used)
+    prefetch_workers: int = 0
 
 
 class AMLModuleLoader:
@@ -99,6 +118,33 @@ class AMLModuleLoader:
         )
         self.local_steps_folder = config.module_loader.local_steps_folder
         self.module_cache = {}
+        # "not found" exception raised by Component.load, by
+        # (name, namespace, version)
+        self.failed_resolutions = {}
+        # time spent loading each remote module, in seconds
+        self.load_times = {}
+        # guards the dicts above, which prefetch_modules fills from several threads
+        self._lock = threading.Lock()
+        # lock held while loading a module, by module cache key
+        self._module_locks = {}
+        self.component_cache = None
+        use_component_cache = config.module_loader.get("use_component_cache", False)
+        if use_component_cache and not _component_cache_supported():
+            log.warning(
+                "module_loader.use_component_cache is set, but the installed "
+                "version of azure-ml-component lacks the private functions the "
+                "component cache relies on: the component cache is disabled."
+            )
+            use_component_cache = False
+        if use_component_cache:
+            self.component_cache = ComponentCache(
+                config.module_loader.get("component_cache_dir")
+                or DEFAULT_COMPONENT_CACHE_DIR,
+                ttl=config.module_loader.get("component_cache_ttl", 86400),
+                max_entries=config.module_loader.get(
+                    "component_cache_max_entries", 1000
+                ),
+            )
 
         # internal manifest built from yaml config
         self.modules_manifest = {}
@@ -142,7 +188,62 @@ class AMLModuleLoader:
 
     def put_in_cache(self, module_cache_key, module_class):
         """Puts module class in internal cache (dict)"""
-        self.module_cache[module_cache_key] = module_class
+        with self._lock:
+            self.module_cache[module_cache_key] = module_class
+
+    def _module_lock(self, module_cache_key):
+        """Gets the lock held while loading a module, so that threads loading
+        the same module concurrently load it only once"""
+        with self._lock:
+            return self._module_locks.setdefault(module_cache_key, threading.Lock())
+
+    def load_from_component_cache(self, name, version, namespace=None):
+        """Gets a remote module class from the persistent component cache.
+
+        Args:
+            name (str): module name
+            version (str): module version
+            namespace (str): module namespace
+
+        Returns:
+            object: module class loaded, or None if not cached
+        """
+        if self.component_cache is None or not is_pinned_version(version):
+            return None
+        workspace = current_workspace()
+        entry = self.component_cache.get(
+            ComponentCache.key(_workspace_id(workspace), name, namespace, version)
+        )
+        if entry is None:
+            return None
+        try:
+            return _component_from_module_dto(entry, workspace)
+        except Exception as e:
+            # Any error (e.g., an entry written by another version of
+            # azure-ml-component) falls back to loading the registered module.
+            log.warning(f"Could not load module {name}:{version} from cache: {e}")
+            return None
+
+    def put_in_component_cache(self, name, version, namespace, module_class):
+        """Puts a remote module class in the persistent component cache.
+
+        Args:
+            name (str): module name
+            version (str): module version
+            namespace (str): module namespace
+            module_class (object): module class loaded with Component.load
+        """
+        if self.component_cache is None or not is_pinned_version(version):
+            return
+        try:
+            self.component_cache.put(
+                ComponentCache.key(
+                    _workspace_id(current_workspace()), name, namespace, version
+                ),
+                _module_dto_of_component(module_class),
+            )
+        except Exception as e:
+            log.warning(f"Could not cache module {name}:{version}: {e}")
 
     def verify_manifest(self, modules_manifest):
         """Tests a module manifest schema"""
@@ -193,14 +294,19 @@ class AMLModuleLoader:
             object: module class loaded
         """
         module_cache_key = module_spec_path
-        if self.module_in_cache(module_cache_key):
-            return self.get_from_cache(module_cache_key)
-
-        log.info("Building module from local code at {}".format(module_spec_path))
-        if not os.path.isfile(module_spec_path):
-            module_spec_path = os.path.join(self.local_steps_folder, module_spec_path)
-        loaded_module_class = Component.from_yaml(current_workspace(), module_spec_path)
-        self.put_in_cache(module_cache_key, loaded_module_class)
+        with self._module_lock(module_cache_key):
+            if self.module_in_cache(module_cache_key):
+                return self.get_from_cache(module_cache_key)
+
+            log.info("Building module from local code at {}".format(module_spec_path))
+            if not os.path.isfile(module_spec_path):
+                module_spec_path = os.path.join(
+                    self.local_steps_folder, module_spec_path
+                )
+            loaded_module_class = Component.from_yaml(
+                current_workspace(), module_spec_path
+            )
+            self.put_in_cache(module_cache_key, loaded_module_class)
 
         return loaded_module_class
 
@@ -220,40 +326,72 @@ class AMLModuleLoader:
             module_version = module_version or self.force_default_module_version
 
         module_cache_key = f"{module_name}:{module_version}"
-        if self.module_in_cache(module_cache_key):
-            return self.get_from_cache(module_cache_key)
+        with self._module_lock(module_cache_key):
+            if self.module_in_cache(module_cache_key):
+                return self.get_from_cache(module_cache_key)
 
-        log.info(
-            f"Loading remote module {module_cache_key} (name={module_name}, version={module_version}, namespace={module_namespace})"
-        )
-        loading_raised_exception = None
-
-        try:
-            # try without namespace first
-            loaded_module_class = Component.load(
-                current_workspace(),
-                name=module_name,
-                version=module_version,
+            loaded_module_class = self.load_from_component_cache(
+                module_name, module_version, module_namespace
             )
-        except BaseException as e:
-            # save the exception to raise it if namespace not provided
-            if not module_namespace:
-                raise e
+            if loaded_module_class is not None:
+                log.info(f"Loaded remote module {module_cache_key} from cache")
+                self.put_in_cache(module_cache_key, loaded_module_class)
+                return loaded_module_class
 
-        if module_namespace:
             log.info(
-                f"    Trying to load module {module_name} with namespace {module_namespace}."
+                f"Loading remote module {module_cache_key} (name={module_name}, version={module_version}, namespace={module_namespace})"
+            )
+            start_time = time.time()
+            loaded_module_class = self.resolve_prod_module(
+                module_name, module_version, module_namespace
+            )
+            load_time = time.time() - start_time
+            with self._lock:
+                self.load_times[module_cache_key] = load_time
+            log.info(f"Loaded remote module {module_cache_key} in {load_time:.1f}s")
+
+            self.put_in_cache(module_cache_key, loaded_module_class)
+            self.put_in_component_cache(
+                module_name, module_version, module_namespace, loaded_module_class
             )
+
+        return loaded_module_class
+
+    def resolve_prod_module(self, module_name, module_version, module_namespace=None):
+        """Loads a registered module, with a single call to Component.load:
+        the module is loaded as "namespace://name" if a namespace is given, or
+        else by its name. Modules which are not found are remembered, and raise
+        again without new calls. Other errors (e.g., network or authentication
+        errors) are raised immediately, and not remembered.
+
+        Args:
+            module_name (str) : module name
+            module_version (str) : module version
+            module_namespace (str) : module namespace
+
+        Returns:
+            object: module class loaded
+        """
+        resolution_key = (module_name, module_namespace, module_version)
+        with self._lock:
+            failed_resolution = self.failed_resolutions.get(resolution_key)
+        if failed_resolution is not None:
+            raise failed_resolution
+
+        if module_namespace:
             module_name = module_namespace + "://" + module_name
-            loaded_module_class = Component.load(
+        try:
+            return Component.load(
                 current_workspace(),
                 name=module_name,
                 version=module_version,
             )
-
-        self.put_in_cache(module_cache_key, loaded_module_class)
-
-        return loaded_module_class
+        except Exception as e:
+            if _is_not_found_error(e):
+                log.info(f"    Could not load module {module_name}: {e}")
+                with self._lock:
+                    self.failed_resolutions[resolution_key] = e
+            raise
 
     def get_module_manifest_entry(self, module_key, modules_manifest=None):
         """Gets a particular entry in the module manifest.
@@ -298,16 +436,60 @@ class AMLModuleLoader:
             module_key, modules_manifest
         )
 
-        if self.is_local(module_key):
-            loaded_module = self.load_local_module(module_entry["yaml"])
-        else:
-            loaded_module = self.load_prod_module(
-                module_entry["name"],
-                module_entry["version"],
-                module_namespace=module_namespace,
-            )
+        with profile("component_load", module_key):
+            if self.is_local(module_key):
+                loaded_module = self.load_local_module(module_entry["yaml"])
+            else:
+                loaded_module = self.load_prod_module(
+                    module_entry["name"],
+                    module_entry["version"],
+                    module_namespace=module_namespace,
+                )
         return loaded_module
 
+    def prefetch_modules(self, modules_manifest=None, max_workers=8):
+        """Loads all the modules of the manifest concurrently, to fill the cache.
+
+        Args:
+            modules_manifest (dict): manifest from required_modules() [DEPRECATED]
+            max_workers (int): maximum number of modules loaded at the same time
+
+        Returns:
+            dict: exceptions raised when loading modules, keys are the module keys
+        """
+        module_keys = list(self.modules_manifest)
+        module_keys += [
+            module_key
+            for module_key in modules_manifest or {}
+            if module_key not in self.modules_manifest
+        ]
+        log.info(f"Prefetching {len(module_keys)} modules with {max_workers} threads")
+
+        def load(module_key):
+            try:
+                self.load_module(module_key, modules_manifest)
+            except Exception as e:
+                return e
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(load, module_keys))
+        errors = {
+            module_key: error
+            for module_key, error in zip(module_keys, results)
+            if error is not None
+        }
+        log.info(
+            f"Prefetched {len(module_keys) - len(errors)} modules in {time.time() - start_time:.1f}s"
+        )
+        if errors:
+            # These modules are loaded again (and raise) only if they are used.
+            log.warning(
+                "Prefetching modules raised errors:\n"
+                + "\n".join(f"{key}: {error}" for key, error in errors.items())
+            )
+        return errors
+
     def load_modules_manifest(self, modules_manifest):
         """Creates module instances from modules_manifest.
 
@@ -337,6 +519,79 @@ class AMLModuleLoader:
         return loaded_modules
 
 
+def _workspace_id(workspace) -> str:
+    return f"{workspace.subscription_id}/{workspace.resource_group}/{workspace.name}"
+
+
+def _is_not_found_error(error) -> bool:
+    """Tests if an exception raised by Component.load means that the module is
+    not registered."""
+    try:
+        from azure.ml.component._restclients.designer.exceptions import (
+            ComponentNotExistsError,
+        )
+
+        if isinstance(error, ComponentNotExistsError):
+            return True
+    except ImportError:
+        pass
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", getattr(response, "status_code", None))
+    return status_code == 404 or "not found" in str(error).lower()
+
+
+def _component_cache_supported() -> bool:
+    """Tests if the private functions of azure-ml-component used to store and
+    rebuild the cached module classes exist in the installed version."""
+    try:
+        from azure.ml.component._api._api import _dto_2_definition  # noqa: F401
+        from azure.ml.component._restclients.designer.models import (  # noqa: F401
+            ModuleDto,
+            ModulePythonInterface,
+        )
+        from azure.ml.component.component import _ComponentLoadSource
+    except ImportError:
+        return False
+    return hasattr(_ComponentLoadSource, "REGISTERED") and hasattr(
+        Component, "_component_func_from_definition"
+    )
+
+
+def _module_dto_of_component(module_class):
+    """Serializes the module DTO of the definition of a module class returned
+    by Component.load."""
+    from azure.ml.component._restclients.designer.models import (
+        ModuleDto,
+        ModulePythonInterface,
+    )
+
+    module_dto = module_class._definition._module_dto
+    # azure-ml-component replaces the python interface of the DTO with its own
+    # (non serializable) class, hence the copy to the REST model.
+    designer_dto = ModuleDto()
+    for key in ModuleDto._attribute_map:
+        setattr(designer_dto, key, getattr(module_dto, key))
+    interface = module_dto.module_python_interface
+    designer_dto.module_python_interface = ModulePythonInterface(
+        inputs=interface.inputs,
+        outputs=interface.outputs,
+        parameters=interface.parameters,
+    )
+    return designer_dto.serialize(keep_readonly=True)
+
+
+def _component_from_module_dto(module_dto, workspace):
+    """Rebuilds the module class returned by Component.load from the serialized
+    module DTO of its definition."""
+    from azure.ml.component._api._api import _dto_2_definition
+    from azure.ml.component._restclients.designer.models import ModuleDto
+    from azure.ml.component.component import _ComponentLoadSource
+
+    definition = _dto_2_definition(ModuleDto.deserialize(module_dto), workspace)
+    definition._load_source = _ComponentLoadSource.REGISTERED
+    return Component._component_func_from_definition(definition)
+
+
 def _check_use_local_syntax_valid(use_local_list) -> bool:
     use_local_except_for = True if use_local_list[0].startswith("!") else False
     if use_local_except_for:
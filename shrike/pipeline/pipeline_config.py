@@ -13,7 +13,12 @@ HDI_DEFAULT_CONF = '{"spark.yarn.appMasterEnv.DOTNET_ASSEMBLY_SEARCH_PATHS":"./u
 
 @dataclass
 class pipeline_cli_config:  # pylint: disable=invalid-name
-    """Pipeline config for command line parameters"""
+    """Pipeline config for command line parameters
+
+    If `memoize_subgraphs` is True, `subgraph_load` builds each subgraph once per
+    custom configuration, and reuses it: only enable it if the `build()` method
+    of your subgraphs depends on nothing else than their configuration.
+    """
 
     regenerate_outputs: bool = False
     continue_on_failure: bool = False
@@ -30,6 +35,8 @@ class pipeline_cli_config:  # pylint: disable=invalid-name
     pipeline_run_id: str = MISSING
     tags: Optional[Any] = None
     config_dir: Optional[str] = None
+    memoize_subgraphs: bool = False
+    profile: bool = False
 
 
 @dataclass
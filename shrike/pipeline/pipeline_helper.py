@@ -5,15 +5,13 @@
 Pipeline helper class to create pipelines loading modules from a flexible manifest.
 """
 import argparse
+import hashlib
 import os
 import json
 import logging
 import re
-import webbrowser
 import uuid
 import shutil
-import yaml
-import jsonpath_ng
 from typing import Callable
 
 try:
@@ -43,6 +41,7 @@ from shrike.pipeline.aml_connect import azureml_connect, current_workspace
 from shrike.pipeline.canary_helper import get_repo_info
 from shrike.pipeline.module_helper import AMLModuleLoader
 from shrike.pipeline.pipeline_config import default_config_dict, HDI_DEFAULT_CONF
+from shrike.pipeline.profiler import profile, profiled, profiling
 from shrike.pipeline.telemetry_utils import TelemetryLogger
 
 
@@ -71,6 +70,10 @@ class AMLPipelineHelper:
         else:
             self.module_loader = module_loader
 
+        # pipeline functions built by subgraph_load(), by (class, custom config)
+        self.built_subgraphs = {}
+        self.subgraph_builds_avoided = 0
+
     ######################
     ### CUSTOM METHODS ###
     ######################
@@ -151,9 +154,28 @@ class AMLPipelineHelper:
             custom_config (DictConfig): custom configuration object, this custom object witll be
             added to the pipeline config
 
+        If `run.memoize_subgraphs` is True, the pipeline function of a subgraph is built
+        once per custom configuration, then reused.
         """
         subgraph_class = self.required_subgraphs()[subgraph_key]
 
+        memoize = self.config.run.get("memoize_subgraphs", False)
+        if memoize:
+            custom_config_hash = hashlib.sha256(
+                json.dumps(
+                    OmegaConf.to_container(OmegaConf.create(custom_config)),
+                    sort_keys=True,
+                    default=str,
+                ).encode("utf-8")
+            ).hexdigest()
+            built_subgraph_key = (subgraph_class, custom_config_hash)
+            if built_subgraph_key in self.built_subgraphs:
+                self.subgraph_builds_avoided += 1
+                log.info(
+                    f"Reusing subgraph [{subgraph_key} as {subgraph_class.__name__}] ({self.subgraph_builds_avoided} builds avoided)"
+                )
+                return self.built_subgraphs[built_subgraph_key]
+
         subgraph_config = self.config.copy()
         if custom_config:
             with open_dict(subgraph_config):
@@ -166,7 +188,11 @@ class AMLPipelineHelper:
             config=subgraph_config, module_loader=self.module_loader
         )
         # subgraph_instance.setup(self.pipeline_config)
-        return subgraph_instance.build(subgraph_config)
+        with profile("subgraph_build", subgraph_key):
+            subgraph_function = subgraph_instance.build(subgraph_config)
+        if memoize:
+            self.built_subgraphs[built_subgraph_key] = subgraph_function
+        return subgraph_function
 
     def dataset_load(self, name, version="latest"):
         """Loads a dataset by either id or name.
@@ -229,6 +255,24 @@ class AMLPipelineHelper:
         for subgraph_key, subgraph_class in cls.required_subgraphs().items():
             subgraph_class._build_config(config_dict)
 
+    @classmethod
+    def _required_modules_of_all_subgraphs(cls):
+        """Merges the required_modules() of this graph and all its subgraphs."""
+        modules_manifest = {}
+        for subgraph_class in cls.required_subgraphs().values():
+            modules_manifest.update(subgraph_class._required_modules_of_all_subgraphs())
+        modules_manifest.update(cls.required_modules())
+        return modules_manifest
+
+    def prefetch_components(self):
+        """Loads all the components of the manifest (and required_modules()) of
+        this graph and its subgraphs concurrently, before build() uses them."""
+        prefetch_workers = self.config.module_loader.get("prefetch_workers", 0)
+        if prefetch_workers > 0:
+            self.module_loader.prefetch_modules(
+                self._required_modules_of_all_subgraphs(), max_workers=prefetch_workers
+            )
+
     def _set_all_inputs_to(self, module_instance, input_mode):
         """Sets all module inputs to a given intput mode"""
         input_names = [
@@ -944,6 +988,7 @@ class AMLPipelineHelper:
             **custom_runtime_arguments,
         )
 
+    @profiled("runsettings", lambda self, module_name, *args, **kwargs: module_name)
     def apply_recommended_runsettings(
         self,
         module_name,
@@ -1093,6 +1138,8 @@ class AMLPipelineHelper:
         return pipeline_tags
 
     def _check_if_spec_yaml_override_is_needed(self):
+        import yaml
+
         if self.config.module_loader.use_local == "":
             log.info(
                 "All components are using remote copy, so override will not be executed. For components you want submission-time override of images/tags/etc., please specify them in `use_local`."
@@ -1178,6 +1225,9 @@ class AMLPipelineHelper:
     def _override_single_spec_yaml(
         self, spec_path, spec_mapping, env_yaml_override_is_needed
     ):
+        import jsonpath_ng
+        import yaml
+
         spec_filename, spec_ext = os.path.splitext(spec_path)
         old_spec_path = (
             spec_filename + ".not_used"
@@ -1367,18 +1417,42 @@ class AMLPipelineHelper:
         )  # NOTE: this also stores aml workspace in internal global variable
 
     def build_and_submit_new_pipeline(self):
+        if not self.config.run.get("profile", False):
+            return self._build_and_submit_new_pipeline()
+
+        with profiling() as profiler:
+            try:
+                return self._build_and_submit_new_pipeline()
+            finally:
+                log.info(f"Pipeline build profile:\n{profiler.report()}")
+                if self.config.run.export:
+                    trace_file = (
+                        os.path.splitext(self.config.run.export)[0] + ".profile.json"
+                    )
+                    log.info(f"Writing the Chrome trace of the build to {trace_file}")
+                    profiler.write_chrome_trace(trace_file)
+
+    def _build_and_submit_new_pipeline(self):
+        with profile("phase", "prefetch"):
+            self.prefetch_components()
+
         log.info(f"Building Pipeline [{self.__class__.__name__}]...")
-        pipeline_function = self.build(self.config)
+        with profile("phase", "build"):
+            pipeline_function = self.build(self.config)
 
         log.info("Creating Pipeline Instance...")
-        pipeline = self.pipeline_instance(pipeline_function, self.config)
+        with profile("phase", "pipeline_instance"):
+            pipeline = self.pipeline_instance(pipeline_function, self.config)
 
         log.info("Validating...")
-        pipeline.validate()
+        with profile("phase", "validate"):
+            pipeline.validate()
 
         if self.config.run.export:
             log.info(f"Exporting to {self.config.run.export}...")
-            with open(self.config.run.export, "w") as export_file:
+            with profile("phase", "export"), open(
+                self.config.run.export, "w"
+            ) as export_file:
                 export_file.write(pipeline._get_graph_json())
 
         if self.config.run.submit:
@@ -1389,14 +1463,15 @@ class AMLPipelineHelper:
 
             # pipeline_run is of the class "azure.ml.component.run", which
             # is different from "azureml.pipeline.core.PipelineRun"
-            pipeline_run = pipeline.submit(
-                experiment_name=self.config.run.experiment_name,
-                description=self.config.run.experiment_description,
-                tags=pipeline_tags,
-                default_compute_target=self.config.compute.default_compute_target,
-                regenerate_outputs=self.config.run.regenerate_outputs,
-                continue_on_step_failure=self.config.run.continue_on_failure,
-            )
+            with profile("phase", "submit"):
+                pipeline_run = pipeline.submit(
+                    experiment_name=self.config.run.experiment_name,
+                    description=self.config.run.experiment_description,
+                    tags=pipeline_tags,
+                    default_compute_target=self.config.compute.default_compute_target,
+                    regenerate_outputs=self.config.run.regenerate_outputs,
+                    continue_on_step_failure=self.config.run.continue_on_failure,
+                )
 
             # Forece pipeline_run to be of the class "azureml.pipeline.core.PipelineRun"
             pipeline_run = PipelineRun(
@@ -1522,6 +1597,8 @@ Follow link below to access your pipeline run directly:
 
         else:
             if not self.config.run.silent:
+                import webbrowser
+
                 webbrowser.open(url=pipeline_run.get_portal_url())
 
             # This will wait for the completion of the pipeline execution
@@ -0,0 +1,143 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Profiler of the construction of pipelines: times the phases of the submission,
+the component loads, the subgraph builds and the runsettings applications.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+
+log = logging.getLogger(__name__)
+
+
+class Span(NamedTuple):
+    category: str
+    name: str
+    start: float  # in seconds, since the profiler was created
+    duration: float  # in seconds
+    thread_id: int
+
+
+class BuildProfiler:
+    """Records the time spent in named spans of code, grouped in categories."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, category: str, name: str):
+        """Times the enclosed block of code."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            span = Span(
+                category,
+                name,
+                start - self._origin,
+                time.perf_counter() - start,
+                threading.get_ident(),
+            )
+            with self._lock:
+                self.spans.append(span)
+
+    def report(self) -> str:
+        """Returns the total time, number of calls and maximum time of each
+        span, sorted by decreasing total time. Nested spans are included in the
+        time of the spans containing them."""
+        totals = defaultdict(list)
+        for span in self.spans:
+            totals[(span.category, span.name)].append(span.duration)
+        lines = [f"{'total (s)':>10} {'calls':>6} {'max (s)':>8}  category: name"]
+        for (category, name), durations in sorted(
+            totals.items(), key=lambda item: -sum(item[1])
+        ):
+            lines.append(
+                f"{sum(durations):>10.3f} {len(durations):>6} {max(durations):>8.3f}  {category}: {name}"
+            )
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Writes the spans to 'path' in the Chrome trace event format, which
+        can be opened in chrome://tracing or https://ui.perfetto.dev."""
+        events = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": os.getpid(),
+                "tid": span.thread_id,
+            }
+            for span in self.spans
+        ]
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+CURRENT_PROFILER: Optional[BuildProfiler] = None
+
+
+class _NoSpan:
+    """Context manager doing nothing, used when not profiling (like
+    `contextlib.nullcontext`, which requires Python 3.7)."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+@contextmanager
+def profiling():
+    """Creates a profiler, which records the spans of `profile` in the
+    enclosed block of code."""
+    global CURRENT_PROFILER
+    previous_profiler = CURRENT_PROFILER
+    CURRENT_PROFILER = BuildProfiler()
+    try:
+        yield CURRENT_PROFILER
+    finally:
+        CURRENT_PROFILER = previous_profiler
+
+
+def profile(category: str, name: str):
+    """Times the enclosed block of code, if profiling."""
+    profiler = CURRENT_PROFILER
+    if profiler is None:
+        return _NO_SPAN
+    return profiler.span(category, name)
+
+
+def profiled(category: str, name: Callable[..., str]):
+    """Decorator timing the calls of a function, if profiling. The span is
+    named by calling 'name' with the arguments of the function."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if CURRENT_PROFILER is None:
+                return function(*args, **kwargs)
+            with CURRENT_PROFILER.span(category, name(*args, **kwargs)):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
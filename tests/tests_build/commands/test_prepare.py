@@ -10,9 +10,12 @@ Consider decorating long end-to-end tests with `@pytest.mark.order(-1)`.
 import pytest
 import os
 import copy
+import json
 from pathlib import Path
 import subprocess
+import sys
 import shutil
+import ruamel.yaml
 import yaml
 from git import Repo
 from unittest import mock
@@ -75,6 +78,34 @@ def test_build_all_components(caplog):
     assert f"Component {component} is built." in caplog.text
 
 
+def test_build_and_validate_all_components_run_concurrently(caplog):
+    prep = prepare.Prepare()
+    prep.config = Configuration(component_cli_workers=4)
+    components = [
+        f"tests/tests_build/steps/component{i}/spec.yaml" for i in [2, 3, 4, 1]
+    ]
+
+    def execute_azure_cli_command(command, *args, **kwargs):
+        return "component1" not in command
+
+    with mock.patch.object(
+        prep, "execute_azure_cli_command", side_effect=execute_azure_cli_command
+    ) as mock_execute:
+        with caplog.at_level("INFO"):
+            prep.validate_all_components(components)
+            built_components = prep.build_all_components(components)
+
+    assert mock_execute.call_count == 2 * len(components)
+    assert built_components == [
+        str(Path(c).parent / ".build" / Path(c).name) for c in components
+    ]
+    for component in components[:3]:
+        assert prep._component_statuses[component]["validate"] == "succeeded"
+        assert f"Component {component} is built." in caplog.text
+    assert prep._component_statuses[components[3]]["validate"] == "failed"
+    assert len(prep._errors) == 2
+
+
 @pytest.mark.parametrize("mode", ["foo", "aether", "aml"])
 def test_find_component_specification_files_using_all(mode):
     # clean the .build directories first, such that we won't include the
@@ -482,7 +513,33 @@ def test_infer_active_components_from_modified_files(modified_files, expected_re
     assert len(res) == len(expected_res)
 
 
-def test_get_modified_files():
+@pytest.mark.parametrize(
+    "modified_files",
+    [
+        ["./shrike/build/commands/prepare.py", "./shrike/build/core/command_line.py"],
+        [
+            "./tests/tests_build/steps/component2/subdir2/file_in_subdir2.txt",
+            "./tests/tests_build/steps/component4/deleted_file.txt",
+            "./tests/tests_build/commands/some_new_file.py",
+        ],
+        ["./tests/tests_build/steps/deleted_component/deleted_file.txt"],
+        ["./tests/tests_build/steps"],
+    ],
+)
+def test_infer_active_components_matches_component_is_active(modified_files):
+    prep = prepare.Prepare()
+    prep.config = Configuration()
+    res = prep.infer_active_components_from_modified_files(modified_files)
+    expected_res = [
+        component
+        for component in prep.find_component_specification_files_using_all()
+        if prep.component_is_active(component, modified_files)
+    ]
+    assert res == expected_res
+
+
+@pytest.mark.parametrize("git_diff_backend", ["gitpython", "git"])
+def test_get_modified_files(git_diff_backend):
 
     # Creating a new repo and declaring branch names
     main_branch_name = "main"
@@ -550,7 +607,7 @@ def test_get_modified_files():
 
     # now we're ready to do the actual tests
     prep = prepare.Prepare()
-    prep.config = Configuration()
+    prep.config = Configuration(git_diff_backend=git_diff_backend)
     # 1. test the 'Build - after Merge' case (BAM)
     change_list_BAM = prep.get_modified_files(
         new_repo, main_branch_name, main_branch_name
@@ -724,6 +781,55 @@ def test_create_catalog_files_for_aml(catalog_file_name):
     # assert component2_catalog_contents == component2_catalog_reference
 
 
+@pytest.mark.parametrize("catalog_hashing_workers", [1, 4])
+def test_create_catalog_files_for_aml_does_not_depend_on_number_of_workers(
+    catalog_hashing_workers,
+):
+    component_folders = [
+        "tests/tests_build/steps/component1/",
+        "tests/tests_build/steps/component2/",
+    ]
+    component_files = [os.path.join(f, "spec.yaml") for f in component_folders]
+
+    prep = prepare.Prepare()
+    prep.config = Configuration(catalog_hashing_workers=1)
+    prep.create_catalog_files_for_aml(component_files)
+    reference_catalogs = []
+    for folder in component_folders:
+        with open(os.path.join(folder, "catalog.json"), "r") as catalog_file:
+            reference_catalogs.append(catalog_file.read())
+
+    prep.config = Configuration(catalog_hashing_workers=catalog_hashing_workers)
+    prep.create_catalog_files_for_aml(component_files)
+    for folder, reference_catalog in zip(component_folders, reference_catalogs):
+        for catalog_file_name in ["catalog.json", "catalog.json.sig"]:
+            with open(os.path.join(folder, catalog_file_name), "r") as catalog_file:
+                assert catalog_file.read() == reference_catalog
+
+
+def test_create_catalog_files_for_aml_with_hash_cache(tmp_path, caplog):
+    component_folder = "tests/tests_build/steps/component1/"
+    component_file = os.path.join(component_folder, "spec.yaml")
+    hash_cache_file = str(tmp_path / "hash-cache.json")
+
+    prep = prepare.Prepare()
+    prep.config = Configuration()
+    prep.create_catalog_files_for_aml([component_file])
+    with open(os.path.join(component_folder, "catalog.json"), "r") as catalog_file:
+        reference_catalog = catalog_file.read()
+
+    prep.config = Configuration(
+        use_hash_cache=True, hash_cache_file=hash_cache_file, verify_hash_cache=True
+    )
+    for _ in range(2):
+        with caplog.at_level("INFO"):
+            prep.create_catalog_files_for_aml([component_file])
+        with open(os.path.join(component_folder, "catalog.json"), "r") as f:
+            assert f.read() == reference_catalog
+    assert os.path.exists(hash_cache_file)
+    assert "0 mismatches" in caplog.text
+
+
 def test_validate_all_components_does_nothing_if_no_files(caplog):
     prep = prepare.Prepare()
 
@@ -978,6 +1084,65 @@ def test_create_requirements_file_with_duplicate_component_name(caplog):
     shutil.rmtree(tmp_dir)
 
 
+def test_create_consolidated_requirements_files(caplog):
+    clean()
+    prep = prepare.Prepare()
+    prep.config = Configuration(consolidate_requirements=True)
+
+    # create temporary components for testing
+    tmp_dir = str(Path(__file__).parent.parent.resolve() / "steps/tmp_dir")
+    os.mkdir(tmp_dir)
+    pip_dependencies = {
+        "a": ["NumPy == 1.19.0", "azureml-core==1.27.0"],
+        "b": ["azureml_core == 1.27.0", "numpy==1.19.0  # comment", ""],
+        "c": ["numpy==1.20.0"],
+    }
+    for name, dependencies in pip_dependencies.items():
+        spec = {
+            "name": name,
+            "version": "0.0.1",
+            "environment": {
+                "conda": {
+                    "conda_dependencies": {"dependencies": [{"pip": dependencies}]}
+                }
+            },
+        }
+        with open(f"{tmp_dir}/{name}.yaml", "w") as tmp_spec:
+            yaml.dump(spec, tmp_spec)
+
+    component_files = [f"{tmp_dir}/{name}.yaml" for name in pip_dependencies]
+    with caplog.at_level("INFO"):
+        id = prep._create_requirements_files(component_files)
+    assert "Wrote 2 distinct requirement sets for 3 components." in caplog.text
+    assert (
+        "Package numpy is required as: numpy==1.19.0, numpy==1.20.0. "
+        "It is left out of requirements-union.txt." in caplog.text
+    )
+
+    component_dependencies_repo = "component_dependencies_" + id
+    with open(component_dependencies_repo + "/manifest.json") as file:
+        manifest = json.load(file)
+    components = {
+        component["name"]: component["requirement_set"]
+        for component in manifest["components"].values()
+    }
+    assert components["a"] == components["b"] != components["c"]
+    assert manifest["requirement_sets"][components["a"]] == [
+        "azureml-core==1.27.0",
+        "numpy==1.19.0",
+    ]
+    assert manifest["conflicts"] == {"numpy": ["numpy==1.19.0", "numpy==1.20.0"]}
+    with open(
+        f"{component_dependencies_repo}/requirement_sets/{components['c']}/requirements.txt"
+    ) as file:
+        assert file.readlines() == ["numpy==1.20.0\n"]
+    with open(component_dependencies_repo + "/requirements-union.txt") as file:
+        assert file.readlines() == ["azureml-core==1.27.0\n"]
+
+    # Clean up tmp directory
+    shutil.rmtree(tmp_dir)
+
+
 def test_create_requirements_file_for_single_component_conda_dependencies(caplog):
     clean()
     prep = prepare.Prepare()
@@ -1431,3 +1596,100 @@ def test_validate_all_components_enabled_component_validation(caplog, tmp_path):
 
     # Clean up tmp directory
     shutil.rmtree(tmp_dir)
+
+
+def test_load_yaml_parses_each_file_once_until_rewritten(tmp_path):
+    with open(tmp_path / "spec.yaml", "w") as tmp_spec, open(
+        tmp_path / "conda_env.yaml", "w"
+    ) as tmp_env:
+        yaml.dump(SPEC_YAML, tmp_spec)
+        yaml.dump(ENV_YAML, tmp_env)
+    component_path = str(tmp_path / "spec.yaml")
+
+    prep = prepare.Prepare()
+    prep.config = Configuration(
+        enable_component_validation=True,
+        component_validation={
+            "$.name": "^dum.[A-Za-z0-9-_.]+$",
+            "$.environment.docker.image": "^polymerprod.azurecr.io*",
+            "$.inputs..description": "^[A-Z].*",
+        },
+    )
+    with mock.patch.object(
+        ruamel.yaml, "YAML", wraps=ruamel.yaml.YAML
+    ) as yaml_class, mock.patch.object(
+        prep, "execute_azure_cli_command", return_value=True
+    ):
+        prep.validate_all_components([component_path])
+        prep._create_requirements_file_for_single_component(
+            component_path, str(tmp_path / "requirements")
+        )
+        # The specification file and the conda dependencies file
+        assert yaml_class.call_count == 2
+
+        prep.add_snapshot_fingerprint_to_tags(component_path, "ABCD")
+        spec = prep.load_yaml(component_path)
+        assert yaml_class.call_count == 3
+
+    assert spec["tags"]["snapshot_fingerprint"] == "ABCD"
+    assert prep._component_statuses[component_path]["validate"] == "succeeded"
+    assert not prep._errors
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_validate_all_components_offline(tmp_path, caplog, workers):
+    specs = {
+        "valid": SPEC_YAML,
+        "code_snapshot": dict(SPEC_YAML, code="../src"),
+        "invalid": {k: v for k, v in SPEC_YAML.items() if k != "version"},
+        "noncompliant": dict(SPEC_YAML, name="office.dummy"),
+    }
+    components = []
+    for name, spec in specs.items():
+        os.mkdir(tmp_path / name)
+        with open(tmp_path / name / "spec.yaml", "w") as tmp_spec, open(
+            tmp_path / name / "conda_env.yaml", "w"
+        ) as tmp_env:
+            yaml.dump(spec, tmp_spec)
+            yaml.dump(ENV_YAML, tmp_env)
+        components.append(str(tmp_path / name / "spec.yaml"))
+
+    prep = prepare.Prepare()
+    prep.config = Configuration(
+        offline_component_validation=True,
+        offline_validation_workers=workers,
+        enable_component_validation=True,
+        component_validation={"$.name": "^dum.[A-Za-z0-9-_.]+$"},
+    )
+    with mock.patch.object(
+        prep, "execute_azure_cli_command"
+    ) as execute, caplog.at_level("INFO"):
+        prep.validate_all_components(components)
+
+    execute.assert_not_called()
+    statuses = [prep._component_statuses[c]["validate"] for c in components]
+    assert statuses == ["succeeded", "failed", "failed", "failed"]
+    assert len(prep._errors) == 3
+    assert "Code snapshot parameter is not supported" in caplog.text
+    assert f"The required field 'version' is missing in {components[2]}" in caplog.text
+    assert "doesn't match the regular expression ^dum" in caplog.text
+
+
+def test_prepare_help_does_not_import_heavy_dependencies():
+    heavy_modules = ["git", "jsonpath_ng", "omegaconf", "opencensus", "ruamel.yaml"]
+    code = (
+        "import sys\n"
+        "from shrike.build.commands import prepare, register\n"
+        "try:\n"
+        "    prepare.Prepare().run()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print([m for m in {heavy_modules} if m in sys.modules])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, "--help"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    assert result.stdout.splitlines()[-1] == "[]"
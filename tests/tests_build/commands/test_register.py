@@ -7,12 +7,15 @@ Unit tests for the `register` module.
 Consider decorating long end-to-end tests with `@pytest.mark.order(-1)`.
 """
 
+import base64
+import json
 import os
 import pytest
 import subprocess
 import yaml
 from random import uniform
 from pathlib import Path
+from unittest import mock
 
 
 from shrike.build.commands import register
@@ -22,7 +25,6 @@ from shrike.build.core.configuration import (
     load_configuration_from_args_and_env,
 )
 
-
 TESTING_WORKSPACE = "/subscriptions/48bbc269-ce89-4f6f-9a12-c6f91fcb772d/resourceGroups/github-ci-rg/providers/Microsoft.MachineLearningServices/workspaces/github-ci-ml-wus2"
 
 
@@ -491,6 +493,144 @@ def test_run_with_config_runs_end_to_end(caplog):
     subprocess.run(["git", "clean", "-xdf"])
 
 
+def test_run_with_config_registers_in_workspaces_concurrently(caplog, tmp_path):
+    workspaces = [
+        TESTING_WORKSPACE.replace("github-ci-ml-wus2", f"workspace{i}")
+        for i in range(3)
+    ]
+    components = [f"component{i}/.build/spec.yaml" for i in range(4)]
+    reg = register.Register()
+    reg.config = Configuration(
+        workspaces=workspaces,
+        source_branch="refs/heads/main",
+        workspace_workers=3,
+        component_cli_workers=2,
+        disable_telemetry=True,
+    )
+    sessions = {}
+
+    def execute_command(command, *args, **kwargs):
+        az_command = base64.b64decode(command[-1]).decode("utf-16le")
+        session = (
+            reg._shell_context.working_directory,
+            reg._shell_context.env["AZURE_CONFIG_DIR"],
+        )
+        if "folder attach" in az_command:
+            sessions[az_command.split(" ")[5]] = session
+        elif "component create" in az_command:
+            workspace = [w for w, s in sessions.items() if s == session][0]
+            return not (workspace == "workspace1" and "component3" in az_command)
+        return True
+
+    with mock.patch.object(
+        reg, "find_signed_component_specification_files", return_value=components
+    ), mock.patch.object(reg, "ensure_component_cli_installed"), mock.patch.object(
+        reg, "read_component_version", return_value="1.0.0"
+    ), mock.patch.object(
+        reg, "execute_command", side_effect=execute_command
+    ), mock.patch.dict(
+        os.environ, {"AZURE_CONFIG_DIR": str(tmp_path)}
+    ):
+        with caplog.at_level("INFO"):
+            reg.run_with_config()
+            reg.display_all_statuses()
+
+    # Each workspace has its own working and Azure CLI configuration directories.
+    assert sorted(sessions.keys()) == ["workspace0", "workspace1", "workspace2"]
+    assert len(set(sessions.values())) == 3
+    assert reg._errors == [
+        "Error when registering component component3/.build/spec.yaml."
+    ]
+    assert reg._component_statuses[components[3]]["register"] == "failed"
+    assert reg._component_statuses[components[0]]["register"] == "succeeded"
+    assert "workspace0: 4 succeeded, 0 failed, 0 skipped." in caplog.text
+    assert "workspace1: 3 succeeded, 1 failed, 0 skipped." in caplog.text
+
+
+def test_register_all_signed_components_skips_unchanged_components(tmp_path):
+    components = []
+    for i in range(4):
+        build = tmp_path / f"component{i}" / ".build"
+        build.mkdir(parents=True)
+        spec = build / "spec.yaml"
+        spec.write_text(f"name: component{i}\nversion: 1.0.0\n")
+        catalog = {
+            "HashAlgorithm": "SHA256",
+            "CatalogItems": {"spec.yaml": "AAAA", f"run{i}.py": f"HASH{i}"},
+        }
+        (build / "catalog.json").write_text(json.dumps(catalog))
+        components.append(str(spec))
+
+    reg = register.Register()
+    reg.config = Configuration(skip_unchanged_components=True)
+    fingerprints = [reg.read_snapshot_fingerprint(c) for c in components]
+    registered_components = [
+        # Unchanged: same version and same snapshot.
+        {
+            "name": "component0",
+            "version": "1.0.0",
+            "tags": {"snapshot_fingerprint": fingerprints[0]},
+        },
+        # Same version, but different snapshot.
+        {
+            "name": "component1",
+            "version": "1.0.0",
+            "tags": {"snapshot_fingerprint": fingerprints[0]},
+        },
+        # Same snapshot, but different version.
+        {
+            "name": "component2",
+            "version": "0.9.0",
+            "tags": {"snapshot_fingerprint": fingerprints[2]},
+        },
+        # Default version only: version 1.0.0 is looked up with `show`.
+        {
+            "name": "component3",
+            "version": "0.9.0",
+            "tags": {"snapshot_fingerprint": fingerprints[0]},
+        },
+    ]
+    shown_components = {
+        "--name component3 --version 1.0.0": {
+            "name": "component3",
+            "version": "1.0.0",
+            "tags": {"snapshot_fingerprint": fingerprints[3]},
+        }
+    }
+    commands = []
+
+    def execute_azure_cli_command(command, output=None, **kwargs):
+        commands.append(command)
+        if command.startswith("ml component list"):
+            output.extend(json.dumps(registered_components, indent=2).splitlines())
+        elif command.startswith("ml component show"):
+            for arguments, shown_component in shown_components.items():
+                if arguments in command:
+                    output.extend(json.dumps(shown_component).splitlines())
+                    return True
+            return False
+        return True
+
+    with mock.patch.object(
+        reg, "execute_azure_cli_command", side_effect=execute_azure_cli_command
+    ):
+        reg.register_all_signed_components(components)
+
+    assert commands.count("ml component list -o json") == 1
+    assert not any(components[0] in command for command in commands)
+    assert not any(components[3] in command for command in commands)
+    assert "ml component show --name component2 --version 1.0.0 -o json" in commands
+    assert any(
+        c.startswith(f"ml component create --file {components[1]}") for c in commands
+    )
+    assert any(
+        c.startswith(f"ml component create --file {components[2]}") for c in commands
+    )
+    assert reg._component_statuses[components[0]]["register"] == "skipped"
+    assert reg._component_statuses[components[1]]["register"] == "succeeded"
+    assert reg._component_statuses[components[3]]["register"] == "skipped"
+
+
 def get_target_path_in_steps_directory(target) -> Path:
     end_of_path = "steps/" + target
     res = Path(__file__).parent.parent.resolve() / end_of_path
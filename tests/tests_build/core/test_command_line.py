@@ -2,9 +2,13 @@
 # Licensed under the MIT license.
 
 import argparse
+import logging
+import os
 from pathlib import Path
 import pytest
+import shutil
 import sys
+import time
 from unittest import mock
 
 
@@ -93,6 +97,82 @@ def test_execute_command_fails_as_expected_with_timeout(
     assert not res
 
 
+@pytest.mark.parametrize(
+    "command,success,expected",
+    [
+        (["python", "--version"], True, f"Python {sys.version_info.major}"),
+        (["python", "-c", "import sys; sys.stderr.write('oops')"], False, "oops"),
+        (["python", "-c", "import sys; sys.exit(3)"], False, "exit code 3"),
+    ],
+)
+def test_execute_command_streams_output(command, success, expected, caplog):
+    cmd = CommandForExecution()
+    cmd.config = Configuration(stream_shell_command_output=True)
+    with caplog.at_level("INFO"):
+        res = cmd.execute_command(command)
+
+    assert expected in caplog.text
+    assert res == success
+
+
+def test_execute_command_streams_output_until_timeout(caplog):
+    cmd = CommandForExecution(2)
+    cmd.config = Configuration(
+        shell_command_timeout_in_seconds=2, stream_shell_command_output=True
+    )
+    command = [
+        "python",
+        "-c",
+        "import time; print('hi', flush=True); time.sleep(30); print('bye')",
+    ]
+    start = time.time()
+    with caplog.at_level("INFO"):
+        res = cmd.execute_command(command)
+
+    assert time.time() - start < 20
+    assert "hi" in caplog.text
+    assert "bye" not in caplog.text
+    assert "timed out" in caplog.text
+    assert not res
+
+
+def test_execute_azure_cli_command_fails_explicitly_with_invalid_backend():
+    cmd = CommandForExecution()
+    cmd.config = Configuration(azure_cli_backend="bash")
+    with pytest.raises(ValueError):
+        cmd.execute_azure_cli_command("--version")
+
+
+@pytest.mark.skipif(
+    shutil.which("pwsh") is None or sys.platform == "win32",
+    reason="Requires PowerShell and a POSIX shell for the stub az script.",
+)
+def test_execute_azure_cli_command_reuses_session(tmp_path, caplog):
+    stub = tmp_path / "az"
+    stub.write_text(
+        '#!/bin/sh\necho "az $* $PPID"\nif [ "$1" = fail ]; then exit 3; fi\n'
+    )
+    stub.chmod(0o755)
+    cmd = CommandForExecution()
+    cmd.config = Configuration(
+        azure_cli_backend="pwsh_session", working_directory=str(tmp_path)
+    )
+    outputs = [[], []]
+    path = str(tmp_path) + os.pathsep + os.environ["PATH"]
+    with mock.patch.dict(os.environ, {"PATH": path}):
+        assert cmd.execute_azure_cli_command("first", output=outputs[0])
+        assert cmd.execute_azure_cli_command("second", output=outputs[1])
+        with caplog.at_level("INFO"):
+            assert not cmd.execute_azure_cli_command("fail")
+    cmd.close_azure_cli_sessions()
+
+    assert outputs[0][0].startswith("az first")
+    assert outputs[1][0].startswith("az second")
+    # Both commands ran in the same PowerShell process.
+    assert outputs[0][0].split()[-1] == outputs[1][0].split()[-1]
+    assert "exit code 3" in caplog.text
+
+
 @pytest.mark.parametrize("line", ["sample log line"])
 def test_log_emphasize(caplog, line):
 
@@ -169,3 +249,52 @@ def test_workspace_not_configured(caplog):
     with caplog.at_level("ERROR"):
         CommandForExecution().attach_workspace()
     assert "No workspaces are configured." in caplog.text
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_for_each_groups_logs_and_errors(caplog, max_workers):
+    command = CommandForExecution()
+    components = [f"component{i}" for i in range(8)]
+
+    def function(component):
+        for step in range(3):
+            logging.getLogger(__name__).info(f"{component} step {step}")
+            time.sleep(0.01)
+        command.register_component_status(component, "test", "failed")
+        command.register_error(f"{component} failed")
+        return component.upper()
+
+    with caplog.at_level("INFO"):
+        res = command.for_each(function, components, max_workers)
+
+    assert res == [component.upper() for component in components]
+    assert len(command._errors) == len(components)
+    assert set(command._component_statuses.keys()) == set(components)
+    messages = [record.getMessage() for record in caplog.records]
+    for component in components:
+        start = messages.index(f"{component} step 0")
+        assert messages[start : start + 4] == [
+            f"{component} step 0",
+            f"{component} step 1",
+            f"{component} step 2",
+            f"{component} failed",
+        ]
+
+
+def test_grouped_logs_do_not_replay_to_other_handlers(caplog):
+    child = logging.getLogger(f"{__name__}.child")
+    handler = logging.Handler()
+    handler.emit = mock.MagicMock()
+    child.addHandler(handler)
+    command_line._GroupedLogs.install()
+    try:
+        with caplog.at_level("INFO"):
+            with command_line._GroupedLogs():
+                child.info("hello")
+                assert caplog.messages == []
+    finally:
+        command_line._GroupedLogs.uninstall()
+        child.removeHandler(handler)
+
+    assert caplog.messages == ["hello"]
+    handler.emit.assert_called_once()
@@ -37,6 +37,15 @@ def test_build_number_overwrite_all_component_version(caplog):
     )
 
 
+@pytest.mark.parametrize("workers", ["0", "-2"])
+def test_non_positive_catalog_hashing_workers_use_default(caplog, workers):
+    args = ["--catalog-hashing-workers", workers]
+    with caplog.at_level("INFO"):
+        config = load_configuration_from_args_and_env(args, {})
+    assert config.catalog_hashing_workers >= 1
+    assert "catalog_hashing_workers must be positive" in caplog.text
+
+
 def test_both_args_and_file(tmp_path):
     config_path = tmp_path / "aml-build-configuration.yml"
     config_path.write_text("verbose: False")
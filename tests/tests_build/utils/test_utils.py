@@ -2,9 +2,13 @@
 # Licensed under the MIT license.
 
 from pathlib import Path
+import json
+import os
 import pytest
 import logging
+import time
 
+from shrike._core.telemetry import TelemetrySink
 from shrike.build.utils import utils
 
 
@@ -36,6 +40,110 @@ def test_create_SHA_256_hash_of_file_matches_cosmic_build_tool(
     assert hash == expected_hash
 
 
+def test_create_SHA_256_hashes_of_files_matches_single_file_hash():
+    folder = Path(__file__).parent.parent / "steps/component2"
+    files = [str(p) for p in folder.rglob("*") if p.is_file()]
+    hashes = utils.create_SHA_256_hashes_of_files(files, max_workers=4)
+
+    assert list(hashes.keys()) == files
+    for file in files:
+        assert hashes[file] == utils.create_SHA_256_hash_of_file(file)
+        assert hashes[file] == utils.create_SHA_256_hash_of_file(file, block_size=7)
+
+
+def test_hash_cache_reuses_hashes_of_unchanged_files(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("some content")
+    # Make the file old enough to be cached.
+    os.utime(file, (1_600_000_000, 1_600_000_000))
+    cache_path = str(tmp_path / ".build" / "hash-cache.json")
+
+    cache = utils.HashCache(cache_path)
+    hash = utils.create_SHA_256_hash_of_file(str(file), cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.save()
+
+    cache = utils.HashCache(cache_path)
+    assert utils.create_SHA_256_hash_of_file(str(file), cache=cache) == hash
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    file.write_text("some other content")
+    os.utime(file, (1_600_000_100, 1_600_000_100))
+    new_hash = utils.create_SHA_256_hash_of_file(str(file), cache=cache)
+    assert new_hash == utils.create_SHA_256_hash_of_file(str(file))
+    assert new_hash != hash
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_hash_cache_verify_detects_outdated_hashes(tmp_path, caplog):
+    file = tmp_path / "file.txt"
+    file.write_text("some content")
+    os.utime(file, (1_600_000_000, 1_600_000_000))
+    cache_path = str(tmp_path / "hash-cache.json")
+
+    cache = utils.HashCache(cache_path)
+    utils.create_SHA_256_hash_of_file(str(file), cache=cache)
+    cache.save()
+
+    # Tamper with the cached hash, without changing the file.
+    with open(cache_path, "r") as f:
+        content = json.load(f)
+    for entry in content["entries"].values():
+        entry["hash"] = "WRONG"
+    with open(cache_path, "w") as f:
+        json.dump(content, f)
+
+    cache = utils.HashCache(cache_path)
+    assert utils.create_SHA_256_hash_of_file(str(file), cache=cache) == "WRONG"
+
+    cache = utils.HashCache(cache_path, verify=True)
+    with caplog.at_level("WARNING"):
+        hash = utils.create_SHA_256_hash_of_file(str(file), cache=cache)
+    assert hash == utils.create_SHA_256_hash_of_file(str(file))
+    assert cache.mismatches == 1
+    assert "is outdated" in caplog.text
+
+
+def test_hash_cache_prunes_deleted_files(tmp_path):
+    files = [tmp_path / "file1.txt", tmp_path / "file2.txt"]
+    for file in files:
+        file.write_text(file.name)
+        os.utime(file, (1_600_000_000, 1_600_000_000))
+    cache_path = str(tmp_path / "hash-cache.json")
+
+    cache = utils.HashCache(cache_path)
+    utils.create_SHA_256_hashes_of_files([str(f) for f in files], cache=cache)
+    files[0].unlink()
+    cache.save()
+
+    with open(cache_path, "r") as f:
+        entries = json.load(f)["entries"]
+    assert list(entries.keys()) == [os.path.abspath(files[1])]
+
+
+def test_create_snapshot_fingerprint_ignores_specification_and_order():
+    items = {"spec.yaml": "AAAA", "a.py": "BBBB", "b/c.py": "CCCC"}
+    fingerprint = utils.create_snapshot_fingerprint(items, "spec.yaml")
+    reordered = {"b/c.py": "CCCC", "spec.yaml": "DDDD", "a.py": "BBBB"}
+    assert utils.create_snapshot_fingerprint(reordered, "spec.yaml") == fingerprint
+    changed = {"spec.yaml": "AAAA", "a.py": "EEEE", "b/c.py": "CCCC"}
+    assert utils.create_snapshot_fingerprint(changed, "spec.yaml") != fingerprint
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        ("NumPy >= 1.19 ", "numpy>=1.19"),
+        ("azureml_core==1.27.0  # pinned", "azureml-core==1.27.0"),
+        ("# comment", None),
+        ("", None),
+        ("--index-url   https://feed/simple/", "--index-url https://feed/simple/"),
+    ],
+)
+def test_normalize_pip_requirement(line, expected):
+    assert utils.normalize_pip_requirement(line) == expected
+
+
 def test_telemetry_logger(caplog):
     """Unit tests for utils class of opencensus azure monitor"""
     telemetry_logger = utils.TelemetryLogger()
@@ -58,3 +166,33 @@ def test_telemetry_logger(caplog):
         message="A unit test message of shrike.build. Please ignore it.",
         level=logging.INFO,
     )
+
+
+def test_telemetry_loggers_share_one_sink():
+    first = utils.TelemetryLogger()
+    second = utils.TelemetryLogger()
+    assert first.sink is second.sink
+    assert utils.TelemetryLogger(enable_telemetry=False).sink is None
+
+
+def test_telemetry_sink_does_not_wait_for_slow_exporter():
+    exported = []
+
+    def slow_exporter(batch):
+        time.sleep(0.5)
+        exported.extend(batch)
+
+    sink = TelemetrySink(slow_exporter, capacity=10, max_batch_size=5)
+    start = time.monotonic()
+    accepted = [sink.submit(f"trace {i}") for i in range(20)]
+    assert time.monotonic() - start < 0.1
+
+    # The queue is bounded: traces submitted while it is full are dropped.
+    assert sum(accepted) + sink.dropped == 20
+    assert sink.dropped > 0
+
+    sink.close(timeout=5)
+    assert [item.message for item in exported] == [
+        f"trace {i}" for i, ok in enumerate(accepted) if ok
+    ]
+    assert not sink.submit("trace after close")
@@ -0,0 +1,97 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import sys
+
+import pytest
+
+from shrike.build.utils import validation
+from shrike.build.utils.validation import ComponentValidationRules
+
+ALLOWED_FEED = "https://example.pkgs.visualstudio.com/pypi/simple/"
+
+SPEC = {
+    "name": "dummy",
+    "environment": {"docker": {"image": "docker.io/library/python:3.8"}},
+    "inputs": {
+        "first": {"description": "Starts with an upper case letter"},
+        "second": {"description": "starts with a lower case letter"},
+    },
+}
+
+
+def test_check_compliance_reports_every_violation():
+    rules = ComponentValidationRules({}, ["polymerprod.azurecr.io"], [ALLOWED_FEED])
+    violations = rules.check_compliance(
+        "spec.yaml",
+        SPEC,
+        ["numpy", "--extra-index-url https://pypi.org/simple/"],
+        [".", "conda-forge"],
+    )
+
+    assert violations == [
+        "The container base image in spec.yaml is not allowed for compliant run.",
+        "The package feed in spec.yaml is not allowed for compliant run.",
+        "The Polymer package feed is not found in environment of spec.yaml",
+        "Only the default conda channel is allowed for compliant run.",
+    ]
+
+
+def test_check_compliance_passes():
+    rules = ComponentValidationRules({}, ["docker.io"], [ALLOWED_FEED])
+    violations = rules.check_compliance(
+        "spec.yaml", SPEC, ["numpy", f"--index-url {ALLOWED_FEED}"], ["."]
+    )
+
+    assert violations == []
+
+
+def test_check_custom_rules_reports_every_violation():
+    rules = ComponentValidationRules(
+        {"$.name": "^office", "$.inputs..description": "^[A-Z].*"}, [], []
+    )
+    violations = rules.check_custom_rules("spec.yaml", SPEC)
+
+    assert len(violations) == 2
+    assert "doesn't match the regular expression ^office" in violations[0]
+    assert "lower case" in violations[1]
+    assert rules.check_custom_rules("spec.yaml", {"name": "office.dummy"}) == []
+
+
+@pytest.fixture
+def component_definition_class():
+    validation._component_definition_class.cache_clear()
+    yield validation._component_definition_class
+    validation._component_definition_class.cache_clear()
+
+
+def test_schema_check_without_azure_ml_component_is_logged_once(
+    monkeypatch, caplog, component_definition_class
+):
+    monkeypatch.setitem(sys.modules, "azure.ml.component", None)
+
+    with caplog.at_level("INFO"):
+        errors = validation.check_component_schema("spec.yaml", {"name": "dummy"})
+        assert component_definition_class() is None
+
+    assert errors == [
+        "The required field 'version' is missing in spec.yaml.",
+        "The required field 'type' is missing in spec.yaml.",
+    ]
+    assert [record.levelname for record in caplog.records] == ["INFO"]
+    assert "azure-ml-component is not installed" in caplog.text
+
+
+def test_schema_check_without_component_definition_warns(
+    monkeypatch, caplog, component_definition_class
+):
+    pytest.importorskip("azure.ml.component")
+    monkeypatch.setitem(
+        sys.modules, "azure.ml.component._core._component_definition", None
+    )
+
+    with caplog.at_level("INFO"):
+        assert component_definition_class() is None
+
+    assert [record.levelname for record in caplog.records] == ["WARNING"]
+    assert "does not provide ComponentDefinition" in caplog.text
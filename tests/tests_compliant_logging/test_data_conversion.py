@@ -10,6 +10,7 @@ from packaging.version import parse
 from shrike.compliant_logging.exceptions import PublicRuntimeError
 import pytest
 
+from shrike.compliant_logging import data_conversions
 from shrike.compliant_logging.data_conversions import (
     collect_pandas_dataframe,
     collect_spark_dataframe,
@@ -24,9 +25,11 @@ from shrike.compliant_logging.data_conversions import (
     get_pandas_series_info,
     get_spark_dataframe_info,
     get_vaex_dataframe_info,
+    get_data_info,
     numpy_array_to_list,
     pandas_series_to_list,
     pandas_dataframe_schema,
+    register_info_converter,
     vaex_dataframe_schema,
     spark_dataframe_schema,
 )
@@ -125,3 +128,33 @@ def test_pyspark_import():
     }
 
     collect_spark_dataframe(test_df)
+
+
+class Table:
+    num_rows = 3
+
+
+class SubTable(Table):
+    pass
+
+
+@pytest.fixture
+def info_converters(monkeypatch):
+    """Registers info converters for the test only, with an empty cache."""
+    monkeypatch.setattr(
+        data_conversions, "_info_converters", list(data_conversions._info_converters)
+    )
+    monkeypatch.setattr(data_conversions, "_info_converter_of_type", {})
+
+
+def test_get_data_info_dispatches_on_type(info_converters):
+    assert get_data_info(np.array([1, 2])) == "Numpy Array (Shape: (2,))"
+    assert get_data_info(pd.Series([1, 2])) == "Pandas Series (Row Count: 2)"
+    assert get_data_info([1, 2]) is None
+    assert get_data_info("text") is None
+
+    assert get_data_info(SubTable()) is None
+    register_info_converter(
+        __name__, "Table", lambda t: f"Table (Row Count: {t.num_rows})"
+    )
+    assert get_data_info(SubTable()) == "Table (Row Count: 3)"
@@ -3,13 +3,19 @@
 
 from shrike import compliant_logging
 from shrike.compliant_logging.constants import DataCategory
-from shrike.compliant_logging.logging import CompliantLogger, get_aml_context
-from shrike.compliant_logging.exceptions import PublicRuntimeError
+from shrike.compliant_logging.logging import (
+    CompliantLogger,
+    _MessageWithItems,
+    get_aml_context,
+)
+from shrike.compliant_logging.exceptions import PublicRuntimeError, PublicValueError
 from pathlib import Path
+import io
 import logging
 import pytest
 import re
 import sys
+import threading
 import vaex
 import pandas as pd
 import numpy as np
@@ -109,6 +115,40 @@ def test_exception_works_as_expected(exec_type, message):
     assert re.search(r"^SystemLog\:.*foo$", logs, flags=re.MULTILINE)
 
 
+def test_items_are_only_converted_when_the_record_is_emitted():
+    compliant_logging.enable_compliant_logging()
+    log = logging.getLogger("items")
+    log.setLevel("DEBUG")
+
+    class Item:
+        conversions = 0
+
+        def __str__(self):
+            Item.conversions += 1
+            return "item"
+
+    with stream_handler(log, "%(levelname)s:%(message)s", level="INFO") as context:
+        log.debug("filtered", items=[Item()], category=DataCategory.PUBLIC)
+        assert Item.conversions == 0
+        log.info("shown %d", 1, items=Item(), category=DataCategory.PUBLIC)
+        log.info("private", items=[[1, 2], Item()])
+        logs = str(context)
+
+    assert Item.conversions == 1
+    assert re.search(r"^INFO:shown 1 \| .*Item'> \| item$", logs, flags=re.MULTILINE)
+    assert re.search(
+        r"^INFO:private \| List \(Count: 2\) \| .*Item'>$", logs, flags=re.MULTILINE
+    )
+    assert "filtered" not in logs
+
+
+def test_message_with_items_repr_is_the_formatted_message():
+    message = _MessageWithItems(
+        CompliantLogger(name="repr"), "message", [[1, 2]], DataCategory.PRIVATE
+    )
+    assert repr(message) == repr("message | List (Count: 2)")
+
+
 def test_all_the_stuff():
     compliant_logging.enable_compliant_logging()
     log = logging.getLogger("foo")
@@ -129,6 +169,78 @@ def test_enable_compliant_logging_sets_force():
     assert all(h not in logging.root.handlers for h in initial_handlers)
 
 
+def test_async_handlers_keep_prefix_and_flush_queued_records():
+    stream = io.StringIO()
+    compliant_logging.enable_compliant_logging(
+        async_handlers=True, stream=stream, level="INFO"
+    )
+    log = logging.getLogger("async")
+
+    log.info("public %d", 1, category=DataCategory.PUBLIC)
+    log.info("PRIVATE", items=[[1, 2]])
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        log.exception("failed", category=DataCategory.PUBLIC)
+    compliant_logging.logging._stop_queue_listener()
+
+    logs = stream.getvalue()
+    assert re.search(r"^SystemLog:INFO:async:public 1$", logs, flags=re.MULTILINE)
+    assert re.search(
+        r"^INFO:async:PRIVATE \| List \(Count: 2\)$", logs, flags=re.MULTILINE
+    )
+    assert re.search(
+        r"^SystemLog:ERROR:async:failed\nTraceback", logs, flags=re.MULTILINE
+    )
+    assert [type(h) for h in logging.root.handlers] == [logging.StreamHandler]
+
+
+def test_async_handlers_drop_records_when_queue_is_full(capsys):
+    release = threading.Event()
+
+    class SlowHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            release.wait()
+            self.records.append(record)
+
+    handler = SlowHandler()
+    compliant_logging.enable_compliant_logging(
+        async_handlers=True, queue_size=1, overflow="drop", handlers=[handler]
+    )
+    queue_handler = logging.root.handlers[0]
+
+    log = logging.getLogger("async")
+    for i in range(5):
+        log.warning("record %d", i)
+    # public records wait for space in the queue
+    threading.Timer(0.1, release.set).start()
+    for i in range(3):
+        log.warning("public %d", i, category=DataCategory.PUBLIC)
+    compliant_logging.logging._stop_queue_listener()
+
+    assert queue_handler.dropped >= 1
+    assert len(handler.records) + queue_handler.dropped == 8
+    assert [r.getMessage() for r in handler.records if r.prefix] == [
+        "public 0",
+        "public 1",
+        "public 2",
+    ]
+    assert (
+        f"{queue_handler.dropped} log records were dropped" in capsys.readouterr().err
+    )
+
+
+def test_unknown_overflow_policy_raises():
+    with pytest.raises(PublicValueError):
+        compliant_logging.enable_compliant_logging(
+            async_handlers=True, overflow="ignore"
+        )
+
+
 def test_warn_if_root_handlers_already_exist(capsys):
     # Pytest adds handlers to the root logger by default.
 
@@ -835,3 +947,25 @@ def test_convert_obj():
     assert "List (Count: 10) | range(0, 10)..." in logger._convert_obj(
         range(10), category=DataCategory.PUBLIC
     )
+
+
+def test_compute_truth_matrix():
+    """Pytest CompliantLogger._compute_truth_matrix"""
+    logger = CompliantLogger(name="")
+    predict = pd.Series([0.1, 0.5, 0.5, 0.9, np.nan, 0.3])
+    target = pd.Series([1, 0, 1, 1, 1, 0])
+    thresholds = [0.0, 0.5, 1.0, np.nan]
+
+    expected = []
+    for thres in thresholds:
+        expected.append(
+            [
+                ((predict >= thres) & (target == 1)).sum(),
+                ((predict >= thres) & (target != 1)).sum(),
+                ((predict < thres) & (target != 1)).sum(),
+                ((predict < thres) & (target == 1)).sum(),
+            ]
+        )
+
+    assert logger._compute_truth_matrix(predict, target, 1, thresholds) == expected
+    assert expected[1] == [2, 1, 1, 1]
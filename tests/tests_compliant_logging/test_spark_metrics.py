@@ -0,0 +1,129 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+from pyspark.sql import SparkSession
+
+from shrike.compliant_logging import DataCategory
+from shrike.compliant_logging.logging import CompliantLogger
+
+
+@pytest.fixture(scope="module")
+def spark():
+    return (
+        SparkSession.builder.master("local[2]").appName("SparkUnitTests").getOrCreate()
+    )
+
+
+@pytest.fixture
+def run(monkeypatch):
+    run = mock.MagicMock()
+    monkeypatch.setattr("shrike.compliant_logging.logging._AML_RUN", run)
+    return run
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    n = 1000
+    return pd.DataFrame(
+        {
+            "probability": rng.random(n).round(3),
+            "label": rng.integers(0, 3, n),
+            "prediction": rng.integers(0, 4, n),
+            "target": rng.random(n) * 1.2,
+            "estimate": rng.random(n),
+        }
+    )
+
+
+def logged_values(run, spark, data, method, run_method, **kwargs):
+    """Logs the metric of the pandas then of the Spark DataFrame, and returns
+    the values passed to the run."""
+    log = CompliantLogger(name="")
+    values = []
+    for df in [data, spark.createDataFrame(data)]:
+        getattr(log, method)("metric", df, category=DataCategory.PUBLIC, **kwargs)
+        values.append(getattr(run, run_method).call_args[0][1]["data"])
+    return values
+
+
+@pytest.mark.parametrize("accuracy", [None, 10000])
+def test_spark_accuracy_table_matches_pandas(run, spark, data, accuracy):
+    expected, actual = logged_values(
+        run,
+        spark,
+        data,
+        "metric_accuracy_table",
+        "log_accuracy_table",
+        col_predict="probability",
+        col_target="label",
+        probability_thresholds=11,
+        accuracy=accuracy,
+    )
+    assert np.array_equal(expected["probability_tables"], actual["probability_tables"])
+    if accuracy is None:
+        assert np.array_equal(
+            expected["precentile_tables"], actual["precentile_tables"]
+        )
+    else:
+        # approximated percentiles may fall on a neighbour row
+        assert np.allclose(
+            expected["precentile_tables"], actual["precentile_tables"], atol=5
+        )
+    assert actual["probability_thresholds"] == expected["probability_thresholds"]
+    assert actual["class_labels"] == list(expected["class_labels"])
+
+
+@pytest.mark.parametrize(
+    "method,run_method",
+    [
+        ("metric_predictions", "log_predictions"),
+        ("metric_residual", "log_residuals"),
+    ],
+)
+def test_spark_bins_match_pandas(run, spark, data, method, run_method):
+    expected, actual = logged_values(
+        run,
+        spark,
+        data,
+        method,
+        run_method,
+        col_predict="estimate",
+        col_target="target",
+    )
+    assert expected.keys() == actual.keys()
+    for key in expected:
+        assert np.allclose(expected[key], actual[key], equal_nan=True)
+
+
+def test_spark_confusion_matrix_matches_pandas(run, spark, data):
+    expected, actual = logged_values(
+        run,
+        spark,
+        data[["label", "prediction"]],
+        "metric_confusion_matrix",
+        "log_confusion_matrix",
+        idx_true="label",
+        idx_pred=1,
+    )
+    assert np.array_equal(expected["matrix"], actual["matrix"])
+    assert actual["class_labels"] == list(expected["class_labels"])
+
+
+def test_spark_metrics_do_not_collect_the_dataframe(run, spark, data):
+    log = CompliantLogger(name="")
+    df = spark.createDataFrame(data)
+    with mock.patch.object(type(df), "toPandas") as to_pandas:
+        log.metric_predictions(
+            "metric",
+            df,
+            col_predict="estimate",
+            col_target="target",
+            category=DataCategory.PUBLIC,
+        )
+    to_pandas.assert_not_called()
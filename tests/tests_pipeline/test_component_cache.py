@@ -0,0 +1,83 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import time
+import pytest
+
+from shrike.pipeline.component_cache import ComponentCache, is_pinned_version
+
+
+@pytest.mark.parametrize(
+    "version,expected",
+    [
+        ("1.0.2", True),
+        ("0.0.1-dev", True),
+        (None, False),
+        ("default", False),
+        ("Latest", False),
+    ],
+)
+def test_is_pinned_version(version, expected):
+    assert is_pinned_version(version) == expected
+
+
+def test_component_cache_round_trip(tmp_path):
+    cache = ComponentCache(str(tmp_path), ttl=60, max_entries=10)
+    key = ComponentCache.key("sub/rg/ws", "component", "namespace", "1.0.0")
+    assert key != ComponentCache.key("sub/rg/ws", "component", None, "1.0.0")
+
+    assert cache.get(key) is None
+    cache.put(key, {"moduleName": "component"})
+    assert ComponentCache(str(tmp_path), ttl=60, max_entries=10).get(key) == {
+        "moduleName": "component"
+    }
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_component_cache_expires_entries(tmp_path):
+    cache = ComponentCache(str(tmp_path), ttl=60, max_entries=10)
+    key = ComponentCache.key("sub/rg/ws", "component", None, "1.0.0")
+    cache.put(key, {"moduleName": "component"})
+
+    path = tmp_path / (key + ".json")
+    stale = time.time() - 120
+    os.utime(path, (stale, stale))
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_component_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = ComponentCache(str(tmp_path), ttl=3600, max_entries=2)
+    keys = [ComponentCache.key("sub/rg/ws", f"c{i}", None, "1") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, i)
+        last_used = time.time() - 100 + i
+        os.utime(tmp_path / (key + ".json"), (last_used, last_used))
+
+    # Using the oldest entry makes the second one the least recently used.
+    assert cache.get(keys[0]) == 0
+    cache.put(keys[2], 2)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [keys[0] + ".json", keys[2] + ".json"]
+    )
+
+
+def test_component_cache_evicts_only_beyond_max_entries(tmp_path, monkeypatch):
+    cache = ComponentCache(str(tmp_path), ttl=3600, max_entries=10)
+    evict = cache.evict
+    evictions = []
+
+    def counting_evict():
+        evictions.append(len(os.listdir(tmp_path)))
+        evict()
+
+    monkeypatch.setattr(cache, "evict", counting_evict)
+    for i in range(20):
+        cache.put(ComponentCache.key("sub/rg/ws", f"c{i}", None, "1"), i)
+        # Replacing an entry does not add one.
+        cache.put(ComponentCache.key("sub/rg/ws", "c0", None, "1"), 0)
+
+    # Evicting keeps 9 entries, so the next eviction is 2 new entries later.
+    assert evictions == [11, 11, 11, 11, 11]
+    assert len(os.listdir(tmp_path)) == 10
@@ -6,7 +6,11 @@ PyTest suite for testing module_helper.py:
 
 > Status: this code relates to the _recipe_ and is a _proposition_
 """
+
 import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from shrike.pipeline import module_helper
 from shrike.pipeline.module_helper import (
     AMLModuleLoader,
     module_loader_config,
@@ -49,3 +53,212 @@ def test_is_local(use_local, use_local_except_for, module_key, expected):
     module_loader = AMLModuleLoader(config)
     assert module_loader.use_local_except_for == use_local_except_for
     assert module_loader.is_local(module_key) == expected
+
+
+def test_prefetch_modules_loads_modules_concurrently():
+    config = OmegaConf.load(Path(__file__).parent / "data/test_configuration.yaml")
+    module_loader = AMLModuleLoader(config)
+    module_keys = list(module_loader.modules_manifest)
+    loaded = []
+
+    def load_module(module_key, modules_manifest=None):
+        time.sleep(0.2)
+        if module_key == module_keys[0]:
+            raise ValueError("not found")
+        loaded.append(module_key)
+
+    module_loader.load_module = load_module
+    start_time = time.time()
+    errors = module_loader.prefetch_modules(
+        {"deprecated_module": {}}, max_workers=len(module_keys) + 1
+    )
+
+    assert time.time() - start_time < 0.2 * len(module_keys)
+    assert list(errors) == [module_keys[0]]
+    assert str(errors[module_keys[0]]) == "not found"
+    assert sorted(loaded) == sorted(module_keys[1:] + ["deprecated_module"])
+
+
+class FakeComponent:
+    """Stand-in for azure.ml.component.Component, where only the components
+    named in 'registered' exist."""
+
+    def __init__(self, registered):
+        self.registered = registered
+        self.calls = []
+        self.errors = []
+
+    def load(self, workspace, name, version):
+        self.calls.append(name)
+        if self.errors:
+            raise self.errors.pop(0)
+        if name not in self.registered:
+            raise ValueError(f"Component {name} not found")
+        return f"{name}:{version}"
+
+
+@pytest.fixture
+def fake_module_loader(monkeypatch):
+    def create(registered):
+        component = FakeComponent(registered)
+        monkeypatch.setattr(module_helper, "Component", component)
+        monkeypatch.setattr(module_helper, "current_workspace", lambda: None)
+        config = OmegaConf.load(Path(__file__).parent / "data/test_configuration.yaml")
+        OmegaConf.update(config, "module_loader.use_component_cache", False)
+        return AMLModuleLoader(config), component
+
+    return create
+
+
+def test_load_prod_module_tries_namespace_first(fake_module_loader):
+    module_loader, component = fake_module_loader(["ns://component"])
+
+    assert module_loader.load_prod_module("component", "1", "ns") == "ns://component:1"
+    assert module_loader.load_prod_module("component", "2", "ns") == "ns://component:2"
+    assert module_loader.load_prod_module("component", "2", "ns") == "ns://component:2"
+    assert component.calls == ["ns://component", "ns://component"]
+    assert set(module_loader.load_times) == {"component:1", "component:2"}
+
+
+def test_load_prod_module_does_not_fall_back_to_name_without_namespace(
+    fake_module_loader,
+):
+    module_loader, component = fake_module_loader(["component"])
+
+    with pytest.raises(ValueError, match="ns://component not found"):
+        module_loader.load_prod_module("component", "1", "ns")
+    assert module_loader.load_prod_module("component", "1") == "component:1"
+    assert component.calls == ["ns://component", "component"]
+
+
+def test_load_prod_module_remembers_failed_resolution(fake_module_loader):
+    module_loader, component = fake_module_loader([])
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="ns://component not found"):
+            module_loader.load_prod_module("component", "1", "ns")
+    assert component.calls == ["ns://component"]
+
+
+def test_load_prod_module_retries_other_errors(fake_module_loader):
+    module_loader, component = fake_module_loader(["ns://component"])
+    component.errors.append(ConnectionError("Connection reset"))
+
+    with pytest.raises(ConnectionError):
+        module_loader.load_prod_module("component", "1", "ns")
+    assert module_loader.failed_resolutions == {}
+    assert module_loader.load_prod_module("component", "1", "ns") == "ns://component:1"
+    assert component.calls == ["ns://component", "ns://component"]
+
+
+def test_load_prod_module_loads_each_module_once_across_threads(
+    fake_module_loader,
+):
+    module_loader, component = fake_module_loader(["component"])
+    load = component.load
+
+    def slow_load(*args, **kwargs):
+        time.sleep(0.1)
+        return load(*args, **kwargs)
+
+    component.load = slow_load
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(
+            executor.map(
+                lambda _: module_loader.load_prod_module("component", "1"), range(4)
+            )
+        )
+
+    assert results == ["component:1"] * 4
+    assert component.calls == ["component"]
+
+
+# module DTO of a registered component, as returned by the designer service
+REGISTERED_MODULE_DTO = {
+    "moduleName": "component",
+    "moduleVersion": "1.0.0",
+    "moduleVersionId": "00000000-0000-0000-0000-000000000000",
+    "jobType": "CommandComponent",
+    "createdDate": "2021-01-01T00:00:00Z",
+    "lastModifiedDate": "2021-01-01T00:00:00Z",
+    "runSettingParameters": [],
+    "modulePythonInterface": {
+        "inputs": [{"name": "input_path", "argumentName": "input_path"}],
+        "outputs": [{"name": "output_path", "argumentName": "output_path"}],
+        "parameters": [{"name": "value", "argumentName": "value"}],
+    },
+    "moduleEntity": {
+        "createdDate": "2021-01-01T00:00:00Z",
+        "lastModifiedDate": "2021-01-01T00:00:00Z",
+        "structuredInterface": {
+            "inputs": [
+                {
+                    "name": "input_path",
+                    "label": "input_path",
+                    "dataTypeIdsList": ["AnyDirectory"],
+                }
+            ],
+            "outputs": [
+                {
+                    "name": "output_path",
+                    "label": "output_path",
+                    "dataTypeId": "AnyDirectory",
+                }
+            ],
+            "parameters": [
+                {
+                    "name": "value",
+                    "label": "value",
+                    "parameterType": "Int",
+                    "defaultValue": "1",
+                    "isOptional": True,
+                }
+            ],
+        },
+    },
+}
+
+
+def test_component_cache_round_trip(monkeypatch, tmp_path):
+    monkeypatch.setattr(module_helper, "current_workspace", lambda: None)
+    monkeypatch.setattr(module_helper, "_workspace_id", lambda workspace: "ws")
+    config = OmegaConf.load(Path(__file__).parent / "data/test_configuration.yaml")
+    OmegaConf.update(config, "module_loader.use_component_cache", True)
+    OmegaConf.update(config, "module_loader.component_cache_dir", str(tmp_path))
+    resolved = []
+
+    def resolve_prod_module(module_name, module_version, module_namespace=None):
+        resolved.append(module_name)
+        return module_helper._component_from_module_dto(REGISTERED_MODULE_DTO, None)
+
+    loaded = []
+    for _ in range(2):
+        module_loader = AMLModuleLoader(config)
+        module_loader.resolve_prod_module = resolve_prod_module
+        loaded.append(module_loader.load_prod_module("component", "1.0.0"))
+
+    # The second loader rebuilds the component from the cache.
+    assert resolved == ["component"]
+    assert module_loader.component_cache.hits == 1
+    for component in loaded:
+        assert component._definition.name == "component"
+        assert component._definition.version == "1.0.0"
+        assert list(component._definition.inputs) == ["input_path"]
+        assert list(component._definition.outputs) == ["output_path"]
+        assert list(component._definition.parameters) == ["value"]
+
+
+def test_component_cache_is_disabled_without_sdk_support(monkeypatch, caplog):
+    monkeypatch.setattr(module_helper, "_component_cache_supported", lambda: False)
+    config = OmegaConf.load(Path(__file__).parent / "data/test_configuration.yaml")
+    OmegaConf.update(config, "module_loader.use_component_cache", True)
+
+    with caplog.at_level("WARNING"):
+        assert AMLModuleLoader(config).component_cache is None
+    assert "the component cache is disabled" in caplog.text
+
+    caplog.clear()
+    OmegaConf.update(config, "module_loader.use_component_cache", False)
+    with caplog.at_level("WARNING"):
+        AMLModuleLoader(config)
+    assert "component cache" not in caplog.text
@@ -718,3 +718,36 @@ def test_remove_polymer_pkg_idx_if_exists_and_save_new():
     assert not new_file_path
     assert not old_file_path
     shutil.rmtree("tmp")
+
+
+class CountingSubgraph(AMLPipelineHelper):
+    builds = 0
+
+    def build(self, config):
+        CountingSubgraph.builds += 1
+        return lambda: config.shard
+
+
+class FanOutPipeline(AMLPipelineHelper):
+    @classmethod
+    def required_subgraphs(cls):
+        return {"shard": CountingSubgraph}
+
+
+@pytest.mark.parametrize("memoize,expected_builds", [(True, 2), (False, 3), (None, 3)])
+def test_subgraph_load_memoizes_built_subgraphs(memoize, expected_builds):
+    """Unit tests for the memoization of subgraph_load()"""
+    config = OmegaConf.load(Path(__file__).parent / "data/test_configuration.yaml")
+    if memoize is not None:
+        OmegaConf.update(config, "run.memoize_subgraphs", memoize)
+    helper = FanOutPipeline(config=config)
+    CountingSubgraph.builds = 0
+
+    subgraphs = [
+        helper.subgraph_load("shard", custom_config=OmegaConf.create({"shard": shard}))
+        for shard in [1, 2, 1]
+    ]
+
+    assert [subgraph() for subgraph in subgraphs] == [1, 2, 1]
+    assert CountingSubgraph.builds == expected_builds
+    assert helper.subgraph_builds_avoided == 3 - expected_builds
@@ -0,0 +1,54 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import json
+import time
+
+from shrike.pipeline import profiler
+from shrike.pipeline.profiler import profile, profiled, profiling
+
+
+@profiled("runsettings", lambda module_name, sleep: module_name)
+def apply_runsettings(module_name, sleep):
+    time.sleep(sleep)
+    return module_name
+
+
+def test_profile_is_a_no_op_when_not_profiling():
+    assert profiler.CURRENT_PROFILER is None
+    with profile("phase", "build"):
+        pass
+    assert apply_runsettings("probe", 0) == "probe"
+
+
+def test_profiling_records_spans(tmp_path):
+    with profiling() as build_profiler:
+        with profile("phase", "build"):
+            apply_runsettings("probe", 0.02)
+            apply_runsettings("probe", 0.01)
+            apply_runsettings("convert", 0)
+    assert profiler.CURRENT_PROFILER is None
+
+    spans = [(span.category, span.name) for span in build_profiler.spans]
+    assert spans == [
+        ("runsettings", "probe"),
+        ("runsettings", "probe"),
+        ("runsettings", "convert"),
+        ("phase", "build"),
+    ]
+
+    report = build_profiler.report().splitlines()
+    assert [line.split()[-1] for line in report] == [
+        "name",
+        "build",
+        "probe",
+        "convert",
+    ]
+    assert report[2].split()[1] == "2"
+
+    trace_file = tmp_path / "graph.profile.json"
+    build_profiler.write_chrome_trace(str(trace_file))
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["probe", "probe", "convert", "build"]
+    assert all(event["ph"] == "X" for event in events)
+    assert events[0]["dur"] >= 20000